@@ -8,7 +8,6 @@ Created on Wed Jun 26 12:58:50 2019
 
 from brian2 import ms, pA
 from brian2 import SpikeGeneratorGroup, SpikeMonitor
-from brian2 import prefs, implementation, check_units
 import numpy as np
 
 from teili import TeiliNetwork
@@ -22,25 +21,15 @@ from teili.building_blocks.wta import WTA
 from teili.stimuli.testbench import WTA_Testbench, OCTA_Testbench
 from teili.models.parameters.octa_params import wta_params, octa_params,\
     mismatch_neuron_param, mismatch_synap_param
-from teili.tools.group_tools import add_group_weight_init,\
-    add_group_weight_decay, add_group_weight_re_init,\
+from teili.tools.group_tools import add_group_param_init,\
+    add_group_weight_decay, add_group_params_re_init,\
     add_group_activity_proxy
 from teili.tools.bb_tools import add_bb_mismatch
 from teili.tools.io import save_monitor, load_monitor,\
     save_weights, load_weights
-
-prefs.codegen.target = "numpy"
-@implementation('numpy', discard_units=True)
-@check_units(Ipred_plast=1, source_N=1, target_N=1, re_init_threshold=1, result=1)
-def re_init_ipred(Ipred_plast, source_N, target_N, re_init_threshold=0.2):
-    data = np.zeros((source_N, target_N))
-    data = np.reshape(Ipred_plast, (source_N, target_N))
-
-    reinit_index = np.mean(data, 1) > (1 - re_init_threshold)
-
-    data[reinit_index, :] = np.zeros((np.sum(reinit_index), target_N))
-    data = np.clip(data, 0, 1)
-    return data.flatten()
+from teili.tools.codegen_targets import codeobj_class_for
+from teili.tools.run_reg_functions import re_init_ipred
+from teili.tools.connectivity import Banded
 
 
 class Octa(BuildingBlock):
@@ -216,7 +205,8 @@ def gen_octa(groupname,
                 on 'local' which performs event-driven weight decay.
             tau_stdp (float ms, optional): Time constant for STDP window.
             seed (int, optional): Seed to initialise random distribution
-                from which the mismatch is sampled.
+                from which the mismatch and the connectivity of the WTAs
+                are sampled.
             external_input (bool, optional): Flag to connect an external
                 input to the OCTA block. If set to `False` the user is
                 expected to connect another neuron population.
@@ -267,6 +257,7 @@ def gen_octa(groupname,
                       num_input_neurons=num_input_neurons,
                       num_inputs=4,
                       block_params=wta_params,
+                      seed=seed,
                       monitor=monitor)
 
     prediction = WTA(name='prediction',
@@ -277,6 +268,7 @@ def gen_octa(groupname,
                      num_input_neurons=num_neurons,
                      num_inputs=4,
                      block_params=wta_params,
+                     seed=seed,
                      monitor=monitor)
 
     # Define a projection layer which recieves external input and relays it
@@ -418,10 +410,13 @@ def gen_octa(groupname,
                    [prediction._groups['s_exc_exc']] +\
                    [s_proj_pred]
 
-    add_group_weight_init(w_init_group,
+    add_group_param_init(w_init_group,
+                         variable='w_plast',
                          dist_param=dist_param_init,
                          scale=scale_init,
-                         distribution=distribution)
+                         distribution=distribution,
+                         clip_min=0,
+                         clip_max=1)
 
     weight_decay_group = [compression._groups['s_inp_exc']] +\
                          [compression._groups['s_exc_exc']] +\
@@ -446,12 +441,18 @@ def gen_octa(groupname,
                            [prediction._groups['s_exc_exc']] +\
                            [s_proj_pred]
 
-    add_group_weight_re_init(weight_re_init_group,
-                             re_init_index=re_init_index,
+    add_group_params_re_init(weight_re_init_group,
+                             variable='w_plast',
+                             re_init_variable='w_plast',
                              re_init_threshold=re_init_threshold,
-                             dist_param_re_init=dist_param_re_init,
-                             scale_re_init=scale_re_init,
-                             distribution=distribution)
+                             re_init_dt=50 * ms,
+                             distribution=distribution,
+                             reference='mean',
+                             dist_param=dist_param_re_init,
+                             scale=scale_re_init,
+                             re_init_indices=re_init_index,
+                             clip_min=0,
+                             clip_max=1)
 
     s_pred_proj.namespace.update({'re_init_ipred': re_init_ipred})
     s_pred_proj.namespace['re_init_threshold'] = re_init_threshold
@@ -459,8 +460,10 @@ def gen_octa(groupname,
     s_pred_proj.run_regularly('''Ipred_plast = re_init_ipred(Ipred_plast,\
                                                              N_pre,\
                                                              N_post,\
-                                                             re_init_threshold)''',
-                              dt=50 * ms)
+                                                             re_init_threshold,\
+                                                             t)''',
+                              dt=50 * ms,
+                              codeobj_class=codeobj_class_for(re_init_ipred))
 
     activity_proxy_group = [compression._groups['n_exc']] + \
                            [prediction._groups['n_exc']]
@@ -491,7 +494,7 @@ def gen_octa(groupname,
                                 method='euler',
                                 name=groupname + '_s_inp_exc')
 
-        s_inp_exc.connect('i==j')
+        s_inp_exc.connect(Banded(cutoff=0))
         s_inp_exc.weight = 3250.
 
     if noise:
@@ -506,7 +509,7 @@ def gen_octa(groupname,
                                       equation_builder=DPISyn(),
                                       name=groupname + '_noise_comp_exc')
 
-        noise_syn_c_exc.connect("i==j")
+        noise_syn_c_exc.connect(Banded(cutoff=0))
         noise_syn_c_exc.weight = noise_weight
 
         noise_syn_p_exc = Connections(testbench_c.noise_input,
@@ -514,7 +517,7 @@ def gen_octa(groupname,
                                       equation_builder=DPISyn(),
                                       name=groupname + '_noise_pred_exc')
 
-        noise_syn_p_exc.connect("i==j")
+        noise_syn_p_exc.connect(Banded(cutoff=0))
 
         noise_syn_p_exc.weight = noise_weight
         compression._groups['n_exc']._tags['noise'] = 1
@@ -48,6 +48,8 @@ import teili.tools.synaptic_kernel
 
 from teili.building_blocks.building_block import BuildingBlock
 from teili.core.groups import Neurons, Connections
+from teili.tools.connectivity import Bernoulli
+from teili.tools.random_sampling import named_seed
 
 # from teili.models.neuron_models import DPI as neuron_model
 # from teili.models.synapse_models import DPISyn as syn_model
@@ -102,6 +104,7 @@ class Reservoir(BuildingBlock):
                  additional_statevars=[],
                  num_inputs=1,
                  spatial_kernel=None,
+                 seed=None,
                  monitor=True,
                  verbose=False):
         """Summary
@@ -118,6 +121,7 @@ class Reservoir(BuildingBlock):
             fraction_inh_neurons (float, optional): Set to None to skip Dale's priciple.
             additional_statevars (list, optional): List of additional state variables which are not standard.
             num_inputs (int, optional): Number of input currents to Reservoir.
+            seed (int, optional): Seed of the random connectivity.
             monitor (bool, optional): Flag to auto-generate spike and state monitors.
             debug (bool, optional): Flag to gain additional information.
 
@@ -146,6 +150,7 @@ class Reservoir(BuildingBlock):
                                                    adjecency_mtr=adjecency_mtr,
                                                    fraction_inh_neurons=fraction_inh_neurons,
                                                    spatial_kernel=spatial_kernel,
+                                                   seed=seed,
                                                    monitor=monitor,
                                                    debug=verbose,
                                                    **block_params)
@@ -173,7 +178,7 @@ def gen_reservoir(groupname,
                   taur=0,
                   num_inputs=1,
                   fraction_inh_neurons=0.2,
-                  spatial_kernel="kernel_mexican_1d",
+                  spatial_kernel="kernel_mexican_1d", seed=None,
                   monitor=True, additional_statevars=[], debug=False):
     """Generates a reservoir network.
 
@@ -197,6 +202,7 @@ def gen_reservoir(groupname,
         num_input_neurons (int, optional): Number of neurons in the input stage.
         num_readout_neurons (int, optional): Number of neurons in the readout stage.
         spatial_kernel (str, optional):  None defaults to kernel_mexican_1d
+        seed (int, optional): Seed of the random connectivity.
         monitor (bool, optional): Flag to auto-generate spike and statemonitors.
         additional_statevars (list, optional): List of additional state variables which are not standard.
         debug (bool, optional): Flag to gain additional information.
@@ -231,7 +237,8 @@ def gen_reservoir(groupname,
                           method="euler", name='s' + groupname + '_RR')
     # connect the nearest neighbors including itself
     if Rconn_prob:
-        synRR1e.connect(p=Rconn_prob)
+        synRR1e.connect(Bernoulli(Rconn_prob,
+                                  seed=named_seed(seed, synRR1e.name)))
     # commenct according to the adjecency and weight matrix
     elif adjecency_mtr is not None:
         rows, cols = np.nonzero(adjecency_mtr[:, :, 0])
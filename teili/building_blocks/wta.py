@@ -51,12 +51,17 @@ import time
 import numpy as np
 
 from brian2 import ms, mV, pA, SpikeGeneratorGroup,\
-    SpikeMonitor, StateMonitor, core
+    SpikeMonitor, StateMonitor, core, get_device
+from brian2.devices.device import RuntimeDevice
 
 import teili.tools.synaptic_kernel
 from teili.tools.misc import print_states
-from teili.tools.distance import dist1d2dint
+from teili.tools.random_sampling import named_seed
+from teili.tools.connectivity import Banded, GridRadius, Bernoulli, \
+    BlockDiagonal
+from teili.tools.kernel_weights import kernel_weights, has_batched_kernel
 from teili.tools.indexing import ind2x, ind2y
+from teili.tools.trials import route_trials, split_trials
 
 from teili.building_blocks.building_block import BuildingBlock
 from teili.core.groups import Neurons, Connections
@@ -107,6 +112,8 @@ class WTA(BuildingBlock):
                  additional_statevars=[],
                  num_inputs=1,
                  spatial_kernel=None,
+                 seed=None,
+                 num_trials=1,
                  monitor=True,
                  verbose=False):
         """Initializes building block object with defined dimensionality and
@@ -133,6 +140,14 @@ class WTA(BuildingBlock):
             spatial_kernel (str, optional): Connectivity kernel for lateral
                 connectivity. Default is 'kernel_gauss_1d'.
                 See tools.synaptic_kernel for more detail.
+            seed (int, optional): Seed of the random connectivity. Every
+                connection draws from its own stream of the seed, named
+                after the connection, so blocks with different names are
+                connected differently. With a seed the connectivity is
+                cached on disk, see tools.connectivity.
+            num_trials (int, optional): Number of independent trials. All
+                groups hold one copy of the WTA per trial, which are only
+                connected within their trial, see tools.trials.
             monitor (bool, optional): Flag to auto-generate spike and state
                 monitors.
             verbose (bool, optional): Flag to gain additional information.
@@ -142,6 +157,7 @@ class WTA(BuildingBlock):
         """
         self.num_neurons = num_neurons
         self.dimensions = dimensions
+        self.num_trials = num_trials
         BuildingBlock.__init__(self,
                                name,
                                neuron_eq_builder,
@@ -165,6 +181,8 @@ class WTA(BuildingBlock):
                                                   monitor=monitor,
                                                   verbose=verbose,
                                                   spatial_kernel=spatial_kernel,
+                                                  seed=seed,
+                                                  num_trials=num_trials,
                                                   **block_params)
             set_wta_tags(self, self._groups)
 
@@ -183,6 +201,8 @@ class WTA(BuildingBlock):
                                                   monitor=monitor,
                                                   verbose=verbose,
                                                   spatial_kernel=spatial_kernel,
+                                                  seed=seed,
+                                                  num_trials=num_trials,
                                                   **block_params)
 
             set_wta_tags(self, self._groups)
@@ -198,6 +218,34 @@ class WTA(BuildingBlock):
         if monitor:
             self.spikemon_exc = self.monitors['spikemon_exc']
 
+    def set_trial_spikes(self, indices, times, trials):
+        """Sets the input spikes of all trials.
+
+        Args:
+            indices (ndarray): Input neuron of every spike within its
+                trial.
+            times (brian2.Quantity): Time of every spike.
+            trials (int, ndarray): Trial of every spike.
+        """
+        self.spike_gen.set_spikes(
+            route_trials(indices, trials,
+                         self.spike_gen.N // self.num_trials),
+            times)
+
+    def trial_spikes(self, monitor='spikemon_exc'):
+        """Splits the spikes recorded by a spike monitor by trial.
+
+        Args:
+            monitor (str, optional): Key of the monitor in monitors.
+
+        Returns:
+            list: Tuple of the neuron indices within the trial and the spike
+                times of every trial.
+        """
+        spikemon = self.monitors[monitor]
+        return split_trials(spikemon.i, spikemon.source.N // self.num_trials,
+                            self.num_trials, spikemon.t)
+
 
 def gen1dWTA(groupname,
              neuron_eq_builder=DPI,
@@ -210,7 +258,8 @@ def gen1dWTA(groupname,
              cutoff=10, spatial_kernel="kernel_gauss_1d",
              ei_connection_probability=1, ie_connection_probability=1,
              ii_connection_probability=0,
-             additional_statevars=[], monitor=True, verbose=False):
+             additional_statevars=[], seed=None, num_trials=1,
+             monitor=True, verbose=False):
     """Creates a 1D WTA population of neurons, including the inhibitory
     interneuron population
 
@@ -253,6 +302,8 @@ def gen1dWTA(groupname,
             Interneuron connectivity probability.
         additional_statevars (list, optional): List of additional state
             variables which are not standard.
+        seed (int, optional): Seed of the random connectivity.
+        num_trials (int, optional): Number of independent trials.
         monitor (bool, optional): Flag to auto-generate spike and state
             monitors.
         verbose (bool, optional): Flag to gain additional information.
@@ -278,12 +329,12 @@ def gen1dWTA(groupname,
     start = time.time()
 
     # create neuron groups
-    n_exc = Neurons(num_neurons,
+    n_exc = Neurons(num_neurons * num_trials,
                     equation_builder=neuron_eq_builder(
                         num_inputs=3+num_inputs),
                     refractory=rp_exc,
                     name=groupname + '__' + 'n_exc')
-    n_inh = Neurons(num_inh_neurons,
+    n_inh = Neurons(num_inh_neurons * num_trials,
                     equation_builder=neuron_eq_builder(
                         num_inputs=num_inh_inputs),
                     refractory=rp_inh,
@@ -295,7 +346,7 @@ def gen1dWTA(groupname,
     ts = np.asarray([]) * ms
     ind = np.asarray([])
     spike_gen = SpikeGeneratorGroup(
-        num_input_neurons, indices=ind, times=ts,
+        num_input_neurons * num_trials, indices=ind, times=ts,
         name=groupname + '_' + 'spike_gen')
 
     # create synapses
@@ -320,15 +371,21 @@ def gen1dWTA(groupname,
                             method='euler',
                             name=groupname + '_' + 's_inh_inh')
 
-    # connect synapses
-    s_inp_exc.connect('i==j')
+    # connect synapses, every trial only within itself
+    s_inp_exc.connect(BlockDiagonal(Banded(cutoff=0), num_trials))
     # connect the nearest neighbors including itself
-    s_exc_exc.connect('abs(i-j)<=cutoff')
+    s_exc_exc.connect(BlockDiagonal(Banded(cutoff), num_trials))
     # Generates all to all connectivity with specified probability of
     # connection
-    s_exc_inh.connect('True', p=ei_connection_probability)
-    s_inh_exc.connect('True', p=ie_connection_probability)
-    s_inh_inh.connect('True', p=ii_connection_probability)
+    s_exc_inh.connect(BlockDiagonal(
+        Bernoulli(ei_connection_probability,
+                  seed=named_seed(seed, s_exc_inh.name)), num_trials))
+    s_inh_exc.connect(BlockDiagonal(
+        Bernoulli(ie_connection_probability,
+                  seed=named_seed(seed, s_inh_exc.name)), num_trials))
+    s_inh_inh.connect(BlockDiagonal(
+        Bernoulli(ii_connection_probability,
+                  seed=named_seed(seed, s_inh_inh.name)), num_trials))
 
     s_exc_exc.add_state_variable(
         name='lateral_weight', shared=True, constant=True)
@@ -346,8 +403,14 @@ def gen1dWTA(groupname,
     s_exc_exc.lateral_weight = we_exc_exc
     s_exc_exc.lateral_sigma = sigm
     s_exc_exc.namespace.update({spatial_kernel_name: spatial_kernel_func})
-    s_exc_exc.weight = 'lateral_weight * ' + \
-        spatial_kernel_name + '(i,j,lateral_sigma)'
+    if isinstance(get_device(), RuntimeDevice) and \
+            has_batched_kernel(spatial_kernel_func):
+        s_exc_exc.weight = we_exc_exc * \
+            kernel_weights(s_exc_exc, spatial_kernel_func, sigm)
+    else:
+        # The synapses of a standalone network only exist after the build
+        s_exc_exc.weight = 'lateral_weight * ' + \
+            spatial_kernel_name + '(i,j,lateral_sigma)'
 
     _groups = {
         'n_exc': n_exc,
@@ -419,7 +482,8 @@ def gen2dWTA(groupname,
              cutoff=10, spatial_kernel="kernel_gauss_2d",
              ei_connection_probability=1.0, ie_connection_probability=1.0,
              ii_connection_probability=0.1,
-             additional_statevars=[], monitor=True, verbose=False):
+             additional_statevars=[], seed=None, num_trials=1,
+             monitor=True, verbose=False):
     '''Creates a 2D square WTA population of neurons, including the
     inhibitory interneuron population
 
@@ -461,6 +525,8 @@ def gen2dWTA(groupname,
             interneuron neuron connectivity probability.
         additional_statevars (list, optional): List of additional state
             variables which are not standard.
+        seed (int, optional): Seed of the random connectivity.
+        num_trials (int, optional): Number of independent trials.
         monitor (bool, optional): Flag to auto-generate spike and
             statemonitors.
         verbose (bool, optional): Flag to gain additional information.
@@ -488,12 +554,12 @@ def gen2dWTA(groupname,
     # create neuron groups
     num2dNeurons = num_neurons**2
     num_inh_inputs = 2
-    n_exc = Neurons(num2dNeurons,
+    n_exc = Neurons(num2dNeurons * num_trials,
                     equation_builder=neuron_eq_builder(
                         num_inputs=3+num_inputs),
                     refractory=rp_exc,
                     name=groupname + '_n_exc')
-    n_inh = Neurons(num_inh_neurons,
+    n_inh = Neurons(num_inh_neurons * num_trials,
                     equation_builder=neuron_eq_builder(
                         num_inputs=num_inh_inputs),
                     refractory=rp_inh,
@@ -502,8 +568,8 @@ def gen2dWTA(groupname,
     n_exc.namespace['num_neurons'] = num_neurons
     n_exc.namespace['ind2x'] = ind2x
     n_exc.namespace['ind2y'] = ind2y
-    n_exc.x = "ind2x(i, num_neurons,num_neurons)"
-    n_exc.y = "ind2y(i, num_neurons,num_neurons)"
+    n_exc.x = "ind2x(i % (num_neurons**2), num_neurons,num_neurons)"
+    n_exc.y = "ind2y(i % (num_neurons**2), num_neurons,num_neurons)"
 
     if num_input_neurons is None:
         num_input2d_neurons = num2dNeurons
@@ -513,7 +579,7 @@ def gen2dWTA(groupname,
     ts = np.asarray([]) * ms
     ind = np.asarray([])
     spike_gen = SpikeGeneratorGroup(
-        num_input2d_neurons, indices=ind, times=ts,
+        num_input2d_neurons * num_trials, indices=ind, times=ts,
         name=groupname + '_' + 'spike_gen')
 
     # create synapses
@@ -539,13 +605,20 @@ def gen2dWTA(groupname,
                             name=groupname + '_s_inh_inh')
 
     # connect synapses
-    s_inp_exc.connect('i==j')
+    s_inp_exc.connect(BlockDiagonal(Banded(cutoff=0), num_trials))
     # connect the nearest neighbors including itself
-    s_exc_exc.connect('dist1d2dint(i,j,num_neurons,num_neurons)<=cutoff')
+    s_exc_exc.connect(BlockDiagonal(GridRadius(cutoff, num_neurons),
+                                    num_trials))
     # Generates all to all connectivity
-    s_exc_inh.connect('True', p=ei_connection_probability)
-    s_inh_exc.connect('True', p=ie_connection_probability)
-    s_inh_inh.connect('True', p=ii_connection_probability)
+    s_exc_inh.connect(BlockDiagonal(
+        Bernoulli(ei_connection_probability,
+                  seed=named_seed(seed, s_exc_inh.name)), num_trials))
+    s_inh_exc.connect(BlockDiagonal(
+        Bernoulli(ie_connection_probability,
+                  seed=named_seed(seed, s_inh_exc.name)), num_trials))
+    s_inh_inh.connect(BlockDiagonal(
+        Bernoulli(ii_connection_probability,
+                  seed=named_seed(seed, s_inh_inh.name)), num_trials))
 
     s_exc_exc.add_state_variable(
         name='lateral_weight', shared=True, constant=True)
@@ -565,8 +638,17 @@ def gen2dWTA(groupname,
     s_exc_exc.lateral_sigma = sigm
     s_exc_exc.namespace[spatial_kernel_name] = spatial_kernel_func
     s_exc_exc.namespace['num_neurons'] = num_neurons
-    s_exc_exc.weight = 'lateral_weight * ' + spatial_kernel_name + \
-        '(i,j,lateral_sigma,num_neurons,num_neurons)'
+    # The grids of the trials are stacked along the rows
+    s_exc_exc.namespace['num_rows'] = num_neurons * num_trials
+    if isinstance(get_device(), RuntimeDevice) and \
+            has_batched_kernel(spatial_kernel_func):
+        s_exc_exc.weight = we_exc_exc * kernel_weights(
+            s_exc_exc, spatial_kernel_func, sigm, num_neurons * num_trials,
+            num_neurons)
+    else:
+        # The synapses of a standalone network only exist after the build
+        s_exc_exc.weight = 'lateral_weight * ' + spatial_kernel_name + \
+            '(i,j,lateral_sigma,num_rows,num_neurons)'
 
     _groups = {
         'n_exc': n_exc,
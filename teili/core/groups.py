@@ -28,7 +28,10 @@ from teili.models import neuron_models
 from teili.models import synapse_models
 from teili.models.builder.neuron_equation_builder import NeuronEquationBuilder
 from teili.models.builder.synapse_equation_builder import SynapseEquationBuilder
-from teili.tools.random_sampling import Randn_trunc
+from teili.tools.random_sampling import Randn_trunc, sample_randn_trunc, \
+    named_random_state
+from teili.tools.connectivity import is_connectivity, connectivity_indices, \
+    connectivity_cache
 from teili import constants
 from scipy import size
 from scipy.stats import truncnorm
@@ -254,8 +257,7 @@ class TeiliGroup(Group):
                     if i not in no_mismatch_synapse:
                         std_dict[i] = 0.2
 
-        for parameter, std in std_dict.items():
-            self._add_mismatch_param(parameter, std, seed=seed)
+        self._add_mismatch_params(std_dict, seed=seed)
 
     def _add_mismatch_param(self, param, std=0, lower=None,
                             upper=None, seed=None):
@@ -289,10 +291,12 @@ class TeiliGroup(Group):
             lower bound:        lower * std * old_param + old_param (default: 0, i.e. lower = -1/std)
             upper bound:        upper * std * old_param + old_param (default: inf)
 
-            using the function truncnorm. For details, see:
+            using the function sample_randn_trunc. For the truncated normal
+            distribution, see:
             https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.truncnorm.html
 
-            The seed will not work in standalone mode so far (TODO)
+            In standalone mode the seed only works for parameters whose
+            value is known before the run, see _add_mismatch_params().
 
         Raises:
             NameError: if one of the specified parameters in the disctionary
@@ -325,38 +329,75 @@ class TeiliGroup(Group):
             and standalone mode.
         """
 
-        if hasattr(self, param):
-            if seed is not None:
-                np_current_state = np.random.get_state()
-                np.random.seed(seed)
+        self._add_mismatch_params({param: std}, lower=lower, upper=upper,
+                                  seed=seed)
 
+    def _add_mismatch_params(self, std_dict, lower=None, upper=None,
+                             seed=None):
+        """This function adds mismatch to all parameters of std_dict at once,
+        see _add_mismatch_param() for the distribution.
+
+        The current values of the parameters are read and the perturbed
+        values are computed in numpy and written back directly, so no code
+        object is generated for the mismatch. In standalone mode this needs
+        values that are known before the run (e.g. set with set_params),
+        other parameters fall back to a Randn_trunc expression that is
+        evaluated by the compiled code and can not be seeded.
+
+        Args:
+            std_dict (dict): parameter names as keys and normalized standard
+                deviations as values.
+            lower (float, optional): lower bound for the parameter mismatch,
+                see _add_mismatch_param(). (default: -1/std)
+            upper (float, optional): upper bound for the parameter mismatch,
+                see _add_mismatch_param(). (default: inf)
+            seed (int, optional): seed value for the random generator. Each
+                parameter gets its own random stream of this seed, so its
+                mismatch neither depends on the other parameters nor changes
+                the global random state. (default: None, i.e. numpy's global
+                random state, which is set by brian2's seed())
+
+        Raises:
+            NameError: if one of the specified parameters is not included
+                in the model.
+        """
+        for param in std_dict:
+            if not hasattr(self, param):
+                raise NameError(
+                    'Mismatch not added to {} because not included in the '
+                    'model parameters'.format(param))
+
+        for param, std in std_dict.items():
             if std == 0:
-                pass
-            else:
-                if lower is None:
-                    lower = -1 / std
-                if lower < -1 / std:
-                    warnings.warn(
-                        "The output parameter can be negative." +
-                        "Set input lower between -1 and 0 to truncate" +
-                        "the distribution at 0")
-
-                if upper is None:
-                    upper = float('inf')
-
-                randn_trunc = Randn_trunc(lower, upper)
+                continue
+            param_lower = -1 / std if lower is None else lower
+            if param_lower < -1 / std:
+                warnings.warn(
+                    "The output parameter can be negative." +
+                    "Set input lower between -1 and 0 to truncate" +
+                    "the distribution at 0")
+            param_upper = float('inf') if upper is None else upper
+
+            try:
+                old_values = getattr(self, param)[:]
+            except NotImplementedError:
+                # standalone mode, value is only known at runtime
+                randn_trunc = Randn_trunc(param_lower, param_upper)
                 self.namespace.update({randn_trunc.name: randn_trunc})
                 setattr(self,
                         param,
                         param + " * (1 + " + str(std) +
                         ' * '+randn_trunc.name+"())")
+                continue
 
-            if seed is not None:
-                np.random.set_state(np_current_state)
-        else:
-            raise NameError(
-                'Mismatch not added to {} because not included in the' +
-                'model parameters'.format(param))
+            if seed is None:
+                random_state = None
+            else:
+                random_state = named_random_state(seed, param)
+            deviations = sample_randn_trunc(param_lower, param_upper,
+                                            np.shape(old_values),
+                                            random_state=random_state)
+            getattr(self, param)[:] = old_values * (1 + std * deviations)
 
     def import_eq(self, filename):
         """Function to import pre-defined neuron/synapse models.
@@ -725,6 +766,11 @@ class Connections(Synapses, TeiliGroup, Nameable):
                 that evaluates to a boolean. The expression can depend on
                 indices i and j and on pre- and post-synaptic variables.
                 Can be combined with arguments n, and p but not i or j.
+                Alternatively a connectivity generator or a scipy.sparse
+                matrix (see teili.tools.connectivity), whose synapses are
+                computed directly instead of evaluating all pairs. It
+                cannot be combined with any other argument. The synapses
+                of seeded generators are cached on disk.
             i (int, str, optional): Source neuron index.
             j (int, str, optional): Target neuron index.
             p (float, optional): Probability of connection.
@@ -737,7 +783,22 @@ class Connections(Synapses, TeiliGroup, Nameable):
             level (int, optional): Distance to the input layer needed for
                 tags.
             **Kwargs: Additional keyword arguments.
+
+        Raises:
+            ValueError: If a connectivity generator or matrix is combined
+                with other arguments.
         """
+        if is_connectivity(condition):
+            if i is not None or j is not None or p != 1 or n != 1:
+                raise ValueError("Cannot combine a connectivity generator "
+                                 "or matrix with i, j, p or n arguments")
+            i, j = connectivity_indices(condition, len(self.source),
+                                        len(self.target),
+                                        cache=connectivity_cache)
+            condition = None
+            if not len(i):
+                # brian2 does not accept empty index arrays
+                i, j, condition = None, None, False
         Synapses.connect(self, condition=condition, i=i, j=j, p=p, n=n,
                          skip_if_invalid=skip_if_invalid,
                          namespace=namespace, level=level + 1, **Kwargs)
@@ -18,8 +18,11 @@ import pprint
 
 from brian2 import Network, second, device, get_device, ms, all_devices
 from brian2 import SpikeMonitor, StateMonitor, NeuronGroup, Synapses, Quantity
+from brian2.core.network import _get_all_objects
+from brian2.devices.device import RuntimeDevice
 from teili.tools.cpptools import build_cpp_and_replace, \
-    print_dict, params2run_args
+    print_dict, params2run_args, params2file_run_args, set_num_threads
+from teili.tools.snapshot import write_snapshot, read_snapshot
 from teili.building_blocks.building_block import BuildingBlock
 
 
@@ -32,6 +35,8 @@ class TeiliNetwork(Network):
     Attributes:
         blocks (list): Description
         has_run (bool): Flag to indicate if network has been simulated already.
+        param_channel (str): How standalone_params are passed to the compiled
+            network ('argv' or 'file'), see build.
         standalone_params (dict): Dictionary of standalone parameters.
         thread (TYPE): Description
     """
@@ -47,6 +52,7 @@ class TeiliNetwork(Network):
         self.blocks = []
         self.standalone_params = OrderedDict()
         self.standalone_params['duration'] = 0 * ms
+        self.param_channel = 'argv'
         self.thread = None
 
         Network.__init__(self, *objs, **kwds)
@@ -124,7 +130,8 @@ class TeiliNetwork(Network):
 
     def build(self, report="stdout", report_period=10 * second,
               namespace=None, profile=True, level=0, recompile=False,
-              standalone_params=None, clean=True, verbose=True):
+              standalone_params=None, clean=True, verbose=True, param_channel='argv',
+              build_cache=None, incremental=False, jobs=None, num_threads=None):
         """Building the network.
 
         Args:
@@ -140,11 +147,33 @@ class TeiliNetwork(Network):
             standalone_params (dict, optional): Dictionary with standalone parameters which
                 should be changed.
             clean (bool, optional): Flag to clean-up standalone directory.
+            param_channel (str, optional): How standalone_params are passed to the
+                compiled network on run. 'argv' (default) passes each value as a float
+                main() argument, 'file' writes them to a binary parameter file, which
+                keeps double precision and allows array-valued parameters (e.g. one
+                value per neuron).
+            build_cache (bool or str, optional): Reuse compiled networks from a cache
+                directory (True for the default ~/.teili/build_cache or a path). The
+                generated code is hashed, so any structural change of the network
+                (group sizes, equations, connectivity, run_regularly code) is compiled
+                again, while e.g. a fresh process that builds the same model only
+                generates the code and copies the cached binary.
+            incremental (bool, optional): Only recompile the code objects that changed
+                since the last build in the standalone directory, instead of a clean
+                build.
+            jobs (int, optional): Number of parallel compile jobs, defaults to the
+                number of cpus.
+            num_threads (int, optional): Number of OpenMP threads of the simulation,
+                see cpptools.set_num_threads. By default, the setting of
+                activate_standalone is kept (single threaded if not set).
         """
         if get_device() == all_devices['cpp_standalone']:
             if recompile or not TeiliNetwork.has_run:
 
                 print('building network...')
+                if num_threads is not None:
+                    # has to be set before the code is generated
+                    set_num_threads(num_threads)
                 Network.run(self, duration=0 * ms, report=report, report_period=report_period,
                             namespace=namespace, profile=profile, level=level + 1)
                 TeiliNetwork.has_run = True
@@ -158,7 +187,11 @@ class TeiliNetwork(Network):
                     directory = os.path.join(os.path.expanduser("~"), "Brian2Standalone")
 
                 build_cpp_and_replace(standalone_params, standalone_dir=directory,
-                                      clean=clean, verbose=verbose)
+                                      clean=clean, verbose=verbose,
+                                      param_channel=param_channel,
+                                      build_cache=build_cache,
+                                      incremental=incremental, jobs=jobs)
+                self.param_channel = param_channel
             else:
                 print("""Network was not recompiled, standalone_params are changed,
                       but Network structure is not!
@@ -167,7 +200,8 @@ class TeiliNetwork(Network):
             print('Network was not compiled (net.build was ignored), as you have not set the device to \
                   cpp_standalone. You can still run() it using numpy code generation.')
 
-    def run(self, duration=None, standalone_params=dict(), verbose=True, **kwargs):
+    def run(self, duration=None, standalone_params=dict(), verbose=True,
+            results_directory=None, **kwargs):
         """Wrapper function to simulate a network for the given duration.
 
         Parameters which should be changeable, especially after cpp compilation, need to
@@ -180,6 +214,10 @@ class TeiliNetwork(Network):
             verbose (bool, optional) : set to False if you don't want the prints, it is set to True
                 by default, as there are things that can go wrong during string replacement etc. so it is
                 better to have a look manually.
+            results_directory (str, optional): Directory, relative to the standalone
+                directory, to which the results of this run are written in cpp standalone
+                mode. Several processes can run the same compiled network at once if each
+                of them uses its own results directory. Needs brian2 >= 2.6.
             **kwargs (optional): Additional keyword arguments.
         """
         # kwargs are if you want to use the StandaloneNetwork as a simple brian2
@@ -209,16 +247,25 @@ class TeiliNetwork(Network):
                 start_sim = time.time()
                 print_dict(standalone_params)
             # run simulation
-            run_args = params2run_args(standalone_params)
             directory = os.path.abspath(
                 get_device().build_options['directory'])
             if not os.path.isdir(directory):
                 os.mkdir(directory)
             if verbose:
                 print('standalone files are written to: ', directory)
-
-            device.run(directory=directory,
-                       with_output=True, run_args=run_args)
+            run_kwargs = {}
+            if results_directory is not None:
+                run_kwargs['results_directory'] = results_directory
+
+            if self.param_channel == 'file':
+                # The parameter file is removed after the run
+                with params2file_run_args(standalone_params) as run_args:
+                    device.run(directory=directory, with_output=True,
+                               run_args=run_args, **run_kwargs)
+            else:
+                device.run(directory=directory, with_output=True,
+                           run_args=params2run_args(standalone_params),
+                           **run_kwargs)
 
             if verbose:
                 end = time.time()
@@ -246,6 +293,116 @@ class TeiliNetwork(Network):
             target=partial(self.run, duration, **kwargs))
         self.thread.start()
 
+    def _block_hierarchy(self, block):
+        """Returns the names of the groups and sub blocks of a block."""
+        return {'name': block.name,
+                'groups': {key: group.name
+                           for key, group in block._groups.items()},
+                'sub_blocks': {key: self._block_hierarchy(sub_block)
+                               for key, sub_block in block.sub_blocks.items()}}
+
+    def _block_params(self, block):
+        """Returns the standalone_params of a block and its sub blocks."""
+        params = {block.name: block.standalone_params}
+        for sub_block in block.sub_blocks.values():
+            params.update(self._block_params(sub_block))
+        return params
+
+    def save_snapshot(self, path):
+        """Saves the state of the network to a snapshot file.
+
+        The snapshot holds all state variables and synapses of all groups,
+        the monitors, the simulation time, the random number generator,
+        the tags and standalone_params of all groups and the hierarchy
+        and standalone_params of the building blocks. The file is in the
+        columnar format of teili.tools.snapshot.
+
+        Args:
+            path (str): Filename of the snapshot.
+
+        Raises:
+            NotImplementedError: In cpp_standalone mode, which does not
+                support brian2's store/restore mechanism either.
+        """
+        if not isinstance(get_device(), RuntimeDevice):
+            raise NotImplementedError("Snapshots are only supported at "
+                                      "runtime, not in standalone mode.")
+        all_objects = _get_all_objects(self.objects)
+        # Make sure that all clocks are up to date, see Network.store
+        for clock in {obj.clock for obj in all_objects}:
+            clock._set_t_update_dt(target_t=self.t)
+        block_params = {}
+        for block in self.blocks:
+            block_params.update(self._block_params(block))
+        write_snapshot(path, {
+            'network': self._full_state(),
+            'random_state': get_device().get_random_state(),
+            'tags': {obj.name: obj._tags for obj in all_objects
+                     if hasattr(obj, '_tags')},
+            'group_params': {obj.name: obj.standalone_params
+                             for obj in all_objects
+                             if hasattr(obj, 'standalone_params')},
+            'standalone_params': self.standalone_params,
+            'blocks': [self._block_hierarchy(block) for block in self.blocks],
+            'block_params': block_params})
+
+    def load_snapshot(self, path, restore_random_state=False):
+        """Restores the state of the network from a snapshot file.
+
+        The network has to consist of the same groups and building blocks
+        as the saved one, i.e. be created by the same code. Loading
+        replaces all state variables and synapses, so a trained network
+        does not need to be trained again.
+
+        Args:
+            path (str): Filename of the snapshot, see save_snapshot.
+            restore_random_state (bool, optional): Flag to restore the state
+                of the random number generator as well.
+
+        Raises:
+            NotImplementedError: In cpp_standalone mode.
+            ValueError: If the objects or building blocks of the network do
+                not match the snapshot.
+        """
+        if not isinstance(get_device(), RuntimeDevice):
+            raise NotImplementedError("Snapshots are only supported at "
+                                      "runtime, not in standalone mode.")
+        snapshot = read_snapshot(path)
+        state = snapshot['network']
+        all_objects = _get_all_objects(self.objects)
+        clocks = {obj.clock for obj in all_objects}
+        names = {obj.name for obj in all_objects
+                 if hasattr(obj, '_restore_from_full_state')}
+        saved_names = set(state) - {clock.name for clock in clocks} - {'0_t'}
+        if names != saved_names:
+            raise ValueError(f"The snapshot does not match the network, "
+                             f"missing objects: {sorted(names - saved_names)}, "
+                             f"unknown objects: {sorted(saved_names - names)}")
+        blocks = [self._block_hierarchy(block) for block in self.blocks]
+        if blocks != snapshot['blocks']:
+            raise ValueError("The building blocks of the snapshot do not "
+                             "match the network.")
+
+        self.t_ = state['0_t']
+        for obj in all_objects:
+            if obj.name in state:
+                obj._restore_from_full_state(state[obj.name])
+        for clock in clocks:
+            clock._restore_from_full_state(state[clock.name])
+        if restore_random_state:
+            get_device().set_random_state(snapshot['random_state'])
+
+        for obj in all_objects:
+            if obj.name in snapshot['tags']:
+                obj._tags = snapshot['tags'][obj.name]
+            if obj.name in snapshot['group_params']:
+                obj.standalone_params = snapshot['group_params'][obj.name]
+        self.standalone_params = snapshot['standalone_params']
+        for block in self.blocks:
+            for name, block_params in self._block_params(block).items():
+                block_params.clear()
+                block_params.update(snapshot['block_params'][name])
+
     def print_params(self):
         """This functions prints all standalone parameters (cpp standalone network).
         """
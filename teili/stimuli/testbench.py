@@ -51,7 +51,7 @@ from brian2 import SpikeGeneratorGroup, PoissonGroup
 from brian2 import Network, SpikeMonitor
 from brian2 import second, ms, Hz
 
-from teili.tools.converter import dvs2ind, aedat2numpy
+from teili.tools.converter import dvs2ind, aedat2numpy, aedat2container
 from teili.tools.indexing import xy2ind, ind2xy
 from teili.tools.converter import delete_doublets
 
@@ -209,7 +209,7 @@ class OCTA_Testbench():
         self.DVS_SHAPE = DVS_SHAPE
         self.angles = np.arange(-np.pi / 2, np.pi * 3 / 2, 0.01)
 
-    def aedat2events(self, rec, camera='DVS128'):
+    def aedat2events(self, rec, camera='DVS128', container=False):
         """Wrapper function of the original aedat2numpy function in teili.tools.converter.
 
         This function will save events for later usage and will directly return them if no
@@ -219,12 +219,18 @@ class OCTA_Testbench():
             rec (str): Path to stored .aedat file.
             camera (str, optional): Can either be string ('DAVIS240') or int 240, which specifies
                 the larger of the 2 pixel dimension to unravel the coordinates into indices.
+            container (bool, optional): Flag to return a compact EventContainer (timestamps in us)
+                instead of the dense array. It is saved as rec.events directory of .npy files.
 
         Returns:
             events (np.ndarray): 4D numpy array with #events entries. Array is organized as x, y, ts, pol. See aedat2numpy for more details.
         """
         assert(type(rec) == str), "rec has to be a string."
         assert(os.path.isfile(rec)), "File does not exist."
+        if container:
+            events = aedat2container(datafile=rec, camera=camera)
+            events.save(rec[:-5] + 'events')
+            return events
         events = aedat2numpy(datafile=rec, camera=camera)
         np.save(rec[:-5] + 'npy', events)
         return events
@@ -632,9 +638,9 @@ class OCTA_Testbench():
         fname = rec_path + 'ball.aedat'
         assert(os.path.isfile(fname)), "No recording ball.aedat exists in {}. Please use jAER to record the stimulus and save it as ball.aedat in {}".format(
             rec_path, rec_path)
-        events = aedat2numpy(datafile=fname, camera='DVS240')
+        events = aedat2container(datafile=fname, camera='DVS240')
         ind_on, ts_on, ind_off, ts_off = dvs2ind(
-            Events=events, resolution=max(self.DVS_SHAPE), scale=True)
+            events=events, resolution=max(self.DVS_SHAPE), scale=True)
         # depending on how long conversion to index takes we might need to
         # savbe this as well
         input_on = SpikeGeneratorGroup(N=self.DVS_SHAPE[0] * self.DVS_SHAPE[1],
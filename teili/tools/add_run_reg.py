@@ -15,6 +15,8 @@ from teili.tools.run_reg_functions import re_init_params,\
     max_value_update_vm, max_value_update_imem,\
     normalize_activity_proxy_vm, normalize_activity_proxy_imem,\
     get_re_init_indices, reset_re_init_variable, lfsr
+from teili.tools.codegen_targets import codeobj_class_for
+from teili.tools.lfsr import LFSR_MASKS, lfsr_sequence
 
 
 
@@ -131,7 +133,7 @@ def add_re_init_params(group,
         if re_init_indices is None:
             group.add_state_variable('re_init_indices')
         else:
-            group.variables.add_array('re_init_indices', size=np.int(size))
+            group.variables.add_array('re_init_indices', size=int(size))
 
         group.namespace.update({'get_re_init_indices': get_re_init_indices})
         group.run_regularly(f'''re_init_indices = get_re_init_indices(\
@@ -141,14 +143,16 @@ def add_re_init_params(group,
                                    lastspike,\
                                    t)''',
                             order=0,
-                            dt=re_init_dt)
+                            dt=re_init_dt,
+                            codeobj_class=codeobj_class_for(get_re_init_indices))
         group.namespace.update({'reset_re_init_variable': reset_re_init_variable})
         group.run_regularly(f'''{re_init_variable} = reset_re_init_variable(\
                                    {re_init_variable},\
                                    {reference},\
                                    re_init_indices)''',
                             when='end',
-                            dt=re_init_dt)
+                            dt=re_init_dt,
+                            codeobj_class=codeobj_class_for(reset_re_init_variable))
 
     # TODO This needs double checking. I believe the name in namespace needs
     # to match the function name itself. So we might need to remove the format.
@@ -164,7 +168,8 @@ def add_re_init_params(group,
                                                         {dist},\
                                                         {params_type})*{unit}''',
                         order=1,
-                        dt=re_init_dt)
+                        dt=re_init_dt,
+                        codeobj_class=codeobj_class_for(re_init_params))
 
 
 def add_activity_proxy(group, buffer_size, decay):
@@ -181,45 +186,49 @@ def add_activity_proxy(group, buffer_size, decay):
             weighted activity proxy
     """
     if 'Imem' in group.equations.names:
-        group.namespace.update({'get_activity_proxy': get_activity_proxy_imem})
-        group.namespace.update({'max_value_update': max_value_update_imem})
-        group.namespace.update(
-            {'normalize_activity_proxy': normalize_activity_proxy_imem})
+        get_activity_proxy = get_activity_proxy_imem
+        max_value_update = max_value_update_imem
+        normalize_activity_proxy = normalize_activity_proxy_imem
     else:
-        group.namespace.update({'get_activity_proxy': get_activity_proxy_vm})
-        group.namespace.update({'max_value_update': max_value_update_vm})
-        group.namespace.update(
-            {'normalize_activity_proxy': normalize_activity_proxy_vm})
+        get_activity_proxy = get_activity_proxy_vm
+        max_value_update = max_value_update_vm
+        normalize_activity_proxy = normalize_activity_proxy_vm
+    group.namespace.update({'get_activity_proxy': get_activity_proxy})
+    group.namespace.update({'max_value_update': max_value_update})
+    group.namespace.update(
+        {'normalize_activity_proxy': normalize_activity_proxy})
 
     group.add_state_variable('buffer_size', shared=True, constant=True)
     group.add_state_variable('buffer_pointer', shared=True, constant=True)
 
     group.buffer_size = buffer_size
     group.buffer_pointer = -1
-    group.variables.add_array('membrane_buffer', size=(group.N, buffer_size))
-    group.variables.add_array('kernel_adp', size=(group.N, buffer_size))
-    group.variables.add_array('old_max', size=1)
-    group.membrane_buffer = np.nan
+    # Buffer and kernel are stored flattened (one row of buffer_size per
+    # neuron) and old_max once per neuron, as cpp_standalone only supports
+    # one-dimensional arrays of the group's size
+    group.variables.add_array('membrane_buffer', size=group.N * buffer_size)
+    group.variables.add_array('kernel_adp', size=group.N * buffer_size)
+    group.variables.add_array('old_max', size=group.N)
+    group.membrane_buffer = np.full(group.N * buffer_size, np.nan)
 
-    mask = np.zeros(np.shape(group.kernel_adp)[1]) * np.nan
-    for jj in range(np.shape(group.kernel_adp)[1]):
-        mask[jj] = np.exp((jj - (np.shape(group.kernel_adp)[1] - 1)) / decay)
-    for ii in range(np.shape(group.kernel_adp)[0]):
-        ind = (np.ones(np.shape(group.kernel_adp)[1]) * ii).astype(int)
-        group.kernel_adp.set_with_index_array(
-            item=ind, value=mask, check_units=False)
+    mask = np.exp((np.arange(buffer_size) - (buffer_size - 1)) / decay)
+    group.kernel_adp = np.tile(mask, group.N)
 
     if 'Imem' in group.equations.names:
         group.run_regularly('''buffer_pointer = (buffer_pointer + 1) % buffer_size;\
-        activity_proxy = get_activity_proxy(Imem, buffer_pointer, membrane_buffer, kernel_adp)''', dt=1 * ms)
+        activity_proxy = get_activity_proxy(Imem, buffer_pointer, membrane_buffer, kernel_adp, t)''', dt=1 * ms,
+            codeobj_class=codeobj_class_for(get_activity_proxy))
     else:
         group.run_regularly('''buffer_pointer = (buffer_pointer + 1) % buffer_size;\
-        activity_proxy = get_activity_proxy(Vm, buffer_pointer, membrane_buffer, kernel_adp)''', dt=1 * ms)
+        activity_proxy = get_activity_proxy(Vm, buffer_pointer, membrane_buffer, kernel_adp)''', dt=1 * ms,
+            codeobj_class=codeobj_class_for(get_activity_proxy))
 
     group.run_regularly(
-        '''old_max = max_value_update(activity_proxy, old_max)''', dt=5 * ms)
+        '''old_max = max_value_update(activity_proxy, old_max, t)''', dt=5 * ms,
+        codeobj_class=codeobj_class_for(max_value_update))
     group.run_regularly(
-        '''normalized_activity_proxy = normalize_activity_proxy(activity_proxy, old_max)''', dt=5 * ms)
+        '''normalized_activity_proxy = normalize_activity_proxy(activity_proxy, old_max)''', dt=5 * ms,
+        codeobj_class=codeobj_class_for(normalize_activity_proxy))
 
 
 def add_weight_decay(group, decay_rate, dt):
@@ -272,16 +281,8 @@ def add_lfsr(group, lfsr_seed, dt):
         else:
             num_elements_stdp = 0
         num_elements = num_elements_syn + num_elements_stdp
-    lfsr_out = [0 for _ in range(num_elements)]
-    taps = {3: 0b1011, 5: 0b100101, 6:0b1000011, 9: 0b1000010001}
-    mask = taps[num_bits]
-
-    for i in range(num_elements):
-        lfsr_seed = lfsr_seed << 1
-        overflow = lfsr_seed >> num_bits
-        if overflow:
-            lfsr_seed ^= mask
-        lfsr_out[i] = lfsr_seed
+    mask = LFSR_MASKS[num_bits]
+    lfsr_out = lfsr_sequence(lfsr_seed, num_elements, num_bits, mask)
 
     group.add_state_variable('mask', shared=True, constant=True)
     group.mask = mask
@@ -293,7 +294,8 @@ def add_lfsr(group, lfsr_seed, dt):
                                                          lfsr_num_bits,\
                                                          mask)
                              ''',
-                             dt=dt)
+                             dt=dt,
+                             codeobj_class=codeobj_class_for(lfsr))
     else:
         group.decay_probability_syn = np.asarray(lfsr_out)[0:num_elements_syn]/2**num_bits
         group.namespace.update({'lfsr': lfsr})
@@ -302,7 +304,8 @@ def add_lfsr(group, lfsr_seed, dt):
                                                          lfsr_num_bits_syn,\
                                                          mask)
                              ''',
-                             dt=dt)
+                             dt=dt,
+                             codeobj_class=codeobj_class_for(lfsr))
         if hasattr(group, 'decay_probability_stdp'):
             group.decay_probability_stdp = np.asarray(lfsr_out)[num_elements_syn:]/2**num_bits
             group.run_regularly('''decay_probability_stdp = lfsr(decay_probability_stdp,\
@@ -310,4 +313,5 @@ def add_lfsr(group, lfsr_seed, dt):
                                                              lfsr_num_bits_syn,\
                                                              mask)
                                  ''',
-                                 dt=dt)
+                                 dt=dt,
+                                 codeobj_class=codeobj_class_for(lfsr))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Registry of the code generation targets supported by teili's functions.
+
+brian2 generates the code of all objects for one target
+(prefs.codegen.target or the cpp_standalone device), but every object can
+override it with its codeobj_class. A group which calls a function that is
+not implemented for the current target, e.g. a numpy-only run_regularly
+function while the rest of the network uses cython, therefore only needs
+to pin the objects which call the function to numpy instead of changing
+the target of the whole process.
+
+Example:
+    >>> from teili.tools.codegen_targets import register_function,\
+            codeobj_class_for
+    >>> register_function(re_init_ipred)
+    >>> group.run_regularly('Ipred_plast = re_init_ipred(...)',
+                            codeobj_class=codeobj_class_for(re_init_ipred))
+"""
+
+from collections import OrderedDict
+
+from brian2 import get_device
+from brian2.codegen.targets import codegen_targets
+from brian2.codegen.runtime.numpy_rt import NumpyCodeObject
+from brian2.devices.device import RuntimeDevice
+from brian2.devices.cpp_standalone.codeobject import CPPStandaloneCodeObject
+
+FUNCTION_TARGETS = OrderedDict()
+
+
+def _code_object_classes():
+    """Returns all CodeObject classes teili functions can be used with.
+
+    Returns:
+        list: Runtime targets and the standalone target.
+    """
+    return [codeobj_class for codeobj_class in codegen_targets
+            if codeobj_class is not CPPStandaloneCodeObject] + \
+        [CPPStandaloneCodeObject]
+
+
+def target_name(codeobj_class):
+    """Returns the name of the target of a CodeObject class.
+
+    Args:
+        codeobj_class (class): CodeObject class, e.g. NumpyCodeObject.
+
+    Returns:
+        str: 'cpp_standalone' for the standalone device, otherwise the
+            class_name, e.g. 'numpy' or 'cython'.
+    """
+    if issubclass(codeobj_class, CPPStandaloneCodeObject):
+        return 'cpp_standalone'
+    return codeobj_class.class_name
+
+
+def _function_name(function):
+    return getattr(function, 'pyfunc', function).__name__
+
+
+def register_function(function, targets=None):
+    """Declares the targets a function supports.
+
+    Args:
+        function (brian2.Function): Function as added to a namespace.
+        targets (list, optional): Names of the supported targets ('numpy',
+            'cython', 'cpp_standalone'). By default the targets are derived
+            from the implementations of the function. Cython would call a
+            numpy implementation element by element, which breaks functions
+            working on whole arrays, so it needs its own implementation.
+
+    Returns:
+        tuple: Names of the supported targets.
+    """
+    if targets is None:
+        targets = []
+        try:
+            numpy_implementation = function.implementations[NumpyCodeObject]
+        except KeyError:
+            numpy_implementation = None
+        for codeobj_class in _code_object_classes():
+            try:
+                implementation = function.implementations[codeobj_class]
+            except KeyError:
+                continue
+            if codeobj_class is NumpyCodeObject or \
+                    implementation is not numpy_implementation:
+                targets.append(target_name(codeobj_class))
+    FUNCTION_TARGETS[_function_name(function)] = tuple(targets)
+    return FUNCTION_TARGETS[_function_name(function)]
+
+
+def supported_targets(function):
+    """Returns the targets a function supports.
+
+    Args:
+        function (brian2.Function): Function as added to a namespace.
+
+    Returns:
+        tuple: Names of the supported targets. Unregistered functions are
+            registered with the targets of their implementations.
+    """
+    if _function_name(function) not in FUNCTION_TARGETS:
+        return register_function(function)
+    return FUNCTION_TARGETS[_function_name(function)]
+
+
+def codeobj_class_for(*functions):
+    """Selects the CodeObject class of an object which calls the given
+    functions.
+
+    Args:
+        *functions (brian2.Function): Functions called by the object.
+
+    Returns:
+        class: None if all functions support the current target, i.e. the
+            object uses the target of the network, otherwise NumpyCodeObject.
+
+    Raises:
+        NotImplementedError: If a function is neither implemented for the
+            current target nor for numpy at runtime, e.g. a numpy-only
+            function in cpp_standalone mode.
+    """
+    device = get_device()
+    target = target_name(device.code_object_class())
+    unsupported = [_function_name(function) for function in functions
+                   if target not in supported_targets(function)]
+    if not unsupported:
+        return None
+    if isinstance(device, RuntimeDevice) and \
+            all(NumpyCodeObject.class_name in supported_targets(function)
+                for function in functions):
+        return NumpyCodeObject
+    raise NotImplementedError(f"{', '.join(unsupported)} not implemented "
+                              f"for target '{target}'.")
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""Connectivity generators for Connections.connect.
+
+brian2 evaluates a string condition such as 'abs(i-j)<=cutoff' for all
+N_pre x N_post pairs of neurons. The generators of this module compute
+the pre- and post-synaptic indices of the synapses directly, so
+connecting costs O(#synapses):
+
+    * Banded: abs(i - j) <= cutoff, e.g. nearest neighbours in 1D.
+    * GridRadius: distance on a 2D grid <= radius, like
+      dist1d2dint(i, j, nrows, ncols) <= radius.
+    * FixedInDegree: a fixed number of random pre-synaptic neurons per
+      post-synaptic neuron.
+    * Bernoulli: every pair with probability p, sampled by skipping the
+      pairs in between.
+    * BlockDiagonal: the same connectivity between consecutive blocks of
+      both groups, e.g. between the copies of a network replicated for
+      several trials.
+
+Connections.connect accepts these generators as well as scipy.sparse
+matrices of shape (N_pre, N_post), whose non-zero entries are connected.
+Synapses are created ordered by i and then j, as brian2 does for
+conditions.
+
+The random generators take a seed, which makes their synapses only
+depend on their parameters and the group sizes. Connections.connect then
+stores the synapses in an on-disk cache (see DEFAULT_CONNECTIVITY_CACHE),
+so repeated experiments and parallel workers load them instead of
+sampling them again.
+
+Example:
+    >>> from teili.tools.connectivity import Banded, Bernoulli
+    >>> s_exc_exc.connect(Banded(cutoff=2))
+    >>> s_exc_inh.connect(Bernoulli(p=0.5, seed=42))
+"""
+
+import hashlib
+import os
+import uuid
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_CONNECTIVITY_CACHE = os.path.join(os.path.expanduser("~"), ".teili",
+                                          "connectivity")
+# Changes whenever generators create different synapses for the same key
+_CACHE_VERSION = 1
+
+
+class ConnectivityGenerator(object):
+    """Base class of the generators, which provide the indices of the
+    synapses between two groups.
+    """
+
+    def indices(self, N_pre, N_post):
+        """Computes the synapses between two groups.
+
+        Args:
+            N_pre (int): Size of the pre-synaptic group.
+            N_post (int): Size of the post-synaptic group.
+
+        Returns:
+            tuple: Pre- and post-synaptic indices (i, j) of the synapses.
+        """
+        raise NotImplementedError
+
+    def cache_key(self, N_pre, N_post):
+        """Returns the key of the synapses in a ConnectivityCache.
+
+        Args:
+            N_pre (int): Size of the pre-synaptic group.
+            N_post (int): Size of the post-synaptic group.
+
+        Returns:
+            tuple: Key, None if the synapses are not deterministic or
+                cheaper to compute than to load.
+        """
+        return None
+
+
+def _seeded_random_state(random_state, seed):
+    if random_state is not None and seed is not None:
+        raise ValueError("Cannot set both random_state and seed.")
+    if seed is not None:
+        return np.random.RandomState(seed)
+    return np.random if random_state is None else random_state
+
+
+def _hashable_seed(seed):
+    return seed if seed is None or np.isscalar(seed) else tuple(seed)
+
+
+class Banded(ConnectivityGenerator):
+    """Connects neurons whose indices differ by at most cutoff, as
+    'abs(i-j)<=cutoff' does.
+
+    Attributes:
+        cutoff (int): Maximal difference of the indices.
+    """
+
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+
+    def indices(self, N_pre, N_post):
+        offsets = np.arange(-np.floor(self.cutoff), np.floor(self.cutoff) + 1,
+                            dtype=int)
+        i = np.repeat(np.arange(N_pre), len(offsets))
+        j = i + np.tile(offsets, N_pre)
+        valid = (j >= 0) & (j < N_post)
+        return i[valid], j[valid]
+
+
+class GridRadius(ConnectivityGenerator):
+    """Connects neurons of two groups on the same 2D grid whose distance
+    is at most radius, as 'dist1d2dint(i,j,nrows,ncols)<=radius' does.
+
+    Attributes:
+        radius (float): Maximal distance.
+        nrows (int): Number of rows of the grid.
+        ncols (int): Number of columns of the grid.
+    """
+
+    def __init__(self, radius, nrows, ncols=None):
+        self.radius = radius
+        self.nrows = nrows
+        self.ncols = nrows if ncols is None else ncols
+
+    def indices(self, N_pre, N_post):
+        if not N_pre == N_post == self.nrows * self.ncols:
+            raise ValueError(f"GridRadius needs groups of size "
+                             f"{self.nrows * self.ncols}, got {N_pre} and "
+                             f"{N_post}.")
+        span = int(np.floor(self.radius))
+        dx, dy = np.meshgrid(np.arange(-span, span + 1),
+                             np.arange(-span, span + 1), indexing='ij')
+        within = np.sqrt(dx**2 + dy**2) <= self.radius
+        dx, dy = dx[within], dy[within]
+        # Neuron i sits at (i // ncols, i % ncols), see ind2xy
+        i = np.repeat(np.arange(N_pre), len(dx))
+        x = i // self.ncols + np.tile(dx, N_pre)
+        y = i % self.ncols + np.tile(dy, N_pre)
+        valid = (x >= 0) & (x < self.nrows) & (y >= 0) & (y < self.ncols)
+        return i[valid], x[valid] * self.ncols + y[valid]
+
+
+class FixedInDegree(ConnectivityGenerator):
+    """Connects every post-synaptic neuron to in_degree different,
+    randomly chosen pre-synaptic neurons.
+
+    Attributes:
+        in_degree (int): Number of synapses per post-synaptic neuron.
+        random_state (numpy.random.RandomState): Source of randomness,
+            None for numpy's global random state.
+        seed (int, tuple): Seed of a new random state for every call of
+            indices, which makes the synapses cacheable.
+    """
+
+    def __init__(self, in_degree, random_state=None, seed=None):
+        self.in_degree = int(in_degree)
+        self.random_state = random_state
+        self.seed = _hashable_seed(seed)
+
+    def cache_key(self, N_pre, N_post):
+        if self.seed is None:
+            return None
+        return ('FixedInDegree', self.in_degree, self.seed, N_pre, N_post)
+
+    def indices(self, N_pre, N_post):
+        if self.in_degree > N_pre:
+            raise ValueError(f"Cannot draw {self.in_degree} synapses from "
+                             f"{N_pre} pre-synaptic neurons.")
+        random_state = _seeded_random_state(self.random_state, self.seed)
+        if 2 * self.in_degree > N_pre:
+            # Dense: the first in_degree of a random permutation per neuron
+            i = np.argsort(random_state.uniform(size=(N_post, N_pre)),
+                           axis=1)[:, :self.in_degree]
+        else:
+            # Sparse: redraw the neurons which drew a pre-synaptic neuron
+            # twice
+            i = random_state.randint(N_pre, size=(N_post, self.in_degree))
+            while True:
+                i.sort(axis=1)
+                duplicates = np.any(i[:, 1:] == i[:, :-1], axis=1)
+                if not np.any(duplicates):
+                    break
+                i[duplicates] = random_state.randint(
+                    N_pre, size=(np.sum(duplicates), self.in_degree))
+        j = np.repeat(np.arange(N_post), self.in_degree)
+        i = i.ravel()
+        order = np.lexsort((j, i))
+        return i[order], j[order]
+
+
+class Bernoulli(ConnectivityGenerator):
+    """Connects every pair of neurons with probability p, as
+    connect('True', p=p) does.
+
+    The gaps between the synapses are geometrically distributed, so only
+    the synapses are sampled instead of all pairs.
+
+    Attributes:
+        p (float): Connection probability.
+        random_state (numpy.random.RandomState): Source of randomness,
+            None for numpy's global random state.
+        seed (int, tuple): Seed of a new random state for every call of
+            indices, which makes the synapses cacheable.
+    """
+
+    def __init__(self, p, random_state=None, seed=None):
+        self.p = p
+        self.random_state = random_state
+        self.seed = _hashable_seed(seed)
+
+    def cache_key(self, N_pre, N_post):
+        if self.seed is None or self.p <= 0 or self.p >= 1:
+            return None
+        return ('Bernoulli', float(self.p), self.seed, N_pre, N_post)
+
+    def indices(self, N_pre, N_post):
+        num_pairs = N_pre * N_post
+        if self.p >= 1:
+            positions = np.arange(num_pairs)
+        elif self.p <= 0 or num_pairs == 0:
+            positions = np.zeros(0, dtype=int)
+        else:
+            random_state = _seeded_random_state(self.random_state,
+                                                self.seed)
+            expected = num_pairs * self.p
+            chunk_size = int(expected + 5 * np.sqrt(expected) + 10)
+            positions = np.cumsum(
+                random_state.geometric(self.p, size=chunk_size)) - 1
+            while positions[-1] < num_pairs:
+                positions = np.concatenate([positions, positions[-1] + np.cumsum(
+                    random_state.geometric(self.p, size=chunk_size))])
+            positions = positions[positions < num_pairs]
+        return positions // N_post, positions % N_post
+
+
+class BlockDiagonal(ConnectivityGenerator):
+    """Repeats a connectivity between num_blocks consecutive blocks of
+    neurons of both groups. The synapses of one block are computed once,
+    so all blocks are connected identically.
+
+    Attributes:
+        connectivity (ConnectivityGenerator, scipy.sparse matrix):
+            Connectivity of one block.
+        num_blocks (int): Number of blocks.
+    """
+
+    def __init__(self, connectivity, num_blocks):
+        self.connectivity = connectivity
+        self.num_blocks = int(num_blocks)
+
+    def cache_key(self, N_pre, N_post):
+        if not isinstance(self.connectivity, ConnectivityGenerator):
+            return None
+        key = self.connectivity.cache_key(N_pre // self.num_blocks,
+                                          N_post // self.num_blocks)
+        if key is None:
+            return None
+        return ('BlockDiagonal', self.num_blocks, key)
+
+    def indices(self, N_pre, N_post):
+        if N_pre % self.num_blocks or N_post % self.num_blocks:
+            raise ValueError(f"Groups of size {N_pre} and {N_post} cannot "
+                             f"be split into {self.num_blocks} blocks.")
+        block_pre = N_pre // self.num_blocks
+        block_post = N_post // self.num_blocks
+        i, j = connectivity_indices(self.connectivity, block_pre, block_post)
+        blocks = np.arange(self.num_blocks)[:, np.newaxis]
+        return (np.ravel(i + blocks * block_pre),
+                np.ravel(j + blocks * block_post))
+
+
+class ConnectivityCache(object):
+    """On-disk cache of the synapses of seeded generators.
+
+    Every entry is a compressed .npz file named after the hash of its key,
+    which holds the arrays i and j and optionally further arrays like
+    weights. Files are written atomically, so parallel processes can
+    share the cache directory.
+
+    Attributes:
+        cache_dir (str): Directory of the cache, None to disable it.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CONNECTIVITY_CACHE):
+        self.cache_dir = cache_dir
+
+    def indices(self, generator, N_pre, N_post):
+        """Loads the synapses of a generator or computes and stores them.
+
+        Args:
+            generator (ConnectivityGenerator): Connectivity generator.
+            N_pre (int): Size of the pre-synaptic group.
+            N_post (int): Size of the post-synaptic group.
+
+        Returns:
+            tuple: Pre- and post-synaptic indices (i, j) of the synapses.
+        """
+        key = generator.cache_key(N_pre, N_post)
+        if key is None:
+            return generator.indices(N_pre, N_post)
+        arrays = self.load(key)
+        if arrays is not None and 'i' in arrays and 'j' in arrays:
+            return arrays['i'], arrays['j']
+        i, j = generator.indices(N_pre, N_post)
+        self.store(key, i=i, j=j)
+        return i, j
+
+    def load(self, key):
+        """Loads the arrays of an entry.
+
+        Args:
+            key (tuple): Key of the entry, e.g. a block type, its
+                parameters and a seed.
+
+        Returns:
+            dict: Arrays of the entry, None if it is not cached.
+        """
+        if self.cache_dir is None:
+            return None
+        try:
+            with np.load(self._filename(key)) as data:
+                return {name: data[name] for name in data.files}
+        except (IOError, ValueError):
+            return None
+
+    def store(self, key, **arrays):
+        """Stores arrays as an entry. They are written to a temporary file
+        which is then renamed, so other processes never read a partial file.
+
+        Args:
+            key (tuple): Key of the entry.
+            **arrays (ndarray): Arrays to store, e.g. i, j and weight.
+        """
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_filename = os.path.join(self.cache_dir,
+                                        '.tmp_' + uuid.uuid4().hex + '.npz')
+            np.savez_compressed(tmp_filename, **arrays)
+            os.replace(tmp_filename, self._filename(key))
+        except OSError:  # e.g. read-only home, the arrays are still used
+            pass
+
+    def _filename(self, key):
+        digest = hashlib.sha1(repr((_CACHE_VERSION, key)).encode())
+        return os.path.join(self.cache_dir,
+                            'connectivity_{}.npz'.format(digest.hexdigest()))
+
+
+connectivity_cache = ConnectivityCache()
+
+
+def connectivity_indices(connectivity, N_pre, N_post, cache=None):
+    """Computes the synapses of a generator or sparse matrix.
+
+    Args:
+        connectivity (ConnectivityGenerator, scipy.sparse matrix):
+            Connectivity, a sparse matrix needs the shape (N_pre, N_post).
+        N_pre (int): Size of the pre-synaptic group.
+        N_post (int): Size of the post-synaptic group.
+        cache (ConnectivityCache, optional): Cache of the synapses of
+            seeded generators.
+
+    Returns:
+        tuple: Pre- and post-synaptic indices (i, j) of the synapses,
+            ordered by i and then j.
+
+    Raises:
+        ValueError: If the matrix does not match the groups.
+    """
+    if isinstance(connectivity, ConnectivityGenerator):
+        if cache is not None:
+            return cache.indices(connectivity, N_pre, N_post)
+        return connectivity.indices(N_pre, N_post)
+    if connectivity.shape != (N_pre, N_post):
+        raise ValueError(f"Connectivity matrix of shape {connectivity.shape} "
+                         f"does not match groups of size {N_pre} and "
+                         f"{N_post}.")
+    matrix = sparse.coo_matrix(connectivity)
+    matrix.eliminate_zeros()
+    order = np.lexsort((matrix.col, matrix.row))
+    return matrix.row[order], matrix.col[order]
+
+
+def is_connectivity(connectivity):
+    """Checks if Connections.connect should use connectivity_indices.
+
+    Args:
+        connectivity (object): condition passed to Connections.connect.
+
+    Returns:
+        bool: True for generators and scipy.sparse matrices.
+    """
+    return isinstance(connectivity, ConnectivityGenerator) or \
+        sparse.issparse(connectivity)
@@ -8,11 +8,71 @@ In particular, there are functions to convert data coming from DVS cameras.
 # @Date:   2017-12-27 12:07:15
 
 import os
+import warnings
 import numpy as np
 import struct
 import itertools
 
 from teili.tools.indexing import xy2ind
+from teili.tools.event_container import EventContainer, EVENT_DTYPES, \
+    is_event_container_path, TIMESTAMP_SCALES
+
+EVT_DVS = 0  # DVS event type
+EVT_APS = 1  # APS event
+
+
+def unique_events_mask(indices, spiketimes, delta_t=0):
+    """Finds events which repeat a kept event of the same index within delta_t.
+
+    Events are sorted by index and timestamp (stable, so ties keep their
+    original order). The first event of each index is kept, and every
+    following event is removed if it happened at most delta_t after the
+    last kept event of the same index. A pixel which fires every delta_t
+    therefore keeps every other event, as the original per-event rescan
+    did. Events more than delta_t after their predecessor are kept in one
+    vectorised pass, only chains of closer events are walked by jumping
+    with searchsorted from one kept event to the next. Cost is
+    O(n log n) instead of rescanning all events per event.
+
+    Args:
+        indices (numpy.ndarray): Neuron/pixel index of each event.
+        spiketimes (numpy.ndarray): Timestamp of each event.
+        delta_t (float, optional): Events of the same index which are at
+            most delta_t after a kept event count as duplicates. Default 0
+            only removes events with identical index and timestamp.
+
+    Returns:
+        numpy.ndarray: Boolean mask in the original event order, True for
+            events which are kept.
+    """
+    indices = np.asarray(indices)
+    spiketimes = np.asarray(spiketimes)
+    order = np.lexsort((spiketimes, indices))
+    sorted_indices = indices[order]
+    sorted_times = spiketimes[order]
+
+    keep_sorted = np.ones(len(order), dtype=bool)
+    keep_sorted[1:] = np.logical_or(sorted_indices[1:] != sorted_indices[:-1],
+                                    np.diff(sorted_times) > delta_t)
+    # Events within delta_t of their predecessor follow a kept event in a
+    # chain of the same index. Whether they are kept depends on the last
+    # kept event, not on their predecessor.
+    starts = np.flatnonzero(keep_sorted)
+    stops = np.append(starts[1:], len(order))
+    chains = stops - starts > 1
+    for start, stop in zip(starts[chains], stops[chains]):
+        times = sorted_times[start:stop]
+        keep_sorted[start + 1:stop] = False
+        kept = 0
+        while True:
+            kept = np.searchsorted(times, times[kept] + delta_t, side='right')
+            if kept >= len(times):
+                break
+            keep_sorted[start + kept] = True
+
+    keep = np.empty_like(keep_sorted)
+    keep[order] = keep_sorted
+    return keep
 
 
 def delete_doublets(spiketimes, indices, verbose=False):
@@ -24,13 +84,12 @@ def delete_doublets(spiketimes, indices, verbose=False):
     :return: same as input but with removed doublets
     """
     len_before = len(spiketimes)
-    buff_data = np.vstack((spiketimes, indices)).T
-    buff_data[:, 0] = buff_data[:, 0].astype(int)
-    _, idx = np.unique(buff_data, axis=0, return_index=True)
-    buff_data = buff_data[np.sort(idx), :]
+    spiketimes = np.asarray(spiketimes).astype(int).astype(float)
+    indices = np.asarray(indices)
+    keep = unique_events_mask(indices, spiketimes)
 
-    spiketimes = buff_data[:, 0]
-    indices = np.asarray(buff_data[:, 1], dtype=int)
+    spiketimes = spiketimes[keep]
+    indices = np.asarray(indices[keep], dtype=int)
 
     if verbose:
         print(len_before - len(spiketimes), 'spikes removed')
@@ -120,6 +179,406 @@ def read_events(file_read, x_dim, y_dim):
             np.array(spec_ts_tot))
 
 
+# Address masks and shifts of jAER AEDAT 2.0 recordings. Values are taken
+# from scripts/matlab/getDVS*.m. Only the DAVIS240 encodes an event type
+# (DVS/APS) in the most significant bit.
+AEDAT2_CAMERAS = {
+    'DVS128': {'xmask': 0x00fe, 'xshift': 1,
+               'ymask': 0x7f00, 'yshift': 8,
+               'pmask': 0x1, 'pshift': 0,
+               'x_dim': 128, 'eventtypeshift': None},
+    'DAVIS240': {'xmask': 0x003ff000, 'xshift': 12,
+                 'ymask': 0x7fc00000, 'yshift': 22,
+                 'pmask': 0x800, 'pshift': 11,
+                 'x_dim': 240, 'eventtypeshift': 31},
+}
+
+# One AE event per record, big endian: address followed by timestamp.
+AEDAT2_DTYPES = {
+    'V1': np.dtype([('addr', '>u2'), ('ts', '>u4')]),  # ushort, ulong = 2B+4B
+    'V2': np.dtype([('addr', '>u4'), ('ts', '>u4')]),  # 2x ulong, 4B+4B
+}
+
+def aedat2_header_size(datafile):
+    """Returns the size of the ascii header of an AEDAT 1.0/2.0 file.
+
+    Args:
+        datafile (str): Path to the aedat recording.
+
+    Returns:
+        int: Number of bytes before the first event.
+    """
+    header_size = 0
+    with open(datafile, 'rb') as aerdatafh:
+        lt = aerdatafh.readline()
+        while lt.startswith(b'#'):
+            header_size += len(lt)
+            lt = aerdatafh.readline()
+    return header_size
+
+
+def _aedat2_memmap(datafile, length=0, version='V2'):
+    """Memory-maps the event records of an AEDAT 1.0/2.0 file.
+
+    Args:
+        datafile (str): Path to the aedat recording.
+        length (int, optional): how many bytes(B) should be read;
+            default 0=whole file.
+        version (str, optional): File format version, 'V1' or 'V2'.
+
+    Returns:
+        numpy.memmap: Structured array with fields addr and ts. Only
+            complete events are mapped.
+    """
+    dtype = AEDAT2_DTYPES[version]
+    header_size = aedat2_header_size(datafile)
+    if length == 0:
+        length = os.stat(datafile).st_size
+    num_events = max(length - header_size, 0) // dtype.itemsize
+    if num_events == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(datafile, dtype=dtype, mode='r',
+                     offset=header_size, shape=(num_events,))
+
+
+def _decode_aedat2_columns(addr, ts, camera='DVS128'):
+    """Decodes AEDAT 1.0/2.0 address and timestamp words into columns.
+
+    Masks and shifts are applied to the whole arrays at once.
+
+    Args:
+        addr (numpy.ndarray): Raw address words.
+        ts (numpy.ndarray): Raw timestamps in us.
+        camera (str, optional): Type of event-based camera.
+
+    Returns:
+        tuple: x, y, ts (in us) and pol int64 arrays of all DVS events.
+
+    Raises:
+        ValueError: If the camera is not supported.
+    """
+    try:
+        cam = AEDAT2_CAMERAS[camera]
+    except KeyError:
+        raise ValueError("Unsupported camera: %s" % (camera))
+
+    # Signed integers, such that out-of-range addresses are flipped to
+    # negative coordinates instead of wrapping around
+    addr = np.asarray(addr, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.int64)
+    if cam['eventtypeshift'] is not None:
+        # Only keep DVS events, i.e. discard APS events
+        is_dvs = (addr >> cam['eventtypeshift']) == EVT_DVS
+        addr = addr[is_dvs]
+        ts = ts[is_dvs]
+
+    # Set the coordinate (0,0) at the bottom left corner:
+    # NOTE: jAER orgin is at the bottom right corner.
+    x = cam['x_dim'] - ((addr & cam['xmask']) >> cam['xshift']) - 1
+    y = (addr & cam['ymask']) >> cam['yshift']
+    pol = (addr & cam['pmask']) >> cam['pshift']
+    return x, y, ts, pol
+
+
+def _decode_aedat2_events(addr, ts, camera='DVS128', unit='ms'):
+    """Decodes AEDAT 1.0/2.0 address and timestamp words.
+
+    Args:
+        addr (numpy.ndarray): Raw address words.
+        ts (numpy.ndarray): Raw timestamps in us.
+        camera (str, optional): Type of event-based camera.
+        unit (str, optional): output unit of timestamps specified as a
+            string: 'ms' (default), 'us' or 'sec'.
+
+    Returns:
+        numpy.ndarray: (xpos, ypos, ts, pol) 2D numpy array containing data
+            of all DVS events.
+
+    Raises:
+        ValueError: If the camera or unit is not supported.
+    """
+    if unit not in TIMESTAMP_SCALES:
+        raise ValueError(
+            "Units not supported. Please select one of these: us, ms, sec")
+    x, y, ts, pol = _decode_aedat2_columns(addr, ts, camera=camera)
+
+    events = np.zeros([4, len(ts)])
+    events[0, :] = x
+    events[1, :] = y
+    # Set the timestamps according to the specified units
+    if unit == 'us':
+        events[2, :] = ts
+    else:
+        events[2, :] = ts / TIMESTAMP_SCALES[unit]
+    events[3, :] = pol
+    return events
+
+
+def aedat2numpy_chunks(datafile, chunk_size=1000000, length=0, version='V2',
+                       camera='DVS128', unit='ms'):
+    """Generator which decodes an AEDAT 1.0/2.0 file block by block.
+
+    The file is memory-mapped, so a recording never has to fit into RAM.
+    Each block contains the same data as the corresponding part of the
+    output of aedat2numpy.
+
+    Args:
+        datafile (str): Aedat recording as provided by jAER.
+        chunk_size (int, optional): Number of AE events (including APS
+            events, which are discarded) decoded per block.
+        length (int, optional): how many bytes(B) should be read;
+            default 0=whole file.
+        version (str, optional): which file format version is used,
+            'V1' or 'V2'.
+        camera (str, optional): Type of event-based camera.
+        unit (str, optional): output unit of timestamps specified as a
+            string: 'ms' (default), 'us' or 'sec'.
+
+    Yields:
+        numpy.ndarray: (xpos, ypos, ts, pol) 2D numpy array of one block.
+
+    Raises:
+        ValueError: If the camera, unit or AEDAT file version is not
+            supported.
+    """
+    if version not in AEDAT2_DTYPES:
+        raise ValueError("Unsupported AEDAT file version")
+    raw_events = _aedat2_memmap(datafile, length=length, version=version)
+    for start in range(0, len(raw_events), chunk_size):
+        chunk = raw_events[start:start + chunk_size]
+        yield _decode_aedat2_events(chunk['addr'], chunk['ts'],
+                                    camera=camera, unit=unit)
+
+
+def _concatenate_containers(blocks):
+    return EventContainer(*[np.concatenate([getattr(block, name)
+                                            for block in blocks])
+                            for name in EVENT_DTYPES])
+
+
+def _aedat4_container(datafile):
+    """Reads the events of a DV AEDAT 4.0 file packet by packet.
+
+    Args:
+        datafile (str): Aedat recording as provided by DV.
+
+    Returns:
+        EventContainer: Events with timestamps in us.
+    """
+    try:
+        from dv import AedatFile
+    except ImportError:
+        raise ImportError("Missing dependency. Please install dv via pip install dv")
+    blocks = [EventContainer([], [], [], [])]
+    with AedatFile(datafile) as f:
+        # Packets are structured arrays with compact integer fields
+        for packet in f['events'].numpy():
+            blocks.append(EventContainer(packet['x'], packet['y'],
+                                         packet['timestamp'],
+                                         packet['polarity']))
+    return _concatenate_containers(blocks)
+
+
+def aedat2container(datafile, length=0, version='V2', camera='DVS128',
+                    chunk_size=1000000):
+    """Loads an AER data file into a compact EventContainer.
+
+    V1 and V2 files are decoded block by block directly into uint16/uint8
+    columns, V4 files are read packet by packet from DV's structured
+    arrays, so the dense float64 array of aedat2numpy is never created.
+    V3 files are converted from the output of aedat2numpy.
+
+    Args:
+        datafile (str): Aedat recording as provided by jAER, cAER or DV.
+        length (int, optional): how many bytes(B) should be read;
+            default 0=whole file. Ignored for V4.
+        version (str, optional): which file format version is used,
+            see aedat2numpy.
+        camera (str, optional): Type of event-based camera.
+        chunk_size (int, optional): Number of AE events decoded per block.
+
+    Returns:
+        EventContainer: Events with timestamps in us.
+
+    Raises:
+        ValueError: If the camera or AEDAT file version is not supported.
+    """
+    if version == 'V4':
+        return _aedat4_container(datafile)
+    if version not in AEDAT2_DTYPES:
+        return EventContainer.from_array(
+            aedat2numpy(datafile, length=length, version=version,
+                        camera=camera, unit='us'), unit='us')
+
+    if camera not in AEDAT2_CAMERAS:
+        raise ValueError("Unsupported camera: %s" % (camera))
+    raw_events = _aedat2_memmap(datafile, length=length, version=version)
+    blocks = [EventContainer([], [], [], [])]
+    for start in range(0, len(raw_events), chunk_size):
+        chunk = raw_events[start:start + chunk_size]
+        blocks.append(EventContainer(*_decode_aedat2_columns(
+            chunk['addr'], chunk['ts'], camera=camera)))
+    return _concatenate_containers(blocks)
+
+
+def event_index_path(datafile):
+    """Returns the path of the sidecar time index of an event file.
+
+    Args:
+        datafile (str): Path to the aedat recording.
+
+    Returns:
+        str: Path of the index file stored next to the recording.
+    """
+    return datafile + '.tidx.npz'
+
+
+def build_event_index(datafile, bucket_size=100000, version='V2',
+                      chunk_size=1000000):
+    """Builds a time index of an AEDAT 1.0/2.0 file.
+
+    For every timestamp bucket of bucket_size us the byte offset of its
+    first event is stored. Timestamps are read block by block from a
+    memory map, so the recording never has to fit into RAM.
+
+    Note:
+        The index assumes monotonic timestamps, as written by jAER. If
+        a timestamp is smaller than a previous one, it is sorted into
+        the bucket of the largest timestamp seen so far.
+
+    Args:
+        datafile (str): Aedat recording as provided by jAER.
+        bucket_size (int, optional): Width of a timestamp bucket in us.
+        version (str, optional): which file format version is used,
+            'V1' or 'V2'.
+        chunk_size (int, optional): Number of events read per block.
+
+    Returns:
+        dict: Index with the byte offset of every bucket under 'offsets'
+            (the last entry points to the end of the events) and the
+            metadata needed to validate a cached index.
+
+    Raises:
+        ValueError: If the AEDAT file version is not supported.
+    """
+    if version not in AEDAT2_DTYPES:
+        raise ValueError("Unsupported AEDAT file version")
+    dtype = AEDAT2_DTYPES[version]
+    raw_events = _aedat2_memmap(datafile, version=version)
+
+    first_events = []
+    running_max = 0
+    for start in range(0, len(raw_events), chunk_size):
+        ts = np.asarray(raw_events['ts'][start:start + chunk_size],
+                        dtype=np.int64)
+        ts = np.maximum.accumulate(np.maximum(ts, running_max))
+        bucket_starts = np.arange(len(first_events),
+                                  ts[-1] // bucket_size + 1) * bucket_size
+        first_events.extend(start + np.searchsorted(ts, bucket_starts))
+        running_max = ts[-1]
+    first_events.append(len(raw_events))
+
+    statinfo = os.stat(datafile)
+    return {'offsets': (aedat2_header_size(datafile) +
+                        np.asarray(first_events, dtype=np.int64) *
+                        dtype.itemsize),
+            'bucket_size': bucket_size,
+            'version': version,
+            'file_size': statinfo.st_size,
+            'mtime': statinfo.st_mtime_ns}
+
+
+def load_event_index(datafile, bucket_size=100000, version='V2'):
+    """Loads the cached time index of an event file.
+
+    The index is (re-)built and stored next to the recording, see
+    event_index_path, if it does not exist yet, was built with different
+    settings or the recording changed since.
+
+    Args:
+        datafile (str): Aedat recording as provided by jAER.
+        bucket_size (int, optional): Width of a timestamp bucket in us.
+        version (str, optional): which file format version is used,
+            'V1' or 'V2'.
+
+    Returns:
+        dict: Index as returned by build_event_index.
+    """
+    statinfo = os.stat(datafile)
+    index_file = event_index_path(datafile)
+    if os.path.isfile(index_file):
+        with np.load(index_file) as cached:
+            index = {key: cached[key] for key in cached.files}
+        if (index['bucket_size'] == bucket_size and
+                index['version'] == version and
+                index['file_size'] == statinfo.st_size and
+                index['mtime'] == statinfo.st_mtime_ns):
+            return index
+
+    index = build_event_index(datafile, bucket_size=bucket_size,
+                              version=version)
+    try:
+        with open(index_file, 'wb') as f:
+            np.savez(f, **index)
+    except OSError:
+        warnings.warn("Could not store event index {}. It will be rebuilt "
+                      "on every call.".format(index_file))
+    return index
+
+
+def read_window(datafile, t_start, t_stop, unit='ms', version='V2',
+                camera='DVS128', bucket_size=100000):
+    """Loads the events of an AEDAT 1.0/2.0 file within a time window.
+
+    Only the buckets overlapping with the window are read from disk,
+    using the index returned by load_event_index.
+
+    Args:
+        datafile (str): Aedat recording as provided by jAER.
+        t_start (float): Start of the window (inclusive) in unit.
+        t_stop (float): End of the window (exclusive) in unit.
+        unit (str, optional): unit of t_start, t_stop and the returned
+            timestamps: 'ms' (default), 'us' or 'sec'.
+        version (str, optional): which file format version is used,
+            'V1' or 'V2'.
+        camera (str, optional): Type of event-based camera.
+        bucket_size (int, optional): Width of a timestamp bucket in us.
+
+    Returns:
+        numpy.ndarray: (xpos, ypos, ts, pol) 2D numpy array containing the
+            events within the window, in the same format as aedat2numpy.
+
+    Raises:
+        ValueError: If the camera, unit or AEDAT file version is not
+            supported.
+    """
+    if unit not in TIMESTAMP_SCALES:
+        raise ValueError(
+            "Units not supported. Please select one of these: us, ms, sec")
+    if version not in AEDAT2_DTYPES:
+        raise ValueError("Unsupported AEDAT file version")
+    dtype = AEDAT2_DTYPES[version]
+    index = load_event_index(datafile, bucket_size=bucket_size,
+                             version=version)
+    offsets = index['offsets']
+    ts_start = max(t_start * TIMESTAMP_SCALES[unit], 0)
+    ts_stop = max(t_stop * TIMESTAMP_SCALES[unit], 0)
+
+    first_bucket = min(int(ts_start // bucket_size), len(offsets) - 1)
+    last_bucket = min(int(np.ceil(ts_stop / bucket_size)), len(offsets) - 1)
+    num_events = max(offsets[last_bucket] - offsets[first_bucket], 0) // \
+        dtype.itemsize
+
+    with open(datafile, 'rb') as aerdatafh:
+        aerdatafh.seek(offsets[first_bucket])
+        raw_events = np.fromfile(aerdatafh, dtype=dtype, count=num_events)
+    in_window = np.logical_and(raw_events['ts'] >= ts_start,
+                               raw_events['ts'] < ts_stop)
+    raw_events = raw_events[in_window]
+    return _decode_aedat2_events(raw_events['addr'], raw_events['ts'],
+                                 camera=camera, unit=unit)
+
+
 def aedat2numpy(datafile, length=0, version='V2', debug=0, camera='DVS128', unit='ms'):
     """Loads AER data file and parses these properties of AE events.
 
@@ -145,6 +604,11 @@ def aedat2numpy(datafile, length=0, version='V2', debug=0, camera='DVS128', unit
     Returns:
         numpy.ndarray: (xpos, ypos, ts, pol) 2D numpy array containing data of all events.
 
+    Note:
+        V1 and V2 files are memory-mapped and decoded with vectorised
+        masks and shifts. Use aedat2numpy_chunks to decode recordings
+        which do not fit into memory block by block.
+
     Raises:
         ValueError: Indicates that a camera was specified which is not supported or the AEDAT file version is not supported.
     """
@@ -152,7 +616,6 @@ def aedat2numpy(datafile, length=0, version='V2', debug=0, camera='DVS128', unit
         aerdatafh = open(datafile, 'rb')
     except FileNotFoundError:
         raise FileNotFoundError('Please specify an aedat file to convert.')
-    k = 0  # line number
     p = 0  # pointer, position on bytes
     lt = aerdatafh.readline()
 
@@ -244,115 +707,25 @@ def aedat2numpy(datafile, length=0, version='V2', debug=0, camera='DVS128', unit
             # The file version is AEDAT 3.1. Wrong version specified.
             raise ValueError(
                 "Wrong .aedat version specified. \n Please enter version = 'V3' ")
+        aerdatafh.close()
 
-        EVT_DVS = 0  # DVS event type
-        EVT_APS = 1  # APS event
-
-        aeLen = 8  # 1 AE event takes 8 bytes
-        readMode = '>II'  # struct.unpack(), 2x ulong, 4B+4B
         td = 0.000001  # timestep is 1us
-        if (camera == 'DVS128'):
-            xmask = 0x00fe
-            xshift = 1
-            ymask = 0x7f00
-            yshift = 8
-            pmask = 0x1
-            pshift = 0
-        elif (camera == 'DAVIS240'):  # values take from scripts/matlab/getDVS*.m
-            xmask = 0x003ff000
-            xshift = 12
-            ymask = 0x7fc00000
-            yshift = 22
-            pmask = 0x800
-            pshift = 11
-            eventtypeshift = 31
-        else:
-            raise ValueError("Unsupported camera: %s" % (camera))
         if (version == 'V1'):
             print("using the old .dat format")
-            aeLen = 6
-            readMode = '>HI'  # ushot, ulong = 2B+4B
-        aerdatafh = open(datafile, 'rb')
-        k = 0  # line number
-        p = 0  # pointer, position on bytes
-        statinfo = os.stat(datafile)
-        if length == 0:
-            length = statinfo.st_size
-        # print ("file size", length)
-        # header
-        lt = aerdatafh.readline()
-        while lt.startswith(b'#'):
-            p += len(lt)
-            k += 1
-            lt = aerdatafh.readline()
-            if debug >= 2:
-                print(str(lt))
-            continue
-        # variables to parse
-        timestamps = []
-        xaddr = []
-        yaddr = []
-        pol = []
-        # read data-part of file
-        aerdatafh.seek(p)
-        s = aerdatafh.read(aeLen)
-        p += aeLen
-        # print (xmask, xshift, ymask, yshift, pmask, pshift)
-        while p < length:
-            addr, ts = struct.unpack(readMode, s)
-            # parse event type
-            if (camera == 'DAVIS240'):
-                eventtype = (addr >> eventtypeshift)
-            else:  # DVS128
-                eventtype = EVT_DVS
-            # parse event's data
-            if (eventtype == EVT_DVS):  # this is a DVS event
-                x_addr = (addr & xmask) >> xshift
-                y_addr = (addr & ymask) >> yshift
-                a_pol = (addr & pmask) >> pshift
-                if debug >= 3:
-                    print("ts->", ts)  # ok
-                    print("x-> ", x_addr)
-                    print("y-> ", y_addr)
-                    print("pol->", a_pol)
-                # Set the coordinate (0,0) at the bottom left corner:
-                # NOTE: jAER orgin is at the bottom right corner.
-                if (camera == 'DVS128'):
-                    xaddr.append(128 - x_addr - 1)
-                elif (camera == 'DAVIS240'):
-                    xaddr.append(240 - x_addr - 1)
-                yaddr.append(y_addr)
-                # Set the timestamps according to the specified units
-                if unit == 'us':
-                    timestamps.append(ts)
-                elif unit == 'ms':
-                    timestamps.append(ts / 1000)
-                elif unit == 'sec':
-                    timestamps.append(ts / 1e6)
-                else:
-                    raise ValueError(
-                        "Units not supported. Please select one of these: us, ms, sec")
-                pol.append(a_pol)
-            aerdatafh.seek(p)
-            s = aerdatafh.read(aeLen)
-            p += aeLen
+        raw_events = _aedat2_memmap(datafile, length=length, version=version)
+        events = _decode_aedat2_events(raw_events['addr'], raw_events['ts'],
+                                       camera=camera, unit=unit)
         if debug > 0:
             try:
+                timestamps = events[2, :]
                 print("read %i (~ %.2fM) AE events, duration= %.2fs" % (len(timestamps), len(
                     timestamps) / float(10 ** 6), (timestamps[-1] - timestamps[0]) * td))
                 n = 5
                 print("showing first %i:" % (n))
                 print("timestamps: %s \nX-addr: %s\nY-addr: %s\npolarity: %s" %
-                      (timestamps[0:n], xaddr[0:n], yaddr[0:n], pol[0:n]))
+                      (timestamps[0:n], events[0, 0:n], events[1, 0:n], events[3, 0:n]))
             except:
                 print("failed to print statistics")
-        events = np.zeros([4, len(timestamps)])
-        # Set the coordinate (0,0) at the upper left corner:
-        # NOTE: jAER orgin is at the bottom right corner.
-        events[0, :] = xaddr
-        events[1, :] = yaddr
-        events[2, :] = timestamps
-        events[3, :] = pol
         return events
 
     else:
@@ -360,17 +733,21 @@ def aedat2numpy(datafile, length=0, version='V2', debug=0, camera='DVS128', unit
         return
 
 
-def dvs2ind(events=None, event_directory=None, resolution='DAVIS240', scale=True):
+def dvs2ind(events=None, event_directory=None, resolution='DAVIS240', scale=True,
+            delta_t=1):
     """Function which converts events extracted from an aedat file using aedat2numpy
     into 1D vectors of neuron indices and timestamps.
 
     Function only returns index and timestamp list for existing types (e.g. On & Off events).
 
     Args:
-        Events (None, optional): 4D numpy.ndarray which contains pixel location (x,y), timestamps and polarity ((4,#events)).
-        event_directory (None, optional): Path to stored events.
+        Events (None, optional): 4D numpy.ndarray which contains pixel location (x,y), timestamps and polarity ((4,#events)),
+            or an EventContainer (timestamps in us).
+        event_directory (None, optional): Path to stored events (.npy file or stored EventContainer).
         resolution (str/int, optional): Resolution of the camera.
         scale (bool, optional): Flag to rescale the timestamps from microseconds to milliseconds.
+        delta_t (float, optional): Events of the same index which follow each other within
+            delta_t (in units of the returned timestamps) are removed, keeping the first one.
 
     Returns:
         indices_on (1d numpy.array): Unique indices which maps the pixel location of the camera to the 1D neuron indices of ON events.
@@ -379,27 +756,14 @@ def dvs2ind(events=None, event_directory=None, resolution='DAVIS240', scale=True
         ts_off (1d numpy.array): Unique timestamps of active indices of OFF events.
     """
     if event_directory is not None:
+        assert events is None, 'Either you specify a path to load events using event_directory. Or you pass the event numpy array directly. NOT both.'
         assert type(event_directory) == str, 'event_directory must be a string'
-        assert event_directory[
-               -4:] == '.npy', 'Please specify a numpy array (.npy) which contains the DVS events.\n Aedat files can be converted using function aedat2numpy.py'
-        events = np.load(event_directory)
-    if events is not None:
-        assert event_directory is None, 'Either you specify a path to load events using event_directory. Or you pass the event numpy array directly. NOT both.'
-    if np.size(events, 0) > np.size(events, 1):
-        events = np.transpose(events)
-
-    # extract tempory indices to retrieve
-    # Boolean logic to get indices of on and off events, respectively
-    cInd_on = events[3, :] == 1
-    cInd_off = events[3, :] == 0
-
-    # Initialize 1D arrays for neuron indices and timestamps
-    indices_on = np.zeros([int(np.sum(cInd_on))])
-    spiketimes_on = np.zeros([int(np.sum(cInd_on))])
-    # Polarity is either 0 or 1 so the entire length minus the sum of the
-    # polarity give the proportion of off events
-    indices_off = np.zeros([int(np.sum(cInd_off))])
-    spiketimes_off = np.zeros([int(np.sum(cInd_off))])
+        if is_event_container_path(event_directory):
+            events = EventContainer.load(event_directory)
+        else:
+            assert event_directory[
+                   -4:] == '.npy', 'Please specify a numpy array (.npy) which contains the DVS events.\n Aedat files can be converted using function aedat2numpy.py'
+            events = np.load(event_directory)
 
     if type(resolution) == str:
         # extract the x-resolution (i.e. the resolution along the x-axis of the
@@ -408,67 +772,45 @@ def dvs2ind(events=None, event_directory=None, resolution='DAVIS240', scale=True
     elif type(resolution) == tuple:
         resolution = resolution[0]
 
-    # The equation below follows index = x + y*resolution
-    # To retrieve the x and y coordinate again from the index see ind2px
-    indices_on = events[0, cInd_on] + events[1, cInd_on] * resolution
-    indices_off = events[0, cInd_off] + events[1, cInd_off] * resolution
+    if isinstance(events, EventContainer):
+        # Columns are used as they are, timestamps are always in us
+        x, y, ts, pol = events.x, events.y, events.ts, events.pol
+        # The equation below follows index = x + y*resolution
+        indices = events.indices(resolution)
+    else:
+        if np.size(events, 0) > np.size(events, 1):
+            events = np.transpose(events)
+        x, y, ts, pol = events
+        # The equation below follows index = x + y*resolution
+        # To retrieve the x and y coordinate again from the index see ind2px
+        indices = x + y * resolution
+
+    # extract tempory indices to retrieve
+    # Boolean logic to get indices of on and off events, respectively
+    cInd_on = pol == 1
+    cInd_off = pol == 0
+
+    indices_on = indices[cInd_on]
+    indices_off = indices[cInd_off]
     if scale:
         # The DVS timestamps are in microseconds. We need to convert them to
         # milliseconds for brian
-        spiketimes_on = np.ceil(events[2, cInd_on] * 10 ** (-3))
-        spiketimes_off = np.ceil(events[2, cInd_off] * 10 ** (-3))
+        spiketimes_on = np.ceil(ts[cInd_on] * 10 ** (-3))
+        spiketimes_off = np.ceil(ts[cInd_off] * 10 ** (-3))
 
     else:
         # The flag scale is used to prevent rescaling of timestamps if we use
         # artifically generated stimuli
-        spiketimes_on = np.ceil(events[2, cInd_on])
-        spiketimes_off = np.ceil(events[2, cInd_off])
-
-    # Check for double entries within 100 us
-    ts_on_tmp = spiketimes_on
-    ind_on_tmp = indices_on
-    ts_off_tmp = spiketimes_off
-    ind_off_tmp = indices_off
-    delta_t = 1
-
-    for i in range(len(spiketimes_on)):
-        mask_t = spiketimes_on[i]
-        mask_i = indices_on[i]
-
-        double_entries = np.logical_and(np.logical_and(
-            ts_on_tmp >= mask_t, ts_on_tmp <= mask_t + delta_t), mask_i == ind_on_tmp)
-        # uniqueEntries = np.invert(double_entries)
-        # print np.sum(double_entries)
-        if np.sum(double_entries) > 1:
-            # Find first occurence on non-unique entries
-            tmp = np.where(double_entries == True)
-            # keep the first occurance of non-unique entry
-            double_entries[tmp[0][0]] = False
-            uniqueEntries = np.invert(double_entries)
-            ts_on_tmp = ts_on_tmp[uniqueEntries]
-            ind_on_tmp = ind_on_tmp[uniqueEntries]
-
-    for i in range(len(spiketimes_off)):
-        mask_t = spiketimes_off[i]
-        mask_i = indices_off[i]
-
-        double_entries = np.logical_and(np.logical_and(
-            ts_off_tmp >= mask_t, ts_off_tmp <= mask_t + delta_t), mask_i == ind_off_tmp)
-        # uniqueEntries = np.invert(double_entries)
-        # print np.sum(double_entries)
-        if np.sum(double_entries) > 1:
-            # Find first occurence on non-unique entries
-            tmp = np.where(double_entries == True)
-            # keep the first occurance of non-unique entry
-            double_entries[tmp[0][0]] = False
-            uniqueEntries = np.invert(double_entries)
-            ts_off_tmp = ts_off_tmp[uniqueEntries]
-            ind_off_tmp = ind_off_tmp[uniqueEntries]
-
-    indices_off = ind_off_tmp
-    ts_off = ts_off_tmp
-    indices_on = ind_on_tmp
-    ts_on = ts_on_tmp
+        spiketimes_on = np.ceil(ts[cInd_on])
+        spiketimes_off = np.ceil(ts[cInd_off])
+
+    # Check for double entries within delta_t
+    keep_on = unique_events_mask(indices_on, spiketimes_on, delta_t=delta_t)
+    keep_off = unique_events_mask(indices_off, spiketimes_off, delta_t=delta_t)
+    indices_on = np.asarray(indices_on[keep_on], dtype=np.int32)
+    ts_on = np.asarray(spiketimes_on[keep_on], dtype=np.float64)
+    indices_off = np.asarray(indices_off[keep_off], dtype=np.int32)
+    ts_off = np.asarray(spiketimes_off[keep_off], dtype=np.float64)
     return_on = False
     return_off = False
     # normalize timestamps
@@ -6,24 +6,133 @@
 # @Date:   2017-07-28 19:02:05
 
 import os
+import json
+import hashlib
+import shutil
+import struct
+import tempfile
 import time
+import uuid
 import warnings
 import numpy as np
 from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import cpu_count
 from brian2 import prefs, device, codegen, set_device
 
+DEFAULT_BUILD_CACHE = os.path.join(os.path.expanduser("~"), ".teili", "build_cache")
+SOURCE_EXTENSIONS = ('.cpp', '.h', '.hpp', '.c')
+MAKEFILES = ('makefile', 'win_makefile')
+BUILD_MANIFEST = '.teili_build_hashes.json'
+
+PARAMS_FILE_MAGIC = b'TEILIPAR'
+PARAMS_FILE_ARG = '--teili_params'
+
+# C++ code to read a parameter file written by write_params_file, it is added to main.cpp
+# if the parameters are passed with param_channel='file'
+PARAMS_FILE_CPP_CODE = """
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <iostream>
+#include <map>
+#include <string>
+#include <vector>
+
+static std::map<std::string, std::vector<double> > _teili_params;
+
+static void _teili_params_error(const std::string &message)
+{
+    std::cerr << "teili parameter file: " << message << std::endl;
+    std::exit(1);
+}
+
+static void _teili_load_params(const char *filename)
+{
+    std::ifstream file(filename, std::ios::binary);
+    char magic[8];
+    if (!file.read(magic, 8) || std::strncmp(magic, "TEILIPAR", 8) != 0)
+        _teili_params_error(std::string("could not read ") + filename);
+    uint32_t num_params = 0;
+    file.read((char *)&num_params, sizeof(num_params));
+    for (uint32_t p = 0; p < num_params; p++)
+    {
+        uint32_t name_length = 0;
+        file.read((char *)&name_length, sizeof(name_length));
+        std::string name(name_length, ' ');
+        file.read(&name[0], name_length);
+        char dtype = 0;
+        file.read(&dtype, 1);
+        uint64_t size = 0;
+        file.read((char *)&size, sizeof(size));
+        std::vector<double> values(size);
+        if (dtype == 'd')
+            file.read((char *)values.data(), size * sizeof(double));
+        else if (dtype == 'q')
+        {
+            std::vector<int64_t> int_values(size);
+            file.read((char *)int_values.data(), size * sizeof(int64_t));
+            for (uint64_t i = 0; i < size; i++)
+                values[i] = (double)int_values[i];
+        }
+        else
+            _teili_params_error("unknown dtype of " + name);
+        if (!file)
+            _teili_params_error(std::string("unexpected end of ") + filename);
+        _teili_params[name] = values;
+    }
+}
+
+static double _teili_param(const char *name, size_t i)
+{
+    std::map<std::string, std::vector<double> >::const_iterator it = _teili_params.find(name);
+    if (it == _teili_params.end() || it->second.empty())
+        _teili_params_error(std::string("no value for ") + name);
+    if (it->second.size() == 1)
+        return it->second[0];
+    if (i >= it->second.size())
+        _teili_params_error(std::string("not enough values for ") + name);
+    return it->second[i];
+}
 
-def activate_standalone(directory='Brian2Network_standalone', build_on_run=False):
+"""
+
+
+def activate_standalone(directory='Brian2Network_standalone', build_on_run=False, num_threads=None):
     """Enables cpp standalone mode
 
     Args:
         directory (str, optional): Standalone directory containing all compiled files
         build_on_run (bool, optional): Flag to (re-)build network before simulating
+        num_threads (int, optional): Number of OpenMP threads of the simulation, see
+            set_num_threads. By default the simulation is single threaded.
     """
     set_device('cpp_standalone', directory=directory, build_on_run=build_on_run)
     device.reinit()
     device.activate(directory=directory, build_on_run=build_on_run)
     device.project_dir = os.path.abspath(directory)
+    if num_threads is not None:
+        set_num_threads(num_threads)
+
+
+def set_num_threads(num_threads):
+    """Sets the number of OpenMP threads that the generated standalone code uses.
+
+    This has to be set before the code is generated, i.e. before the network is built.
+    0 or 1 generate single threaded code without OpenMP. The C++ implementations of teili's
+    functions (indexing, distance and kernel functions, Randn_trunc and Rand_gamma) are
+    thread safe, so they can be used in multi-threaded code.
+
+    Args:
+        num_threads (int): Number of threads.
+
+    Raises:
+        ValueError: If num_threads is negative.
+    """
+    if num_threads < 0:
+        raise ValueError("num_threads needs to be >= 0, not {}".format(num_threads))
+    prefs.devices.cpp_standalone.openmp_threads = int(num_threads)
 
 
 def deactivate_standalone():
@@ -34,7 +143,8 @@ def deactivate_standalone():
 
 def build_cpp_and_replace(standalone_params,
                           standalone_dir=os.path.join(os.path.expanduser("~"), "Brian2Standalone"),
-                          clean=True, do_compile=True, verbose=True):
+                          clean=True, do_compile=True, verbose=True, param_channel='argv',
+                          build_cache=None, incremental=False, jobs=None):
     """Builds cpp standalone network and replaces variables/parameters with standalone_params
     This does string replacement in the generated c++ code.
 
@@ -44,6 +154,15 @@ def build_cpp_and_replace(standalone_params,
         standalone_dir (str, optional): Directory containing output generated by network
         clean (bool, optional): Flag to clean build network
         do_compile (bool, optional): Flag to compile network
+        param_channel (str, optional): How the parameters are passed to the compiled network,
+            see replace_variables_in_cpp_code.
+        build_cache (bool or str, optional): If set, compiled binaries are stored in a cache
+            directory (True for DEFAULT_BUILD_CACHE or a path) under the hash of the generated
+            code (see source_hash). If the code was compiled before, the cached binary is used
+            instead of compiling again.
+        incremental (bool, optional): Only recompile the code objects whose code changed since
+            the last compilation in standalone_dir (see compile_incremental). clean is ignored.
+        jobs (int, optional): Number of parallel make jobs, defaults to the number of cpus.
     """
     startBuild = time.time()
     prefs['codegen.cpp.extra_compile_args_gcc'].append('-std=c++14')
@@ -62,14 +181,29 @@ def build_cpp_and_replace(standalone_params,
     maincppPath = os.path.join(os.getcwd(), standalone_dir,
                                'main.cpp')  # this should always be the correct path
     replace_vars = [key for key in standalone_params]
-    replace_variables_in_cpp_code(replace_vars, replace_file_location=maincppPath, verbose=verbose)
+    replace_variables_in_cpp_code(replace_vars, replace_file_location=maincppPath, verbose=verbose,
+                                  param_channel=param_channel)
     # ===============================================================================
     # compile
     if do_compile:
         startMake = time.time()
         # out = check_output(["make","-C","~/Code/SOM_standalone"])
         compiler, args = codegen.cpp_prefs.get_compiler_and_args()
-        device.compile_source(directory=standalone_dir, compiler=compiler, clean=clean, debug=False)
+        if build_cache:
+            cache_dir = DEFAULT_BUILD_CACHE if build_cache is True else build_cache
+            build_hash = source_hash(standalone_dir, extra=[compiler] + list(args))
+            if load_cached_build(standalone_dir, build_hash, cache_dir):
+                print('\n\nstandalone was built, the compiled network {} was taken from {}, '
+                      'ready to run!'.format(build_hash, cache_dir))
+                return
+        if incremental:
+            changed = compile_incremental(standalone_dir, jobs=jobs)
+            print('recompiled {} changed source files'.format(len(changed)))
+        else:
+            with make_jobs(jobs):
+                device.compile_source(directory=standalone_dir, compiler=compiler, clean=clean, debug=False)
+        if build_cache:
+            store_cached_build(standalone_dir, build_hash, cache_dir)
         # print(out)
         end = time.time()
         print('make took ' + str(end - startMake) + ' sec')
@@ -78,27 +212,220 @@ def build_cpp_and_replace(standalone_params,
         print('\n\nstandalone was built, ready to compile!')
 
 
-def replace_variables_in_cpp_code(replace_vars, replace_file_location, verbose=True):
+def source_hash(standalone_dir, extra=()):
+    """Hashes the generated code of a standalone network.
+
+    The code contains everything that is compiled into the binary, i.e. group sizes,
+    equations, connectivity code, run_regularly code, the replaced standalone params
+    and the compiler flags in the makefile. Initial values and arrays that are only
+    read at runtime (static_arrays) are not part of the hash.
+
+    Args:
+        standalone_dir (str): Standalone directory with the generated code
+        extra (list of str, optional): Additional strings that are hashed, e.g. the compiler
+
+    Returns:
+        str: sha1 hex digest
+    """
+    sha = hashlib.sha1()
+    for item in extra:
+        sha.update(str(item).encode() + b'\0')
+    for path, file_hash in source_file_hashes(standalone_dir).items():
+        sha.update(path.encode() + b'\0' + file_hash.encode() + b'\0')
+    return sha.hexdigest()
+
+
+def source_file_hashes(standalone_dir):
+    """Hashes every source file and makefile of the generated code separately.
+
+    Args:
+        standalone_dir (str): Standalone directory with the generated code
+
+    Returns:
+        OrderedDict: sha1 hex digest of every file, keys are the paths relative to
+            standalone_dir (with / as separator) in sorted order.
+    """
+    paths = []
+    for root, dirs, files in os.walk(standalone_dir):
+        dirs[:] = [d for d in dirs if d not in ('results', 'static_arrays')]
+        for filename in files:
+            if filename.endswith(SOURCE_EXTENSIONS) or filename in MAKEFILES:
+                paths.append(os.path.relpath(os.path.join(root, filename), standalone_dir).replace(os.sep, '/'))
+    hashes = OrderedDict()
+    for path in sorted(paths):
+        with open(os.path.join(standalone_dir, path), 'rb') as source:
+            hashes[path] = hashlib.sha1(source.read()).hexdigest()
+    return hashes
+
+
+def _makefile_flags_hash(filename):
+    """Hashes a makefile without its lists of source files, which change whenever
+    code objects are added or removed.
+    """
+    with open(filename, 'rb') as makefile:
+        lines = [line for line in makefile.readlines()
+                 if not line.lstrip().startswith((b'SRCS', b'H_SRCS'))]
+    return hashlib.sha1(b''.join(lines)).hexdigest()
+
+
+@contextmanager
+def make_jobs(jobs=None):
+    """Sets the number of parallel make jobs of brian2 while compiling.
+
+    Args:
+        jobs (int, optional): Number of parallel jobs, defaults to the number of cpus.
+    """
+    if jobs is None:
+        jobs = cpu_count()
+    make_args = list(prefs['devices.cpp_standalone.extra_make_args_unix'])
+    prefs['devices.cpp_standalone.extra_make_args_unix'] = \
+        [arg for arg in make_args if not arg.startswith('-j')] + ['-j{}'.format(jobs)]
+    try:
+        yield
+    finally:
+        prefs['devices.cpp_standalone.extra_make_args_unix'] = make_args
+
+
+def compile_incremental(standalone_dir, jobs=None):
+    """Compiles a standalone network, but only the source files that changed since the
+    last compilation in standalone_dir.
+
+    brian2 and replace_variables_in_cpp_code rewrite generated files on every build,
+    which updates their modification time, so make would recompile them even if their
+    code did not change. The hash and modification time of every source file are stored
+    in standalone_dir after each successful compilation. Before compiling, files whose
+    hash did not change get their old modification time back. make then only
+    recompiles the changed translation units (and the ones including changed headers)
+    and relinks. As all object files depend on the makefile, it is treated as
+    unchanged if only its lists of source files changed. If anything else in the
+    makefile changed (e.g. compiler flags), everything is recompiled.
+
+    Args:
+        standalone_dir (str): Standalone directory with the generated code
+        jobs (int, optional): Number of parallel make jobs, defaults to the number of cpus.
+
+    Returns:
+        list: Source files that changed since the last compilation.
+    """
+    manifest_path = os.path.join(standalone_dir, BUILD_MANIFEST)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+
+    hashes = source_file_hashes(standalone_dir)
+    for path in hashes:
+        if os.path.basename(path) in MAKEFILES:
+            hashes[path] = _makefile_flags_hash(os.path.join(standalone_dir, path))
+    changed = [path for path in hashes if path not in manifest or manifest[path][0] != hashes[path]]
+    clean = any(os.path.basename(path) in MAKEFILES for path in changed)
+    if not clean:
+        for path in hashes:
+            if path not in changed:
+                mtime = manifest[path][1]
+                os.utime(os.path.join(standalone_dir, path), ns=(mtime, mtime))
+
+    compiler, args = codegen.cpp_prefs.get_compiler_and_args()
+    with make_jobs(jobs):
+        device.compile_source(directory=standalone_dir, compiler=compiler, clean=clean, debug=False)
+
+    manifest = {path: [file_hash, os.stat(os.path.join(standalone_dir, path)).st_mtime_ns]
+                for path, file_hash in hashes.items()}
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    return changed
+
+
+def _binary_name():
+    return 'main.exe' if os.name == 'nt' else 'main'
+
+
+def load_cached_build(standalone_dir, build_hash, cache_dir=DEFAULT_BUILD_CACHE):
+    """Copies a cached binary to the standalone directory.
+
+    Args:
+        standalone_dir (str): Standalone directory with the generated code
+        build_hash (str): Hash of the generated code, see source_hash
+        cache_dir (str, optional): Directory of the build cache
+
+    Returns:
+        bool: True if the binary was found in the cache.
+    """
+    cached_binary = os.path.join(cache_dir, build_hash, _binary_name())
+    if not os.path.isfile(cached_binary):
+        return False
+    shutil.copy2(cached_binary, os.path.join(standalone_dir, _binary_name()))
+    return True
+
+
+def store_cached_build(standalone_dir, build_hash, cache_dir=DEFAULT_BUILD_CACHE):
+    """Stores the compiled binary of the standalone directory in the build cache.
+
+    The binary is first copied to a temporary directory which is then renamed, so
+    other processes never see a partially copied binary.
+
+    Args:
+        standalone_dir (str): Standalone directory with the compiled binary
+        build_hash (str): Hash of the generated code, see source_hash
+        cache_dir (str, optional): Directory of the build cache
+    """
+    entry = os.path.join(cache_dir, build_hash)
+    if os.path.isdir(entry):
+        return
+    tmp_entry = os.path.join(cache_dir, '.tmp_' + uuid.uuid4().hex)
+    os.makedirs(tmp_entry)
+    shutil.copy2(os.path.join(standalone_dir, _binary_name()), tmp_entry)
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:  # another process stored the same build in the meantime
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+
+
+def replace_variables_in_cpp_code(replace_vars, replace_file_location, verbose=True, param_channel='argv'):
     '''Replaces a list of variables in CPP code for standalone code generation with changeable parameters
     and it adds duration as a changeable parameter (it is always the first argument)
 
+    The values are passed to the compiled network in one of two ways:
+    'argv' passes every value as a float main() argument (see params2run_args). Only scalars can be
+    passed and values are rounded to float precision.
+    'file' reads a binary parameter file (see write_params_file) whose path follows the main() argument
+    --teili_params. Values are double precision and can be arrays with one value per neuron/synapse,
+    the order of the parameters does not matter.
 
     Args:
         replace_vars (list, str): List of strings, variables that are replaced
         replace_file_location (str): Location of the file in which the variables are replaced
+        param_channel (str, optional): 'argv' (default) or 'file'
+
+    Raises:
+        ValueError: If param_channel is unknown.
     '''
+    if param_channel not in ('argv', 'file'):
+        raise ValueError("param_channel needs to be 'argv' or 'file', not {}".format(param_channel))
 
     # generate arg code
-    cppArgCode = ""
-    for ivar, rvar in enumerate(replace_vars):
-        if verbose:
-            cppArgCode += """\n float {replvar}_p = std::stof(argv[{num}],NULL);
+    if param_channel == 'file':
+        cppArgCode = """\n for (int _i = 1; _i < argc - 1; _i++)
+        if (std::string(argv[_i]) == "{arg}") _teili_load_params(argv[_i + 1]);\n""".format(arg=PARAMS_FILE_ARG)
+        for rvar in replace_vars:
+            print("variable {replvar} is read from the parameter file".format(replvar=rvar))
+    else:
+        # newer brian2 versions pass "--results_dir <dir>" as the first arguments, the parameters follow
+        cppArgCode = """\n int _teili_arg_offset = (argc > 2 && std::string(argv[1]) == "--results_dir") ? 2 : 0;\n"""
+        for ivar, rvar in enumerate(replace_vars):
+            if verbose:
+                cppArgCode += """\n float {replvar}_p = std::stof(argv[{num} + _teili_arg_offset],NULL);
     std::cout << "variable {replvar} is argument {num} with value " << {replvar}_p << std::endl;\n""".format(
-                num=(ivar + 1), replvar=rvar)
-        else:
-            cppArgCode += """\n float {replvar}_p = std::stof(argv[{num}],NULL);\n""".format(
-                num=(ivar + 1), replvar=rvar)
-        print("variable {replvar} is main() argument {num}".format(num=(ivar + 1), replvar=rvar))
+                    num=(ivar + 1), replvar=rvar)
+            else:
+                cppArgCode += """\n float {replvar}_p = std::stof(argv[{num} + _teili_arg_offset],NULL);\n""".format(
+                    num=(ivar + 1), replvar=rvar)
+            print("variable {replvar} is main() argument {num}".format(num=(ivar + 1), replvar=rvar))
+
+    def value_code(rvar, index):
+        if param_channel == 'file':
+            return '_teili_param("{}", {})'.format(rvar, index)
+        return rvar + '_p'
 
     print('\n*********************************\n')
 
@@ -110,8 +437,11 @@ def replace_variables_in_cpp_code(replace_vars, replace_file_location, verbose=T
     # insert arg code
     for i_line, line in enumerate(contents):
         if "int main(int argc, char **argv)" in line:
+            mainLine = i_line
             insertLine = i_line + 2
     contents.insert(insertLine, cppArgCode)
+    if param_channel == 'file':
+        contents.insert(mainLine, PARAMS_FILE_CPP_CODE)
 
     # replace var code
     replaceTODOlist = list(
@@ -123,14 +453,14 @@ def replace_variables_in_cpp_code(replace_vars, replace_file_location, verbose=T
             if rvar + "[i]" in line:  # for array variables
                 replaced = True
                 keepFirstPart = line.split('=', 1)[0]
-                f.write(keepFirstPart + '= ' + rvar + '_p;\n')
+                f.write(keepFirstPart + '= ' + value_code(rvar, 'i') + ';\n')
                 print("replaced array " + rvar + " in line " + str(i_line))
                 replaceTODOlist = [elem for elem in replaceTODOlist if
                                    not elem == rvar]  # check element in todolist
             if rvar + "[0]" in line:  # for scalar (shared) variables
                 replaced = True
                 keepFirstPart = line.split('=', 1)[0]
-                f.write(keepFirstPart + '= ' + rvar + '_p;\n')
+                f.write(keepFirstPart + '= ' + value_code(rvar, 0) + ';\n')
                 print("replaced scalar " + rvar + " in line " + str(i_line))
                 replaceTODOlist = [elem for elem in replaceTODOlist if
                                    not elem == rvar]  # check element in todolist
@@ -138,9 +468,22 @@ def replace_variables_in_cpp_code(replace_vars, replace_file_location, verbose=T
             replaced = True
             keepNetworkName = line.split('.', 1)[0]  # this is actually the same as net.name
             keepSecondPart = line.split(',', 1)[1]
-            f.write(keepNetworkName + '.run(duration_p,' + keepSecondPart)
+            f.write(keepNetworkName + '.run(' + value_code('duration', 0) + ',' + keepSecondPart)
             print("replaced duration in line " + str(i_line))
             replaceTODOlist = [elem for elem in replaceTODOlist if not elem == 'duration']
+        if 'set_from_command_line(args)' in line:
+            # newer brian2 versions parse the remaining arguments as name=value pairs,
+            # so the parameters read above are removed first
+            replaced = True
+            indent = line.split('set_from_command_line', 1)[0]
+            if param_channel == 'file':
+                f.write(indent + 'for (size_t _i = 0; _i + 1 < args.size(); _i++)\n' +
+                        indent + '    if (args[_i] == "{arg}") {{ args.erase(args.begin() + _i, '
+                                 'args.begin() + _i + 2); break; }}\n'.format(arg=PARAMS_FILE_ARG))
+            else:
+                f.write(indent + 'args.erase(args.begin(), args.begin() + std::min(args.size(), (size_t){num}));\n'.format(
+                    num=len(replace_vars)))
+            f.write(line)
         if not replaced:
             f.write(line)
     f.close()
@@ -182,6 +525,90 @@ def params2run_args(standalone_params):
     return run_args
 
 
+def write_params_file(standalone_params, filename):
+    """Writes standalone parameters to a binary parameter file, which is read by
+    networks that were built with param_channel='file'.
+
+    The file starts with the 8 bytes TEILIPAR and the number of parameters (uint32).
+    For every parameter follows the length of the name (uint32), the name, the dtype
+    ('d' for float64, 'q' for int64), the number of values (uint64) and the values.
+    All numbers are little endian.
+
+    Args:
+        standalone_params (dict): Dictionary of standalone parameters, values can be
+            scalars or arrays (with or without units, units are removed like in
+            params2run_args).
+        filename (str): Path of the parameter file.
+    """
+    with open(filename, 'wb') as params_file:
+        params_file.write(PARAMS_FILE_MAGIC)
+        params_file.write(struct.pack('<I', len(standalone_params)))
+        for key in standalone_params:
+            values = np.asarray(standalone_params[key]).ravel()
+            if values.dtype.kind in 'biu':
+                dtype, values = b'q', values.astype('<i8')
+            else:
+                dtype, values = b'd', values.astype('<f8')
+            name = key.encode()
+            params_file.write(struct.pack('<I', len(name)) + name + dtype)
+            params_file.write(struct.pack('<Q', values.size))
+            params_file.write(values.tobytes())
+
+
+def read_params_file(filename):
+    """Reads a binary parameter file written by write_params_file.
+
+    Args:
+        filename (str): Path of the parameter file.
+
+    Returns:
+        OrderedDict: Parameter names and numpy arrays of their values.
+
+    Raises:
+        ValueError: If the file is not a parameter file.
+    """
+    params = OrderedDict()
+    with open(filename, 'rb') as params_file:
+        if params_file.read(len(PARAMS_FILE_MAGIC)) != PARAMS_FILE_MAGIC:
+            raise ValueError("{} is not a teili parameter file".format(filename))
+        num_params, = struct.unpack('<I', params_file.read(4))
+        for _ in range(num_params):
+            name_length, = struct.unpack('<I', params_file.read(4))
+            name = params_file.read(name_length).decode()
+            dtype = {b'd': '<f8', b'q': '<i8'}[params_file.read(1)]
+            size, = struct.unpack('<Q', params_file.read(8))
+            params[name] = np.frombuffer(params_file.read(size * 8), dtype=dtype)
+    return params
+
+
+@contextmanager
+def params2file_run_args(standalone_params, directory=None):
+    """Writes the standalone parameters to a temporary parameter file and yields the
+    run arguments that pass it to a network built with param_channel='file'. The file
+    is removed when the context is left, so workers sharing one standalone directory
+    do not leave parameter files behind.
+
+    Example:
+        >>> with params2file_run_args(standalone_params) as run_args:
+        >>>     device.run(directory=directory, with_output=True, run_args=run_args)
+
+    Args:
+        standalone_params (dict): Dictionary containing standalone parameters
+        directory (str, optional): Directory of the parameter file, defaults to the
+            temporary directory of the system
+
+    Yields:
+        list: run arguments
+    """
+    fd, filename = tempfile.mkstemp(prefix='teili_params_', suffix='.bin', dir=directory)
+    os.close(fd)
+    try:
+        write_params_file(standalone_params, filename)
+        yield [PARAMS_FILE_ARG, filename]
+    finally:
+        os.remove(filename)
+
+
 def collect_standalone_params(params=OrderedDict(), *building_blocks):
     '''This just collect the parameters of all buildingblocks and adds additional
     parameters (not from buildingblocks)
@@ -201,17 +628,22 @@ def collect_standalone_params(params=OrderedDict(), *building_blocks):
     return standalone_params
 
 
-def run_standalone(standalone_params):
+def run_standalone(standalone_params, param_channel='argv'):
     """Runnung standalone networks
 
     Args:
         standalone_params (dict): Dictionary of standalone parameters
+        param_channel (str, optional): 'argv' or 'file', as used when building the network
     """
     start_sim = time.time()
     # run simulation
     print_dict(standalone_params)
-    run_args = params2run_args(standalone_params)
-    device.run(directory=device.project_dir, with_output=True, run_args=run_args)
+    if param_channel == 'file':
+        with params2file_run_args(standalone_params) as run_args:
+            device.run(directory=device.project_dir, with_output=True, run_args=run_args)
+    else:
+        run_args = params2run_args(standalone_params)
+        device.run(directory=device.project_dir, with_output=True, run_args=run_args)
     end_sim = time.time()
     print('simulation in c++ took ' + str(end_sim - start_sim) + ' sec')
     print('simulation done!')
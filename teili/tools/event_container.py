@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Compact, columnar container for events of event-based cameras, e.g. DVS.
+
+Instead of a dense float64 (4, #events) array, every property of the
+events is stored in its own column with the smallest sensible dtype:
+
+    * x, y: uint16 pixel coordinates.
+    * ts: int64 timestamps in us.
+    * pol: uint8 polarity (0/1).
+
+This needs 13 bytes instead of 32 bytes per event. Containers are stored
+either as a directory of .npy files (one per column) or as datasets of an
+HDF5 file. Both are memory-mapped on load, so large recordings are only
+read as far as they are accessed.
+
+Example:
+    >>> from teili.tools.converter import aedat2container
+    >>> events = aedat2container('recording.aedat', camera='DAVIS240')
+    >>> events.save('recording_events')
+    >>> events = EventContainer.load('recording_events')
+    >>> stimulus = events.window(10e6, 12e6)
+"""
+import os
+import numpy as np
+from collections import OrderedDict
+
+EVENT_DTYPES = OrderedDict([('x', np.uint16),
+                            ('y', np.uint16),
+                            ('ts', np.int64),
+                            ('pol', np.uint8)])
+
+HDF5_EXTENSIONS = ('.h5', '.hdf5')
+
+TIMESTAMP_SCALES = {'us': 1, 'ms': 1000, 'sec': 1e6}
+
+
+class EventContainer(object):
+    """Columnar storage of events, see module docstring.
+
+    Columns are converted to their dtype without copying if they already
+    have it, so memory-mapped columns stay memory-mapped.
+
+    Attributes:
+        x (numpy.ndarray): uint16 x coordinates.
+        y (numpy.ndarray): uint16 y coordinates.
+        ts (numpy.ndarray): int64 timestamps in us.
+        pol (numpy.ndarray): uint8 polarities.
+    """
+
+    def __init__(self, x, y, ts, pol):
+        """Initializes the container from its columns.
+
+        Args:
+            x (array_like): x coordinates.
+            y (array_like): y coordinates.
+            ts (array_like): Timestamps in us.
+            pol (array_like): Polarities.
+
+        Raises:
+            ValueError: If the columns differ in length.
+        """
+        self.x = np.asanyarray(x, dtype=EVENT_DTYPES['x'])
+        self.y = np.asanyarray(y, dtype=EVENT_DTYPES['y'])
+        self.ts = np.asanyarray(ts, dtype=EVENT_DTYPES['ts'])
+        self.pol = np.asanyarray(pol, dtype=EVENT_DTYPES['pol'])
+        if not len(self.x) == len(self.y) == len(self.ts) == len(self.pol):
+            raise ValueError("All columns of an EventContainer need to "
+                             "have the same length.")
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, item):
+        """Selects events, e.g. by slice or boolean mask.
+
+        Args:
+            item (slice, array_like): Events to be selected.
+
+        Returns:
+            EventContainer: Container of the selected events. Slices are
+                views, masks and index arrays copy.
+        """
+        return EventContainer(self.x[item], self.y[item],
+                              self.ts[item], self.pol[item])
+
+    def columns(self):
+        """Returns the columns of the container.
+
+        Returns:
+            collections.OrderedDict: Column names and arrays.
+        """
+        return OrderedDict((name, getattr(self, name))
+                           for name in EVENT_DTYPES)
+
+    @classmethod
+    def from_array(cls, events, unit='us'):
+        """Creates a container from a dense (xpos, ypos, ts, pol) array
+        as returned by aedat2numpy.
+
+        Args:
+            events (numpy.ndarray): (4, #events) array of events.
+            unit (str, optional): unit of the timestamps of events:
+                'us' (default), 'ms' or 'sec'.
+
+        Returns:
+            EventContainer: Container of the events.
+        """
+        events = np.asarray(events)
+        return cls(events[0], events[1],
+                   np.round(events[2] * TIMESTAMP_SCALES[unit]), events[3])
+
+    def to_array(self, unit='ms'):
+        """Converts the events to a dense (xpos, ypos, ts, pol) array as
+        returned by aedat2numpy, e.g. for legacy code.
+
+        Args:
+            unit (str, optional): unit of the returned timestamps:
+                'ms' (default), 'us' or 'sec'.
+
+        Returns:
+            numpy.ndarray: (4, #events) float array of events.
+        """
+        events = np.zeros([4, len(self)])
+        events[0, :] = self.x
+        events[1, :] = self.y
+        events[2, :] = self.ts / TIMESTAMP_SCALES[unit]
+        events[3, :] = self.pol
+        return events
+
+    def window(self, t_start, t_stop, unit='us'):
+        """Selects events within a time window.
+
+        Timestamps are assumed to be sorted, so the window is found by
+        binary search and the returned columns are views.
+
+        Args:
+            t_start (float): Start of the window (inclusive).
+            t_stop (float): End of the window (exclusive).
+            unit (str, optional): unit of t_start and t_stop:
+                'us' (default), 'ms' or 'sec'.
+
+        Returns:
+            EventContainer: Container of the events within the window.
+        """
+        start, stop = np.searchsorted(
+            self.ts, [t_start * TIMESTAMP_SCALES[unit],
+                      t_stop * TIMESTAMP_SCALES[unit]])
+        return self[start:stop]
+
+    def indices(self, resolution):
+        """Maps pixel locations to 1D neuron indices, index = x + y * resolution.
+
+        Args:
+            resolution (int): Resolution of the camera along the x-axis.
+
+        Returns:
+            numpy.ndarray: int64 neuron indices.
+        """
+        return self.x.astype(np.int64) + self.y.astype(np.int64) * resolution
+
+    def save(self, path, group='events'):
+        """Stores the container.
+
+        Args:
+            path (str): Either a path to an HDF5 file (.h5, .hdf5) or a
+                directory in which one .npy file per column is stored.
+            group (str, optional): HDF5 group of the datasets.
+        """
+        if path.endswith(HDF5_EXTENSIONS):
+            import h5py
+            with h5py.File(path, 'a') as h5file:
+                if group in h5file:
+                    del h5file[group]
+                h5group = h5file.create_group(group)
+                h5group.attrs['num_events'] = len(self)
+                for name, column in self.columns().items():
+                    # Contiguous and uncompressed, such that it can be
+                    # memory-mapped on load
+                    h5group.create_dataset(name, data=column)
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            for name, column in self.columns().items():
+                np.save(os.path.join(path, name + '.npy'), column)
+
+    @classmethod
+    def load(cls, path, group='events', mmap_mode='r'):
+        """Loads a container stored with save.
+
+        Args:
+            path (str): Path to an HDF5 file or a directory of .npy files.
+            group (str, optional): HDF5 group of the datasets.
+            mmap_mode (str, optional): Memory-map mode of the columns, see
+                numpy.load. None reads all columns into memory.
+
+        Returns:
+            EventContainer: Container of the stored events.
+        """
+        if path.endswith(HDF5_EXTENSIONS):
+            columns = _load_hdf5_columns(path, group, mmap_mode)
+        else:
+            columns = [np.load(os.path.join(path, name + '.npy'),
+                               mmap_mode=mmap_mode)
+                       for name in EVENT_DTYPES]
+        return cls(*columns)
+
+
+def is_event_container_path(path):
+    """Checks if a path points to a stored EventContainer.
+
+    Args:
+        path (str): Path to be checked.
+
+    Returns:
+        bool: True for HDF5 files and directories of column .npy files.
+    """
+    if path.endswith(HDF5_EXTENSIONS):
+        return os.path.isfile(path)
+    return os.path.isfile(os.path.join(path, 'ts.npy'))
+
+
+def _load_hdf5_columns(path, group, mmap_mode):
+    """Reads the columns of an HDF5 stored EventContainer.
+
+    Contiguous, uncompressed datasets (as written by EventContainer.save)
+    are memory-mapped directly from the file, everything else is read.
+
+    Args:
+        path (str): Path to the HDF5 file.
+        group (str): HDF5 group of the datasets.
+        mmap_mode (str): Memory-map mode, None to read the datasets.
+
+    Returns:
+        list: Columns in the order of EVENT_DTYPES.
+    """
+    import h5py
+    columns = []
+    with h5py.File(path, 'r') as h5file:
+        for name in EVENT_DTYPES:
+            dataset = h5file[group][name]
+            offset = dataset.id.get_offset()
+            if mmap_mode is not None and offset is not None:
+                columns.append(np.memmap(path, mode=mmap_mode,
+                                         dtype=dataset.dtype,
+                                         shape=dataset.shape,
+                                         offset=offset))
+            elif len(dataset) == 0:
+                columns.append(np.zeros(0, dtype=dataset.dtype))
+            else:
+                columns.append(dataset[...])
+    return columns
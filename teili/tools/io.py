@@ -3,12 +3,21 @@
 """ This is a collection of input-output functions.
 Primary it provides wrapper functions to save and load
 monitors and statevariables.
+
+The ResultsStore keeps all monitors, weights and parameters of a run in a
+single HDF5 file and reads them lazily. For long simulations, the
+MonitorRecorder appends monitor data to a ResultsStore during the run.
 """
 
+import bisect
 import time
 import numpy as np
 import os
-from brian2 import ms
+import h5py
+from collections import OrderedDict
+from brian2 import ms, Quantity, NetworkOperation, SpikeMonitor, StateMonitor
+from brian2.units.fundamentalunits import get_or_create_dimension, \
+    get_dimensions, DIMENSIONLESS
 
 class monitor_init():
 
@@ -30,6 +39,9 @@ class monitor_init():
 def save_monitor(monitor, filename, path, unit=ms, variable=None):
     """Save Monitor using numpy.save()
 
+    See ResultsStore to store all monitors of a run in one file, which
+    can be read partially.
+
     Args:
         monitor (brian2 monitor): Spikemonitor of brian2
         filename (str, required): String specifying the name
@@ -70,20 +82,9 @@ def load_monitor(filename, monitor_dt=1*ms, variable=None):
     if variable is None:
         monitor.i = data[0, :]
         monitor.t = data[1, :] * monitor_dt
-    elif variable == 'Vthr':
-        monitor.Vthr= data
-        monitor.t = np.arange(0, len(data), monitor_dt)
-    elif variable == 'I_syn':
-        monitor.I_syn = data
-        monitor.t = np.arange(0, len(data), monitor_dt)
-    elif variable == 'Vm':
-        monitor.Vm = data
-        monitor.t = np.arange(0, len(data), monitor_dt)
-    elif variable == 'Imem':
-        monitor.Imem = data
-        monitor.t = np.arange(0, len(data), monitor_dt)
     else:
-        UserWarning("{} is currently not supported.".format(variable))
+        setattr(monitor, variable, data)
+        monitor.t = np.arange(0, len(data), monitor_dt)
 
     return monitor
 
@@ -155,3 +156,436 @@ def load_weights(filename=None, nrows=None, ncols=None):
     else:
         weight_matrix = weight_matrix.reshape((nrows, ncols))
     return weight_matrix
+
+
+class ResultsStore(object):
+    """Single-file, lazily read store of the results of a simulation run.
+
+    All monitors, weights and parameters of one run go into one HDF5 file:
+
+        * one group per monitor with one dataset per recorded variable
+          (including t). Data of a monitor which is saved again, e.g. by a
+          MonitorRecorder, is appended.
+        * one dataset per weight matrix in the group weights.
+        * parameters as attributes of the group params.
+
+    Values are stored in SI base units, the dimensions are kept as
+    attributes. Nothing is read on opening, monitors are returned as
+    StoredMonitor objects which only read the requested slices.
+
+    Example:
+        >>> with ResultsStore('wta_run.h5') as store:
+        >>>     store.save_monitor(wta.monitors['spikemon_exc'])
+        >>>     store.save_weights('exc_exc', wta._groups['s_exc_exc'].weight)
+        >>>     store.save_params(wta.params)
+
+        >>> store = ResultsStore('wta_run.h5', mode='r')
+        >>> spikes = store['wta_spikemon_exc'].window(1 * second, 2 * second)
+        >>> spikes.i, spikes.t
+
+    Attributes:
+        filename (str): Path of the HDF5 file.
+        h5file (h5py.File): The open HDF5 file.
+    """
+
+    def __init__(self, filename, mode='a'):
+        """Opens the store.
+
+        Args:
+            filename (str): Path of the HDF5 file.
+            mode (str, optional): h5py file mode, e.g. 'r' to read, 'a' to
+                read and append (default) or 'w' to overwrite.
+        """
+        self.filename = filename
+        self.h5file = h5py.File(filename, mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, monitor_name):
+        """Returns a stored monitor without reading its data.
+
+        Args:
+            monitor_name (str): Name of the monitor.
+
+        Returns:
+            StoredMonitor: Lazy view of the monitor.
+        """
+        return StoredMonitor(self.h5file[monitor_name])
+
+    def __contains__(self, monitor_name):
+        return monitor_name in self.monitor_names
+
+    @property
+    def monitor_names(self):
+        """list: Names of all stored monitors.
+        """
+        return [name for name, h5group in self.h5file.items()
+                if 'monitor_type' in h5group.attrs]
+
+    def keys(self):
+        return self.monitor_names
+
+    def save_monitor(self, monitor, name=None):
+        """Stores (or appends) all data recorded by a monitor.
+
+        Args:
+            monitor (brian2 monitor): SpikeMonitor or StateMonitor.
+            name (str, optional): Name under which the monitor is stored.
+                Defaults to the monitor's name.
+        """
+        if name is None:
+            name = monitor.name
+        if isinstance(monitor, SpikeMonitor):
+            num_samples = monitor.num_spikes
+            monitor_type = 'spike'
+        else:
+            num_samples = len(monitor.t)
+            monitor_type = 'state'
+
+        if num_samples == 0 and name in self.h5file:
+            return
+        h5group = self.h5file.require_group(name)
+        h5group.attrs['monitor_type'] = monitor_type
+        for var in sorted(set(monitor.record_variables) | {'t'}):
+            variable = monitor.variables[var]
+            _append_dataset(h5group, var,
+                            variable.get_value()[:num_samples],
+                            variable.dim)
+
+    def save_weights(self, name, weights):
+        """Stores (overwrites) a weight array.
+
+        Args:
+            name (str): Name of the weights, e.g. of the Connections.
+            weights (array_like): Weights, e.g. Connections.weight.
+        """
+        h5group = self.h5file.require_group('weights')
+        if name in h5group:
+            del h5group[name]
+        dataset = h5group.create_dataset(name, data=np.asarray(weights))
+        dataset.attrs['dimensions'] = _dimensions(weights)
+
+    def load_weights(self, name, nrows=None, ncols=None):
+        """Loads a weight array.
+
+        Args:
+            name (str): Name of the weights.
+            nrows (int, optional): Number of rows to reshape the weights to.
+            ncols (int, optional): Number of columns to reshape the weights
+                to.
+
+        Returns:
+            ndarray: The stored weights.
+        """
+        dataset = self.h5file['weights'][name]
+        weights = _with_dimensions(dataset[...], dataset.attrs['dimensions'])
+        if nrows is not None or ncols is not None:
+            weights = weights.reshape((nrows or -1, ncols or -1))
+        return weights
+
+    def save_params(self, params, name=None):
+        """Stores (updates) parameters as attributes.
+
+        Nested dictionaries are stored as sub groups.
+
+        Args:
+            params (dict): Parameter names and values, e.g. the parameters
+                of a building block.
+            name (str, optional): Name of the parameter set, e.g. the
+                name of a group. By default parameters are stored in the
+                group params itself.
+        """
+        h5group = self.h5file.require_group('params')
+        if name is not None:
+            h5group = h5group.require_group(name)
+        _write_params(h5group, params)
+
+    @property
+    def params(self):
+        """dict: All stored parameters, with units.
+        """
+        if 'params' not in self.h5file:
+            return {}
+        return _read_params(self.h5file['params'])
+
+    def flush(self):
+        self.h5file.flush()
+
+    def close(self):
+        self.h5file.close()
+
+
+class StoredMonitor(object):
+    """Lazy view of a monitor stored in a ResultsStore.
+
+    Variables are only read from disk when accessed. They can be read
+    completely as attributes (e.g. monitor.t, monitor.i) or sliced with
+    read and window.
+
+    Attributes:
+        h5group (h5py.Group): HDF5 group of the monitor.
+        monitor_type (str): Either 'spike' or 'state'.
+        variables (list): Names of the stored variables.
+    """
+
+    def __init__(self, h5group):
+        self.h5group = h5group
+        self.monitor_type = h5group.attrs['monitor_type']
+        self.variables = list(h5group.keys())
+
+    def __len__(self):
+        return self.h5group['t'].shape[0]
+
+    def __getattr__(self, var):
+        if var in self.__dict__.get('variables', []):
+            return self.read(var)
+        raise AttributeError(var)
+
+    def read(self, var, start=None, stop=None):
+        """Reads a slice of a variable along the time axis.
+
+        Args:
+            var (str): Name of the variable.
+            start (int, optional): First spike/sample to read.
+            stop (int, optional): Spike/sample to stop reading at.
+
+        Returns:
+            brian2.Quantity: Values with units. State variables are shaped
+                (#indices, #timesteps) as in brian2.
+        """
+        dataset = self.h5group[var]
+        values = dataset[start:stop]
+        if self.monitor_type == 'state' and var != 't':
+            values = values.T
+        return _with_dimensions(values, dataset.attrs['dimensions'])
+
+    def window(self, t_start, t_stop):
+        """Reads all variables within a time window.
+
+        The window is found by binary search on the stored, sorted
+        timestamps, so only O(log n) timestamps are read besides the
+        window itself.
+
+        Args:
+            t_start (brian2.unit): Start of the window (inclusive).
+            t_stop (brian2.unit): End of the window (exclusive).
+
+        Returns:
+            monitor obj.: A monitor with all variables within the window as
+                attributes.
+        """
+        timestamps = self.h5group['t']
+        start = bisect.bisect_left(timestamps, float(t_start))
+        stop = bisect.bisect_left(timestamps, float(t_stop))
+        return self.load(start, stop)
+
+    def load(self, start=None, stop=None):
+        """Reads all variables, optionally only a slice of them.
+
+        Args:
+            start (int, optional): First spike/sample to read.
+            stop (int, optional): Spike/sample to stop reading at.
+
+        Returns:
+            monitor obj.: A monitor with the variables as attributes.
+        """
+        monitor = monitor_init()
+        for var in self.variables:
+            setattr(monitor, var, self.read(var, start, stop))
+        return monitor
+
+
+class MonitorRecorder(NetworkOperation):
+    """Append-only recorder which flushes monitors to disk during a run.
+
+    Every flush_interval of simulated time (and at the end of every run)
+    the data recorded so far by the attached SpikeMonitors and
+    StateMonitors is appended to a ResultsStore and the monitors are
+    emptied. Thus memory stays bounded for arbitrarily long simulations
+    without splitting up TeiliNetwork.run.
+
+    Note:
+        Data can only be flushed during a run with runtime code generation
+        (numpy or cython). In cpp_standalone mode call flush() after a run
+        instead of adding the recorder to the network.
+
+    Example:
+        >>> recorder = MonitorRecorder('run.h5', flush_interval=1 * second)
+        >>> recorder.add(wta)  # all monitors of a building block
+        >>> recorder.add(neurons, variables=['Imem'])  # new monitors
+        >>> net = TeiliNetwork(wta, neurons, recorder)
+        >>> net.run(3600 * second)
+        >>> recorder.close()
+
+    Attributes:
+        filename (str): Path of the ResultsStore data is appended to.
+        monitors (dict): Recorded monitors by name.
+    """
+
+    def __init__(self, filename, monitors=(), flush_interval=1000 * ms,
+                 name='monitorrecorder*'):
+        """Initializes the recorder.
+
+        Args:
+            filename (str): Path of the ResultsStore data is appended to.
+                Data of an existing file is kept and appended to.
+            monitors (iterable, optional): Monitors, groups or building
+                blocks to be recorded, see add.
+            flush_interval (brian2.unit, optional): Simulated time between
+                two flushes.
+            name (str, optional): Name of the recorder.
+        """
+        NetworkOperation.__init__(self, self.flush, dt=flush_interval,
+                                  when='end', order=1000, name=name)
+        self.filename = filename
+        self.monitors = OrderedDict()
+        self._store = None
+        for monitor in monitors:
+            self.add(monitor)
+
+    def add(self, obj, variables=None, record=True):
+        """Attaches monitors to the recorder.
+
+        Args:
+            obj (brian2 object): Either a SpikeMonitor or StateMonitor, a
+                building block (all its monitors are recorded) or a neuron
+                group. For groups a SpikeMonitor and, if variables are given,
+                a StateMonitor is created. These monitors are contained in
+                the recorder, i.e. they are added to a network together with
+                the recorder.
+            variables (list, optional): Variables of a group to be recorded
+                with a StateMonitor.
+            record (bool, list, optional): Indices of a group to be
+                recorded with the StateMonitor.
+        """
+        if isinstance(obj, (SpikeMonitor, StateMonitor)):
+            self.monitors[obj.name] = obj
+        elif hasattr(obj, 'monitors'):
+            for monitor in obj.monitors.values():
+                self.add(monitor)
+        else:
+            spikemon = SpikeMonitor(obj, name='spikemon_' + obj.name)
+            self.contained_objects.append(spikemon)
+            self.add(spikemon)
+            if variables:
+                statemon = StateMonitor(obj, variables, record=record,
+                                        name='statemon_' + obj.name)
+                self.contained_objects.append(statemon)
+                self.add(statemon)
+
+    def flush(self):
+        """Appends the data recorded so far to disk and empties the
+        monitors.
+        """
+        if self._store is None:
+            self._store = ResultsStore(self.filename, mode='a')
+        for name, monitor in self.monitors.items():
+            self._store.save_monitor(monitor, name=name)
+            monitor.resize(0)
+            if isinstance(monitor, SpikeMonitor):
+                # SpikeMonitor.resize does not reset the number of events
+                monitor.variables['N'].set_value(0)
+        self._store.flush()
+
+    def after_run(self):
+        """Flushes the remaining data at the end of every run.
+        """
+        self.flush()
+
+    def close(self):
+        """Flushes the remaining data and closes the file.
+        """
+        self.flush()
+        self._store.close()
+        self._store = None
+
+
+def _dimensions(value):
+    """Returns the dimensions of a value as array of exponents of the SI
+    base units (dimensionless for values without units).
+    """
+    return np.asarray(get_dimensions(value)._dims, dtype=float)
+
+
+def _with_dimensions(values, dimensions):
+    """Adds units to values read from disk.
+    """
+    dim = get_or_create_dimension(dimensions)
+    if dim is DIMENSIONLESS:
+        return values
+    return Quantity(values, dim=dim)
+
+
+def _write_params(h5group, params):
+    """Writes parameters as attributes of a group (recursively). Values
+    which cannot be stored as array are stored as string.
+    """
+    for key, value in params.items():
+        if isinstance(value, dict):
+            _write_params(h5group.require_group(key), value)
+            continue
+        try:
+            h5group.attrs[key] = np.asarray(value)
+            h5group.attrs[key + '.dimensions'] = _dimensions(value)
+        except TypeError:
+            h5group.attrs[key] = str(value)
+
+
+def _read_params(h5group):
+    """Reads the parameters stored as attributes of a group (recursively).
+    """
+    params = {}
+    for key, value in h5group.attrs.items():
+        if key.endswith('.dimensions'):
+            continue
+        if key + '.dimensions' in h5group.attrs:
+            value = _with_dimensions(value, h5group.attrs[key + '.dimensions'])
+        if isinstance(value, np.ndarray) and value.ndim == 0:
+            value = value[()]
+        params[key] = value
+    for key, sub_group in h5group.items():
+        params[key] = _read_params(sub_group)
+    return params
+
+
+def _append_dataset(h5group, name, values, dim):
+    """Appends values along the first axis of a resizable HDF5 dataset,
+    which is created if it does not exist yet.
+
+    Args:
+        h5group (h5py.Group): Group of the dataset.
+        name (str): Name of the dataset.
+        values (numpy.ndarray): Values to be appended.
+        dim (brian2.Dimension): Dimensions of the values.
+    """
+    values = np.asarray(values)
+    if name not in h5group:
+        dataset = h5group.create_dataset(
+            name, data=values, chunks=True,
+            maxshape=(None,) + values.shape[1:])
+        dataset.attrs['dimensions'] = np.asarray(dim._dims, dtype=float)
+    else:
+        dataset = h5group[name]
+        num_values = dataset.shape[0]
+        dataset.resize(num_values + len(values), axis=0)
+        dataset[num_values:] = values
+
+
+def load_recorded_monitor(filename, monitor_name):
+    """Loads a monitor stored by a MonitorRecorder or ResultsStore.
+
+    Args:
+        filename (str): Path of the HDF5 file.
+        monitor_name (str): Name of the recorded monitor.
+
+    Returns:
+        monitor obj.: A monitor with the recorded variables (e.g. i and t
+            or the state variables) as attributes, with units. State
+            variables are shaped (#indices, #timesteps) as in brian2.
+    """
+    with ResultsStore(filename, mode='r') as store:
+        return store[monitor_name].load()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Batched evaluation of the kernels of teili.tools.synaptic_kernel.
+
+Setting s.weight = 'kernel_gauss_2d(i,j,sigma,nrows,ncols)' evaluates the
+kernel once per synapse, and the numpy versions of the 2D and Gabor
+kernels convert every index to grid coordinates on their own. The kernels
+however only depend on the offset between the coordinates of the pre- and
+post-synaptic neuron. kernel_weights therefore tabulates a kernel once for
+all offsets and looks up the weights of all synapses with numpy indexing.
+Coordinates and tables are cached by the group sizes and the kernel
+parameters, so repeated building blocks reuse them.
+
+Example:
+    >>> from teili.tools.kernel_weights import kernel_weights
+    >>> s_exc_exc.weight = 5 * kernel_weights(s_exc_exc, 'kernel_gauss_2d',
+                                              sigma, nrows, ncols)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from teili.tools import synaptic_kernel
+
+
+def _line(N):
+    return np.arange(N), np.zeros(N, dtype=int)
+
+
+def _grid(nrows, ncols):
+    # Index i sits at (i // ncols, i % ncols), see ind2xy
+    return np.divmod(np.arange(nrows * ncols), ncols)
+
+
+def _coordinates_1d(N_pre, N_post, gsigma):
+    return _line(N_pre), _line(N_post)
+
+
+def _coordinates_2d(N_pre, N_post, gsigma, nrows, ncols):
+    return _grid(nrows, ncols), _grid(nrows, ncols)
+
+
+def _coordinates_gabor_2d(N_pre, N_post, offx, offy, theta, sigmax, sigmay,
+                          freq, input_size_x, input_size_y, window_size_x,
+                          window_size_y, rf_size):
+    iy, ix = _grid(input_size_y, input_size_x)
+    y0, x0 = _grid(window_size_y, window_size_x)
+    x0 = x0 + int((input_size_x - window_size_x + 1) / 2) + offx
+    y0 = y0 + int((input_size_y - window_size_y + 1) / 2) + offy
+    return (ix, iy), (x0, y0)
+
+
+def _mexican_1d(x, y, gsigma):
+    exponent = -(x**2) / (2 * gsigma**2)
+    return (1 + 2 * exponent) * np.exp(exponent)
+
+
+def _gauss_1d(x, y, gsigma):
+    return np.exp(-(x**2) / (2 * gsigma**2))
+
+
+def _mexican_2d(x, y, gsigma, nrows, ncols):
+    exponent = -(x**2 + y**2) / (2 * gsigma**2)
+    return (1 + exponent) * np.exp(exponent)
+
+
+def _gauss_2d(x, y, gsigma, nrows, ncols):
+    return np.exp(-(x**2 + y**2) / (2 * gsigma**2))
+
+
+def _gabor_2d(x, y, offx, offy, theta, sigmax, sigmay, freq, input_size_x,
+              input_size_y, window_size_x, window_size_y, rf_size):
+    if not ((window_size_x + abs(offx) <= (input_size_x - (rf_size - 1))) &
+            (window_size_y + abs(offy) <= (input_size_y - (rf_size - 1)))):
+        print("The kernel window is bigger than InputSize-(rf_size-1)")
+        return np.zeros(np.shape(x))
+    x_theta = x * np.cos(theta - np.pi / 2) + y * np.sin(theta - np.pi / 2)
+    y_theta = -x * np.sin(theta - np.pi / 2) + y * np.cos(theta - np.pi / 2)
+    exponent = -(((x_theta**2) / (2 * sigmax**2)) +
+                 ((y_theta**2) / (2 * sigmay**2)))
+    res = np.exp(exponent) * np.cos(np.pi * x_theta / freq)
+    return res * (abs(x) < rf_size / 2) * (abs(y) < rf_size / 2)
+
+
+# Coordinates of the neurons and kernel as a function of the offsets
+BATCHED_KERNELS = {
+    'kernel_mexican_1d': (_coordinates_1d, _mexican_1d),
+    'kernel_gauss_1d': (_coordinates_1d, _gauss_1d),
+    'kernel_mexican_2d': (_coordinates_2d, _mexican_2d),
+    'kernel_gauss_2d': (_coordinates_2d, _gauss_2d),
+    'kernel_gabor_2d': (_coordinates_gabor_2d, _gabor_2d),
+}
+
+
+def _kernel_name(kernel):
+    if isinstance(kernel, str):
+        return kernel
+    return getattr(kernel, 'pyfunc', kernel).__name__
+
+
+def has_batched_kernel(kernel):
+    """Checks if a kernel can be evaluated by kernel_weights.
+
+    Args:
+        kernel (str, brian2.Function): Kernel or its name.
+
+    Returns:
+        bool: True for the kernels of teili.tools.synaptic_kernel.
+    """
+    name = _kernel_name(kernel)
+    return name in BATCHED_KERNELS and \
+        (isinstance(kernel, str) or
+         getattr(synaptic_kernel, name, None) is kernel)
+
+
+@lru_cache(maxsize=32)
+def kernel_table(kernel, N_pre, N_post, *args):
+    """Tabulates a kernel for all offsets between the neurons of two groups.
+
+    Args:
+        kernel (str): Name of the kernel, see BATCHED_KERNELS.
+        N_pre (int): Size of the pre-synaptic group.
+        N_post (int): Size of the post-synaptic group.
+        *args: Arguments of the kernel after i and j.
+
+    Returns:
+        tuple: Coordinates of the pre- and post-synaptic neurons, the
+            table of the kernel indexed by the offsets in x and y and the
+            minimal offsets in x and y. The arrays are read-only.
+    """
+    coordinates, function = BATCHED_KERNELS[kernel]
+    (x_pre, y_pre), (x_post, y_post) = coordinates(N_pre, N_post, *args)
+    x_min = np.min(x_pre) - np.max(x_post)
+    y_min = np.min(y_pre) - np.max(y_post)
+    x, y = np.meshgrid(np.arange(x_min, np.max(x_pre) - np.min(x_post) + 1),
+                       np.arange(y_min, np.max(y_pre) - np.min(y_post) + 1),
+                       indexing='ij')
+    table = np.asarray(function(x, y, *args), dtype=float)
+    for array in (x_pre, y_pre, x_post, y_post, table):
+        array.setflags(write=False)
+    return (x_pre, y_pre), (x_post, y_post), table, (x_min, y_min)
+
+
+def kernel_weights(connections, kernel, *args):
+    """Computes the weights of all synapses of a Connections object.
+
+    Args:
+        connections (Connections): Connected synapses.
+        kernel (str, brian2.Function): Kernel of teili.tools.synaptic_kernel
+            or its name.
+        *args: Arguments of the kernel after i and j, e.g. gsigma, nrows
+            and ncols for kernel_gauss_2d.
+
+    Returns:
+        ndarray: Weight of every synapse, the same as evaluating
+            kernel(i, j, *args) per synapse.
+
+    Raises:
+        ValueError: If the kernel has no batched implementation.
+    """
+    if not has_batched_kernel(kernel):
+        raise ValueError(f"No batched implementation of kernel "
+                         f"'{_kernel_name(kernel)}'.")
+    # Quantities are not hashable
+    args = tuple(np.asarray(arg).item() for arg in args)
+    (x_pre, y_pre), (x_post, y_post), table, (x_min, y_min) = kernel_table(
+        _kernel_name(kernel), len(connections.source),
+        len(connections.target), *args)
+    i = np.asarray(connections.i[:])
+    j = np.asarray(connections.j[:])
+    return table[x_pre[i] - x_post[j] - x_min, y_pre[i] - y_post[j] - y_min]
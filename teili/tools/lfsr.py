@@ -2,8 +2,15 @@
 a LFSR is used as random number generator. This is particularly important
 in stochastic models such as the one described by Wang, Thakur and van Schaik
 (2018).
+
+The cycles of the LFSRs are shared by all groups through LFSRTables,
+which stores them on disk (see DEFAULT_LFSR_CACHE).
 """
 
+import os
+import uuid
+from functools import lru_cache
+
 from brian2 import ms, TimedArray
 
 from teili.core.groups import Neurons, Connections
@@ -12,6 +19,273 @@ import sys
 
 import numpy as np
 
+# Masks of maximal length LFSRs for the supported number of bits
+LFSR_MASKS = {3: 0b1011, 4: 0b10011, 5: 0b100101, 6: 0b1000011,
+              9: 0b1000010001}
+
+DEFAULT_LFSR_CACHE = os.path.join(os.path.expanduser("~"), ".teili",
+                                  "lfsr_tables")
+
+# C++ counterpart of lfsr_advance for a single register. Registers are
+# advanced step by step, so whole cycles are skipped first.
+LFSR_CPP_CODE = '''
+    #ifndef _TEILI_LFSR_ADVANCE
+    #define _TEILI_LFSR_ADVANCE
+    int _teili_lfsr_step(const int state, const int num_bits, const int mask)
+    {
+        const int shifted = state << 1;
+        return (shifted >> num_bits) ? shifted ^ mask : shifted;
+    }
+
+    int _teili_lfsr_advance(int state, const int num_bits, const int mask,
+                            long num_steps)
+    {
+        const int max_value = 1 << num_bits;
+        if (num_steps > max_value) {
+            // cycles are at most max_value steps long
+            int cycle = 0;
+            int cycle_state = state;
+            do {
+                cycle_state = _teili_lfsr_step(cycle_state, num_bits, mask);
+                cycle++;
+            } while (cycle_state != state && cycle < max_value);
+            if (cycle_state == state)
+                num_steps %= cycle;
+        }
+        for (long i = 0; i < num_steps; i++)
+            state = _teili_lfsr_step(state, num_bits, mask);
+        return state;
+    }
+    #endif
+    '''
+
+
+@lru_cache(maxsize=None)
+def lfsr_transition(num_bits, mask, num_steps=1):
+    """Returns the transition table of an LFSR, i.e. the state of the
+    register after num_steps steps for all possible states.
+
+    Tables are computed by repeated squaring of the single step table and
+    cached, so advancing a register by any number of steps costs a single
+    lookup.
+
+    Args:
+        num_bits (int): Number of bits of the LFSR.
+        mask (int): Value to be used in the XOR operation.
+        num_steps (int, optional): Number of steps.
+
+    Returns:
+        numpy.ndarray: State after num_steps steps for every state.
+    """
+    if num_steps == 0:
+        return np.arange(2**num_bits)
+    if num_steps == 1:
+        table = np.arange(2**num_bits) << 1
+        table[table >> num_bits > 0] ^= mask
+        return table
+    half = lfsr_transition(num_bits, mask, num_steps // 2)
+    table = half[half]
+    if num_steps % 2:
+        table = lfsr_transition(num_bits, mask, 1)[table]
+    return table
+
+
+def lfsr_advance(states, num_bits, mask=None, num_steps=1):
+    """Advances all registers of a group by num_steps steps at once.
+
+    Args:
+        states (array_like): Integer states of the registers.
+        num_bits (int or array_like): Number of bits of the registers,
+            either one for all or one per register.
+        mask (int, optional): Value to be used in the XOR operation. By
+            default the mask in LFSR_MASKS of the number of bits.
+        num_steps (int, optional): Number of steps.
+
+    Returns:
+        numpy.ndarray: Integer states after num_steps steps.
+    """
+    states = np.asarray(states, dtype=int)
+    num_bits = np.broadcast_to(np.asarray(num_bits, dtype=int), states.shape)
+    advanced = np.empty_like(states)
+    for bits in np.unique(num_bits):
+        bits_mask = LFSR_MASKS[bits] if mask is None else int(mask)
+        table = lfsr_transition(int(bits), bits_mask, int(num_steps))
+        selected = num_bits == bits
+        advanced[selected] = table[states[selected]]
+    return advanced
+
+
+def lfsr_sequence(seed, length, num_bits, mask=None):
+    """Returns consecutive states of one register, e.g. to initialize the
+    registers of a group.
+
+    The sequence is built by doubling, the known part of the sequence is
+    advanced by its own length at once.
+
+    Args:
+        seed (int): State the sequence starts from (not included).
+        length (int): Number of states.
+        num_bits (int): Number of bits of the register.
+        mask (int, optional): Value to be used in the XOR operation. By
+            default the mask in LFSR_MASKS of the number of bits.
+
+    Returns:
+        numpy.ndarray: The states after 1, ..., length steps.
+    """
+    if mask is None:
+        mask = LFSR_MASKS[num_bits]
+    sequence = np.empty(length, dtype=int)
+    if length == 0:
+        return sequence
+    sequence[0] = lfsr_transition(num_bits, mask, 1)[seed]
+    known = 1
+    while known < length:
+        num_new = min(known, length - known)
+        sequence[known:known + num_new] = lfsr_transition(
+            num_bits, mask, known)[sequence[:num_new]]
+        known += num_new
+    return sequence
+
+
+class LFSRTables(object):
+    """Shared storage of the LFSR sequences used by lfsr_timedarray.
+
+    The full cycle of every LFSR (one per number of bits and mask) is built
+    once, kept as uint16/uint32 array and stored in cache_dir, so later
+    processes load it instead of regenerating it. All groups and networks
+    using the same bit widths share one TimedArray, so memory grows with
+    the sum of 2**num_bits and not with the number of groups.
+
+    Attributes:
+        cache_dir (str): Directory of the stored sequences, None to not
+            store them.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_LFSR_CACHE):
+        """Initializes the tables.
+
+        Args:
+            cache_dir (str, optional): Directory of the stored sequences,
+                None to not store them.
+        """
+        self.cache_dir = cache_dir
+        self._sequences = {}
+        self._timed_arrays = {}
+
+    def sequence(self, num_bits, mask=None):
+        """Returns the cycle of an LFSR starting from 1.
+
+        Args:
+            num_bits (int): Number of bits of the LFSR.
+            mask (int, optional): Value to be used in the XOR operation. By
+                default the mask in LFSR_MASKS of the number of bits.
+
+        Returns:
+            numpy.ndarray: The 2**num_bits - 1 states of the cycle.
+        """
+        num_bits = int(num_bits)
+        if mask is None:
+            mask = LFSR_MASKS[num_bits]
+        key = (num_bits, int(mask))
+        if key not in self._sequences:
+            sequence = self._load(*key)
+            if sequence is None:
+                dtype = np.uint16 if num_bits <= 16 else np.uint32
+                sequence = np.concatenate(
+                    [[1], lfsr_sequence(1, 2**num_bits - 2, *key)]).astype(dtype)
+                self._store(sequence, *key)
+            self._sequences[key] = sequence
+        return self._sequences[key]
+
+    def offsets(self, num_bits):
+        """Returns where the cycles of the given bit widths start in the
+        concatenated table of timed_array.
+
+        Args:
+            num_bits (array_like): Bit widths, e.g. lfsr_num_bits of all
+                elements.
+
+        Returns:
+            dict: Start index of each distinct bit width.
+        """
+        offsets = {}
+        start = 0
+        for bits in np.unique(np.asarray(num_bits, dtype=int)):
+            offsets[bits] = start
+            start += 2**bits - 1
+        return offsets
+
+    def indices(self, num_bits):
+        """Indexing helper for the elements of groups, which access the
+        table with lfsr_timedarray(((seed + t) % max_value) + init).
+
+        Args:
+            num_bits (array_like): lfsr_num_bits of all elements.
+
+        Returns:
+            tuple: init (start of the cycle of each element) and max_value
+                (length of the cycle of each element) as integer arrays.
+        """
+        num_bits = np.asarray(num_bits, dtype=int)
+        offsets = self.offsets(num_bits)
+        widths = np.array(sorted(offsets), dtype=int)
+        starts = np.array([offsets[bits] for bits in widths], dtype=int)
+        return starts[np.searchsorted(widths, num_bits)], 2**num_bits - 1
+
+    def timed_array(self, num_bits, dt):
+        """Returns the TimedArray of the concatenated cycles of the given
+        bit widths. Calls with the same bit widths and dt share one
+        TimedArray.
+
+        Args:
+            num_bits (array_like): Bit widths, e.g. lfsr_num_bits of all
+                elements.
+            dt (second): Time step of the TimedArray.
+
+        Returns:
+            brian2.TimedArray: Table of all cycles.
+        """
+        widths = tuple(sorted(self.offsets(num_bits)))
+        key = (widths, float(dt))
+        if key not in self._timed_arrays:
+            self._timed_arrays[key] = TimedArray(
+                np.concatenate([self.sequence(bits) for bits in widths]),
+                dt=dt)
+        return self._timed_arrays[key]
+
+    def _filename(self, num_bits, mask):
+        return os.path.join(self.cache_dir,
+                            'lfsr_{}_{:x}.npy'.format(num_bits, mask))
+
+    def _load(self, num_bits, mask):
+        if self.cache_dir is None:
+            return None
+        try:
+            sequence = np.load(self._filename(num_bits, mask))
+        except (IOError, ValueError):
+            return None
+        if len(sequence) != 2**num_bits - 1:
+            return None
+        return sequence
+
+    def _store(self, sequence, num_bits, mask):
+        """Stores a sequence. It is written to a temporary file which is
+        then renamed, so other processes never read a partial file.
+        """
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_filename = os.path.join(self.cache_dir,
+                                        '.tmp_' + uuid.uuid4().hex + '.npy')
+            np.save(tmp_filename, sequence)
+            os.replace(tmp_filename, self._filename(num_bits, mask))
+        except OSError:  # e.g. read-only home, the sequence is still used
+            pass
+
+
+lfsr_tables = LFSRTables()
+
 
 def get_parameters(n_elements, lfsr, prev_index):
     max_value = lfsr['max_value'][prev_index:prev_index+n_elements]*ms
@@ -21,7 +295,22 @@ def get_parameters(n_elements, lfsr, prev_index):
 
     return max_value, init, seed, prev_index
 
-def create_lfsr(neuron_groups, synapse_groups, time_step):
+def create_lfsr(neuron_groups, synapse_groups, time_step, tables=None):
+    """Sets the LFSR parameters of all elements of the groups and adds the
+    shared lfsr_timedarray to their namespaces.
+
+    Args:
+        neuron_groups (list): Neurons using an LFSR.
+        synapse_groups (list): Connections using an LFSR.
+        time_step (second): Time step of lfsr_timedarray.
+        tables (LFSRTables, optional): Tables providing the sequences, by
+            default lfsr_tables.
+
+    Returns:
+        brian2.TimedArray: Table of the cycles of all bit widths used.
+    """
+    if tables is None:
+        tables = lfsr_tables
     lfsr_lengths = []
     groups = neuron_groups+synapse_groups
     for g in groups:
@@ -37,40 +326,14 @@ def create_lfsr(neuron_groups, synapse_groups, time_step):
                 lfsr_lengths.extend(list(g.lfsr_num_bits_condApre2))
                 lfsr_lengths.extend(list(g.lfsr_num_bits_condApost1))
                 lfsr_lengths.extend(list(g.lfsr_num_bits_condApost2))
-    lfsr_num_bits = np.unique(lfsr_lengths)
-    lfsr_max = [int(2**n - 1) for n in lfsr_num_bits]
-
-    mask = {3: 0b1011, 4: 0b10011, 5: 0b100101, 6: 0b1000011,
-            9: 0b1000010001}
-
-    lfsr = {}
-    lfsr['array'] = []
-    init_map = {}
-    prev_index = 0
-    prev_nbits = 0
-
-    for i, n_bits in enumerate(lfsr_num_bits):
-        # Determines possition of lfsr['array'] where each lfsr starts
-        init_map[n_bits] = prev_index + (2**prev_nbits - 1)
-        prev_index = init_map[n_bits]
-        prev_nbits = n_bits
-
-        # Create LFSR values
-        lfsr_val = 1
-        lfsr['array'].append(lfsr_val)
-        for _ in range(1, lfsr_max[i]):
-            lfsr_val = lfsr_val << 1
-            overflow = lfsr_val >> int(n_bits)
-            if overflow:
-                lfsr_val ^= mask[n_bits]
-            lfsr['array'].append(lfsr_val)
-    lfsr_timedarray = TimedArray(lfsr['array'], dt=time_step)
+    lfsr_lengths = np.asarray(lfsr_lengths, dtype=int)
+    lfsr_timedarray = tables.timed_array(lfsr_lengths, time_step)
 
     # Creates values for all element following the order of their
     # initializations
-    lfsr['seed'] = [np.random.randint(2**x-1) for x in lfsr_lengths]
-    lfsr['max_value'] = [2**x-1 for x in lfsr_lengths]
-    lfsr['init'] = [init_map[x] for x in lfsr_lengths]
+    lfsr = {}
+    lfsr['seed'] = np.random.randint(2**lfsr_lengths - 1)
+    lfsr['init'], lfsr['max_value'] = tables.indices(lfsr_lengths)
 
     prev_index = 0
     for g in (groups):
@@ -5,6 +5,9 @@ This module is used to run large parameter sweeps in parallel
 It uses cpp code generation (single compile per worker) and multiprocessing, often making the simulation up to
 2 orders of magnitude faster than with numpy on a single core.
 
+Instead of the full grid of a sweep, RandomSearch, SuccessiveHalving and BayesianSearch evaluate only chosen
+points of the parameter space on the same workers.
+
 Not sure, if this works well on Windows, let me know, if you tried.
 
 # TODO: Make this compatible with Brian2GeNN for even more performance using GPU
@@ -20,13 +23,15 @@ import shutil
 # import psutil
 import numpy as np
 import json
+import inspect
 import traceback
 import itertools
-import json
 from multiprocessing import Pool, cpu_count
+from contextlib import contextmanager
 import sys
 from brian2 import get_device
 import pandas as pd
+from scipy.stats import norm
 
 
 class SweepParameter:
@@ -45,7 +50,7 @@ class SweepParameter:
         sweep_range = np.asarray(sweep_range)
         self.variables = variables
         self.range = np.round(sweep_range, decimals=round_decimals)
-        if any((self.range - sweep_range) > sweep_range*0.01):
+        if any(np.abs(self.range - sweep_range) > np.abs(sweep_range)*0.01):
             raise Warning('please adjust round_decimals argument of SweepParameter to a higher value, your sweep range'
                           ' seems to have values that are of higher precision')
         self.full_names = [var.group.name + '_' + var.name for var in variables]
@@ -58,6 +63,76 @@ class SweepParameter:
         return 'sweep of variable(s) ' + ' and '.join(self.full_names) + ' over range ' + str(self.range) + ' '
 
 
+class SweepCheckpoint:
+    """
+    on-disk table of finished runs of a sweep (one json object per line)
+
+    every finished parameter combination is appended (and flushed) as soon as its result arrives, so a crash or
+    an interrupt only loses the runs that were still in progress. Reopening the same file gives the finished
+    combinations, which are skipped when the sweep is resumed.
+    """
+
+    def __init__(self, filename, parameter_names):
+        """
+        :param filename (str): path of the checkpoint file, it is created if it does not exist
+        :param parameter_names (list of str): friendly names of the sweep parameters, they identify a run
+        """
+        self.filename = filename
+        self.parameter_names = list(parameter_names)
+        self.rows = []
+        if os.path.exists(filename):
+            with open(filename, 'r') as file:
+                for line in file:
+                    if line.strip():
+                        self.rows.append(json.loads(line))
+        self.finished = set(self.key(row) for row in self.rows)
+
+    def key(self, loop_param_dict):
+        """
+        :param loop_param_dict (dict): parameters of a run (may contain more than the sweep parameters)
+        :return: hashable key of the run
+        """
+        return tuple(float(loop_param_dict[name]) for name in self.parameter_names)
+
+    def __contains__(self, loop_param_dict):
+        return self.key(loop_param_dict) in self.finished
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, loop_param_dict, output):
+        """
+        appends a finished run to the table
+
+        :param loop_param_dict (dict): parameters of the run
+        :param output: return value of process_results. A dict is stored as one column per key, anything else
+            in the column 'result'
+        """
+        row = {name: _to_builtin(value) for name, value in loop_param_dict.items()}
+        if isinstance(output, dict):
+            row.update({str(name): _to_builtin(value) for name, value in output.items()})
+        else:
+            row['result'] = _to_builtin(output)
+        with open(self.filename, 'a') as file:
+            file.write(json.dumps(row) + '\n')
+            file.flush()
+        self.rows.append(row)
+        self.finished.add(self.key(row))
+
+    def to_dataframe(self, parameter_combinations=None):
+        """
+        :param parameter_combinations (list of dict, optional): if given, the rows are returned in this order
+            and only finished runs of these combinations are returned
+        :return: pandas.DataFrame with one row per finished run
+        """
+        rows = self.rows
+        if parameter_combinations is not None:
+            rows_by_key = {self.key(row): row for row in self.rows}
+            rows = [rows_by_key[self.key(combi)] for combi in parameter_combinations
+                    if self.key(combi) in rows_by_key]
+        return pd.DataFrame(rows)
+
+
 class ParameterSweep:
     def __init__(self, net, sweep_parameters, process_results, process_results_args=None,
                  resultdir=os.path.expanduser('~/brian2_parameter_sweep/'),
@@ -65,6 +140,10 @@ class ParameterSweep:
         """
         This class makes a parameter sweep of a brian2 network using cpp codegen and multiprocessing
 
+        Results are streamed from the workers as they finish and every finished run is checkpointed to a
+        results table on disk (see SweepCheckpoint). If a sweep is run again with the same sweep_name, finished
+        runs are skipped, so an interrupted sweep can be resumed.
+
         :param net: the brian2 net
         :param sweep_parameters: list of SweepParameter
         :param process_results: function that is applied to the net after simulation and returns a result, can also be
@@ -74,6 +153,8 @@ class ParameterSweep:
             sweep_parameters is the list of sweep_parameters that was passed to ParameterSweep
             loop_param_dict is the dict of current parameters that are used for the iteration in which the function is called
             process_results_args are additional arguments that are passed through to the function
+            The result should be json serializable (numbers, strings, lists, arrays or a dict of those), as it is
+            stored in the results table.
         :param resultdir: the directory in which results are stored
         :param param_condition: this is a function that takes the friendly names of the sweep parameters as keyword arguments
             and gives a boolean output that determines if the specific parameter combination should be considered or not.
@@ -91,27 +172,47 @@ class ParameterSweep:
         self.resultdir = resultdir
         self.standalone_dir = None
         self.result = None
+        self.failed = []
+        self.checkpoint = None
+        self._pool = None
+        self._pool_config = None
         if param_condition is None:
             self.param_condition = lambda *args, **kwargs: True  # all conditions True by default
         else:
             self.param_condition = param_condition
 
-    def run(self, standalone_dir, num_workers=cpu_count() - 1, repetitions=1):
+    def run(self, standalone_dir, num_workers=cpu_count() - 1, repetitions=1, sweep_name=None,
+            keep_pool=False, share_binary=None):
+        """
+        runs all parameter combinations that have not finished yet
+
+        :param standalone_dir (str): directory of the compiled standalone network
+        :param num_workers (int): number of worker processes
+        :param repetitions (int): number of repetitions of each parameter combination
+        :param sweep_name (str): name of the sweep, results are stored in resultdir/sweep_name*. If a sweep with this
+            name has been run before, its finished runs are skipped (resume). By default a new name is generated
+            from the current time and the parameter names.
+        :param keep_pool (bool): if True, the worker pool stays alive after the sweep, so that further calls
+            of run or evaluate do not have to start the workers again. Call close() when done.
+        :param share_binary (bool): if True, all workers run the compiled network in standalone_dir and every
+            run writes to its own results directory, instead of copying standalone_dir once per worker.
+            The results directory of a run is removed after process_results returned. By default, this is used if the installed brian2 supports it (brian2 >= 2.6).
+        :return: pandas.DataFrame with the parameters and results of all finished runs
+        """
         starttime = time.time()
-        starttime_pathname = time.strftime("%Y%m%d_%H%M")
 
-        self.sweep_parameters.append(SweepParameter(variables=[],
-                                                    sweep_range=range(repetitions), friendly_name='repetition'))
-        paramranges = {spar.name: spar.range for spar in self.sweep_parameters}
+        sweep_parameters = self.sweep_parameters + [SweepParameter(variables=[], sweep_range=range(repetitions),
+                                                                   friendly_name='repetition')]
+        paramranges = {spar.name: spar.range for spar in sweep_parameters}
         parameter_combinations = itertools.product(*[paramranges[k] for k in paramranges.keys()])
         parameter_combinations = ({k: combi[i] for i, k in enumerate(paramranges.keys())} for combi in
                                   parameter_combinations)
         parameter_combinations = [combi for combi in parameter_combinations if self.param_condition(combi)]
         self.parameter_combinations = parameter_combinations
-        print('this needs', len(parameter_combinations), 'runs')
 
-        result_subdir = os.path.join(self.resultdir, starttime_pathname + '__'.join(
-            [pname for pname in paramranges.keys()]))
+        if sweep_name is None:
+            sweep_name = time.strftime("%Y%m%d_%H%M") + '__'.join([pname for pname in paramranges.keys()])
+        result_subdir = os.path.join(self.resultdir, sweep_name)
         if not os.path.exists(self.resultdir):
             os.makedirs(self.resultdir)
         if not os.path.exists(result_subdir):
@@ -123,36 +224,487 @@ class ParameterSweep:
         with open(os.path.join(self.resultdir, result_subdir + "_loop_parameters.txt"), 'w') as file:
             file.write(json.dumps({key: list(np.asarray(paramranges[key],dtype=float)) for key in paramranges}, indent=3))
 
-        self.standalone_dir = standalone_dir
+        self.checkpoint = SweepCheckpoint(result_subdir + "_results.jsonl", paramranges.keys())
+        todo = [combi for combi in parameter_combinations if combi not in self.checkpoint]
+        print('this needs', len(parameter_combinations), 'runs,', len(parameter_combinations) - len(todo),
+              'of them are already done')
+
+        self.failed = []
+        with self.pool_session(keep_pool):
+            for loop_param_dict, output, error in self.evaluate(todo, standalone_dir, result_subdir,
+                                                                num_workers=num_workers,
+                                                                sweep_parameters=sweep_parameters,
+                                                                share_binary=share_binary):
+                if error is None:
+                    self.checkpoint.add(loop_param_dict, output)
+                else:
+                    self.failed.append(dict(loop_param_dict, error=error))
 
-        pool = Pool(num_workers, initializer=initialize_worker, initargs=(self.standalone_dir, self.net, result_subdir,
-                                                                          self.process_results,
-                                                                          self.sweep_parameters,
-                                                                          self.process_results_args))
-        res = pool.map(run_worker, parameter_combinations)
-        pool.close()
-        pool.join()
-        print(res)
         endtime = time.time()
         print("loop took " + str(endtime - starttime) + " seconds")
         print("= " + str((endtime - starttime) / 60) + " minutes")
         print("= " + str((endtime - starttime) / 60 / 60) + " hours")
+        if self.failed:
+            print(len(self.failed), 'runs failed, they are rerun when the sweep is resumed:')
+            print(pd.DataFrame(self.failed))
 
-        df = pd.DataFrame(parameter_combinations)
-        df_res = pd.DataFrame(res)
-        self.result = pd.concat([df,df_res], axis=1)
-
+        self.result = self.checkpoint.to_dataframe(parameter_combinations)
         return self.result
 
+    def evaluate(self, parameter_combinations, standalone_dir, resultdir, num_workers=cpu_count() - 1,
+                 sweep_parameters=None, share_binary=None):
+        """
+        runs the given parameter combinations on the worker pool and yields the results in the order in which
+        they finish. The pool is started if necessary and kept alive (see close).
+
+        :param parameter_combinations (list of dict): parameters of the runs
+        :param standalone_dir (str): directory of the compiled standalone network
+        :param resultdir (str): directory that is passed to process_results
+        :param num_workers (int): number of worker processes
+        :param sweep_parameters (list of SweepParameter): defaults to the sweep parameters of this sweep
+        :param share_binary (bool): see run
+        :return: generator of (loop_param_dict, output, error) tuples, error is None for successful runs
+        """
+        if sweep_parameters is None:
+            sweep_parameters = self.sweep_parameters
+        if share_binary is None:
+            share_binary = supports_results_directory()
+        self.standalone_dir = standalone_dir
+        pool = self._get_pool(standalone_dir, num_workers, sweep_parameters, share_binary)
+
+        num_runs = len(parameter_combinations)
+        starttime = time.time()
+        tasks = [(loop_param_dict, resultdir) for loop_param_dict in parameter_combinations]
+        for num_done, res in enumerate(pool.imap_unordered(run_task, tasks), 1):
+            elapsed = time.time() - starttime
+            if elapsed > 0:
+                runs_per_minute = num_done / elapsed * 60
+                print('done {} / {} runs ({:.2f} runs/min, about {:.1f} min left)'.format(
+                    num_done, num_runs, runs_per_minute, (num_runs - num_done) / runs_per_minute))
+            else:
+                print('done {} / {} runs'.format(num_done, num_runs))
+            yield res
+
+    def close(self):
+        """
+        stops the worker pool
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pool_config = None
+
+    def terminate(self):
+        """
+        stops the worker pool without waiting for the runs that are still queued
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._pool_config = None
+
+    @contextmanager
+    def pool_session(self, keep_pool=False):
+        """
+        context in which the worker pool is used. If it is left normally, the pool is closed (unless keep_pool is
+        True). If it is left by an exception, e.g. a KeyboardInterrupt, the pool is terminated, as closing it would
+        wait for all queued runs, whose results are not stored anymore.
+
+        :param keep_pool (bool): if True, the pool stays alive when the context is left normally
+        """
+        try:
+            yield
+        except BaseException:
+            self.terminate()
+            raise
+        if not keep_pool:
+            self.close()
+
+    def _get_pool(self, standalone_dir, num_workers, sweep_parameters, share_binary):
+        config = (standalone_dir, num_workers, tuple(spar.name for spar in sweep_parameters), share_binary)
+        if self._pool is not None and self._pool_config != config:
+            self.close()
+        if self._pool is None:
+            self._pool = Pool(num_workers, initializer=initialize_worker,
+                              initargs=(standalone_dir, self.net, self.resultdir,
+                                        self.process_results,
+                                        sweep_parameters,
+                                        self.process_results_args,
+                                        False, share_binary))
+            self._pool_config = config
+        return self._pool
+
+
+class ParameterSearch:
+    """
+    base class of search strategies that evaluate chosen points of the parameter space instead of the full grid of
+    a ParameterSweep. The points are run on the worker pool of the sweep (ParameterSweep.evaluate) and the search
+    is driven by the scalar that process_results returns (or by one entry of the dict it returns, see objective).
+
+    The sweep parameters span the search space, each one between the minimum and maximum of its range.
+    Every evaluated point is checkpointed like in ParameterSweep.run, so a search that is run again with the same
+    search_name and seed replays the finished runs from disk instead of running them again.
+    """
+
+    def __init__(self, sweep, objective=None, minimize=True, seed=None, search_name=None):
+        """
+        :param sweep (ParameterSweep): the sweep that provides the network, the sweep parameters and process_results
+        :param objective (str): key of the value to optimize if process_results returns a dict
+        :param minimize (bool): if True, the objective is minimized, otherwise it is maximized
+        :param seed (int): seed of the random sampling
+        :param search_name (str): name of the search, results are stored in sweep.resultdir/search_name*
+        """
+        self.sweep = sweep
+        self.objective = objective
+        self.minimize = minimize
+        self.seed = seed
+        self.rng = np.random.RandomState(seed)
+        if search_name is None:
+            search_name = time.strftime("%Y%m%d_%H%M") + type(self).__name__ + '__'.join(self.parameter_names)
+        self.search_name = search_name
+        self.result_subdir = os.path.join(sweep.resultdir, search_name)
+        self.checkpoint = None
+        self.history = []
+
+    @property
+    def parameter_names(self):
+        return [spar.name for spar in self.sweep.sweep_parameters]
+
+    @property
+    def bounds(self):
+        """
+        :return: (#parameters, 2) array of the lower and upper bound of each sweep parameter
+        """
+        return np.array([[np.min(spar.range), np.max(spar.range)] for spar in self.sweep.sweep_parameters],
+                        dtype=float)
+
+    @property
+    def result(self):
+        """
+        :return: pandas.DataFrame of all evaluated points in the order of evaluation
+        """
+        return pd.DataFrame(self.history)
+
+    @property
+    def best(self):
+        """
+        :return: dict of the evaluated point with the best objective
+        """
+        losses = [self._loss(row) for row in self.history]
+        return self.history[int(np.argmin(losses))]
+
+    def sample(self, num_points, method='lhs'):
+        """
+        samples points of the search space
+
+        :param num_points (int): number of points
+        :param method (str): 'random' for uniform sampling or 'lhs' for latin hypercube sampling
+        :return: list of dicts of parameter values
+        """
+        if method == 'random':
+            unit_points = self.rng.uniform(size=(num_points, len(self.parameter_names)))
+        elif method == 'lhs':
+            unit_points = latin_hypercube(num_points, len(self.parameter_names), rng=self.rng)
+        else:
+            raise ValueError("method needs to be 'random' or 'lhs', not {}".format(method))
+        return [self._to_params(point) for point in unit_points]
+
+    def close(self):
+        """
+        stops the worker pool of the sweep
+        """
+        self.sweep.close()
+
+    def _to_params(self, unit_point):
+        lower, upper = self.bounds.T
+        return {name: float(value) for name, value in zip(self.parameter_names,
+                                                           lower + unit_point * (upper - lower))}
+
+    def _to_unit(self, params):
+        lower, upper = self.bounds.T
+        span = np.where(upper > lower, upper - lower, 1)
+        return (np.array([params[name] for name in self.parameter_names]) - lower) / span
+
+    def _loss(self, row):
+        """
+        objective of an evaluated point as loss (smaller is better), failed runs have an infinite loss
+        """
+        if row.get('error') is not None:
+            return np.inf
+        value = row[self.objective if self.objective is not None else 'result']
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("process_results needs to return a scalar (or a dict with the key objective) "
+                             "to be used in a ParameterSearch, got {}".format(value))
+        if np.isnan(value):
+            return np.inf
+        return value if self.minimize else -value
+
+    def _evaluate(self, parameter_combinations, standalone_dir, num_workers, share_binary=None):
+        """
+        evaluates points on the worker pool of the sweep, points that are already in the checkpoint are not run
+
+        :return: list of losses in the order of parameter_combinations
+        """
+        if self.checkpoint is None:
+            if not os.path.exists(self.result_subdir):
+                os.makedirs(self.result_subdir)
+            self.checkpoint = SweepCheckpoint(self.result_subdir + "_results.jsonl",
+                                              self._key_names(parameter_combinations[0]))
+        rows = {}
+        for row in self.checkpoint.rows:
+            rows[self.checkpoint.key(row)] = row
+        todo = [combi for combi in parameter_combinations if self.checkpoint.key(combi) not in rows]
+        if todo:
+            for loop_param_dict, output, error in self.sweep.evaluate(todo, standalone_dir, self.result_subdir,
+                                                                      num_workers=num_workers,
+                                                                      share_binary=share_binary):
+                if error is None:
+                    self.checkpoint.add(loop_param_dict, output)
+                    rows[self.checkpoint.key(loop_param_dict)] = self.checkpoint.rows[-1]
+                else:
+                    rows[self.checkpoint.key(loop_param_dict)] = dict(loop_param_dict, error=error)
+        evaluated = [rows[self.checkpoint.key(combi)] for combi in parameter_combinations]
+        self.history.extend(evaluated)
+        return [self._loss(row) for row in evaluated]
+
+    def _key_names(self, loop_param_dict):
+        return self.parameter_names + sorted(set(loop_param_dict) - set(self.parameter_names))
+
+
+class RandomSearch(ParameterSearch):
+    """
+    evaluates random or latin hypercube samples of the search space
+    """
+
+    def run(self, standalone_dir, num_points, method='lhs', num_workers=cpu_count() - 1, share_binary=None):
+        """
+        :param standalone_dir (str): directory of the compiled standalone network
+        :param num_points (int): number of points that are evaluated
+        :param method (str): 'random' or 'lhs' (latin hypercube sampling, default)
+        :param num_workers (int): number of worker processes
+        :param share_binary (bool): see ParameterSweep.run
+        :return: dict of the best point
+        """
+        with self.sweep.pool_session():
+            self._evaluate(self.sample(num_points, method), standalone_dir, num_workers, share_binary)
+        return self.best
+
+
+class SuccessiveHalving(ParameterSearch):
+    """
+    evaluates many points with a short simulation duration and only continues the best 1/eta of them with an
+    eta times longer duration, until max_duration is reached.
+    The duration is passed to the network as the standalone parameter 'duration' (in seconds), so process_results
+    should return an objective that does not scale with the duration (e.g. a rate instead of a spike count).
+    """
+
+    def run(self, standalone_dir, num_points, min_duration, max_duration, eta=3, method='lhs',
+            num_workers=cpu_count() - 1, share_binary=None):
+        """
+        :param standalone_dir (str): directory of the compiled standalone network
+        :param num_points (int): number of points in the first round
+        :param min_duration (brian2.units.Quantity): simulation duration of the first round
+        :param max_duration (brian2.units.Quantity): simulation duration of the last round
+        :param eta (int): factor by which the number of points is reduced and the duration is increased per round
+        :param method (str): 'random' or 'lhs' sampling of the initial points
+        :param num_workers (int): number of worker processes
+        :param share_binary (bool): see ParameterSweep.run
+        :return: dict of the best point of the last round
+        """
+        if eta < 2:
+            raise ValueError('eta needs to be at least 2')
+        num_rounds = int(np.floor(np.log(float(max_duration / min_duration)) / np.log(eta) + 1e-9)) + 1
+        durations = [float(np.asarray(max_duration)) / eta ** (num_rounds - 1 - k) for k in range(num_rounds)]
+        points = self.sample(num_points, method)
+        with self.sweep.pool_session():
+            for num_round, duration in enumerate(durations):
+                combinations = [dict(point, duration=duration) for point in points]
+                losses = self._evaluate(combinations, standalone_dir, num_workers, share_binary)
+                print('round {} with duration {} s: best loss {}'.format(num_round, duration, np.min(losses)))
+                if num_round < num_rounds - 1:
+                    num_keep = max(1, int(np.ceil(len(points) / eta)))
+                    points = [points[i] for i in np.argsort(losses, kind='stable')[:num_keep]]
+        last_round = self.history[-len(points):]
+        return last_round[int(np.argmin([self._loss(row) for row in last_round]))]
+
+
+class BayesianSearch(ParameterSearch):
+    """
+    gaussian process optimization: after some initial samples, the next points are the ones with the highest
+    expected improvement under a gaussian process model of the objective (squared exponential kernel, fitted by
+    maximizing the marginal likelihood over a small set of length scales).
+    A batch of points is proposed per iteration (one per worker), using the current best loss as a placeholder
+    for pending points (constant liar).
+    """
+
+    def run(self, standalone_dir, num_initial=10, num_iterations=10, batch_size=None, num_candidates=2000,
+            num_workers=cpu_count() - 1, share_binary=None):
+        """
+        :param standalone_dir (str): directory of the compiled standalone network
+        :param num_initial (int): number of initial latin hypercube samples
+        :param num_iterations (int): number of batches proposed by the model
+        :param batch_size (int): number of points per batch, defaults to num_workers
+        :param num_candidates (int): number of random candidates on which the expected improvement is evaluated
+        :param num_workers (int): number of worker processes
+        :param share_binary (bool): see ParameterSweep.run
+        :return: dict of the best point
+        """
+        if batch_size is None:
+            batch_size = max(1, num_workers)
+        with self.sweep.pool_session():
+            self._evaluate(self.sample(num_initial, 'lhs'), standalone_dir, num_workers, share_binary)
+            for iteration in range(num_iterations):
+                batch = self.propose(batch_size, num_candidates)
+                losses = self._evaluate(batch, standalone_dir, num_workers, share_binary)
+                print('iteration {}: best loss of batch {}, best loss so far {}'.format(
+                    iteration, np.min(losses), self._loss(self.best)))
+        return self.best
+
+    def propose(self, batch_size, num_candidates=2000):
+        """
+        proposes the next points based on all evaluated points
+
+        :param batch_size (int): number of points
+        :param num_candidates (int): number of random candidates on which the expected improvement is evaluated
+        :return: list of dicts of parameter values
+        """
+        x = np.array([self._to_unit(row) for row in self.history])
+        y = np.array([self._loss(row) for row in self.history])
+        if np.all(np.isinf(y)):
+            return self.sample(batch_size, 'random')
+        # failed runs get the worst observed loss
+        y[np.isinf(y)] = np.max(y[np.isfinite(y)])
+        candidates = self.rng.uniform(size=(num_candidates, x.shape[1]))
+        batch = []
+        for _ in range(batch_size):
+            gp = GaussianProcess().fit(x, y)
+            mean, std = gp.predict(candidates)
+            best_candidate = np.argmax(expected_improvement(mean, std, np.min(y)))
+            batch.append(candidates[best_candidate])
+            x = np.vstack([x, candidates[best_candidate]])
+            y = np.append(y, np.min(y))
+            candidates = np.delete(candidates, best_candidate, axis=0)
+        return [self._to_params(point) for point in batch]
+
+
+class GaussianProcess:
+    """
+    minimal gaussian process regression with a squared exponential kernel on inputs scaled to the unit cube
+    """
+
+    def __init__(self, length_scales=(0.05, 0.1, 0.2, 0.4, 0.8), noise=1e-6):
+        """
+        :param length_scales: length scales among which the one with the highest marginal likelihood is used
+        :param noise: noise variance relative to the variance of the (standardized) targets
+        """
+        self.length_scales = length_scales
+        self.noise = noise
+        self.length_scale = None
+
+    def _kernel(self, a, b, length_scale):
+        sq_dist = np.sum((a[:, None, :] - b[None, :, :]) ** 2, axis=-1)
+        return np.exp(-0.5 * sq_dist / length_scale ** 2)
+
+    def fit(self, x, y):
+        """
+        :param x: (#points, #dims) inputs
+        :param y: (#points) targets
+        :return: self
+        """
+        self.x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y_mean = np.mean(y)
+        self.y_std = np.std(y) if np.std(y) > 0 else 1.
+        y = (y - self.y_mean) / self.y_std
+        best_likelihood = -np.inf
+        for length_scale in self.length_scales:
+            K = self._kernel(self.x, self.x, length_scale) + (self.noise + 1e-8) * np.eye(len(self.x))
+            try:
+                L = np.linalg.cholesky(K)
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+            likelihood = -0.5 * y.dot(alpha) - np.sum(np.log(np.diag(L)))
+            if likelihood > best_likelihood:
+                best_likelihood = likelihood
+                self.length_scale, self._L, self._alpha = length_scale, L, alpha
+        if self.length_scale is None:
+            raise np.linalg.LinAlgError('could not fit the gaussian process')
+        return self
+
+    def predict(self, x):
+        """
+        :param x: (#points, #dims) inputs
+        :return: mean and standard deviation of the prediction
+        """
+        k = self._kernel(np.asarray(x, dtype=float), self.x, self.length_scale)
+        mean = k.dot(self._alpha)
+        v = np.linalg.solve(self._L, k.T)
+        var = np.clip(1 - np.sum(v ** 2, axis=0), 1e-12, None)
+        return mean * self.y_std + self.y_mean, np.sqrt(var) * self.y_std
+
+
+def expected_improvement(mean, std, best):
+    """
+    expected improvement (for minimization) of points with a gaussian predictive distribution over best
+    """
+    z = (best - mean) / std
+    return (best - mean) * norm.cdf(z) + std * norm.pdf(z)
+
+
+def latin_hypercube(num_points, num_dims, rng=np.random):
+    """
+    latin hypercube samples in the unit cube: every dimension is split into num_points intervals and every
+    interval contains exactly one sample
+
+    :param num_points (int): number of samples
+    :param num_dims (int): number of dimensions
+    :param rng: numpy random state
+    :return: (num_points, num_dims) array
+    """
+    samples = np.empty((num_points, num_dims))
+    for dim in range(num_dims):
+        samples[:, dim] = (rng.permutation(num_points) + rng.uniform(size=num_points)) / num_points
+    return samples
+
+
+def _to_builtin(value):
+    """
+    converts numpy types to python types, so they can be written to json
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    return value
+
+
+def supports_results_directory():
+    '''
+    checks if the installed brian2 can write the results of a standalone run to a separate directory
+    (brian2 >= 2.6), which is needed to run one compiled network in several processes at once
+    '''
+    return 'results_directory' in inspect.signature(get_device().run).parameters
+
 
 def cleanup_standalone():
     global glob_standalone_dir
+    if glob_standalone_dir is None:  # the shared standalone_dir is not removed
+        return
     print('cleaning up ' + glob_standalone_dir)
     shutil.rmtree(glob_standalone_dir)
 
 
 def initialize_worker(standalone_dir, net, resultdir, process_results, sweep_parameters,
-                      process_results_args, verbose = False):
+                      process_results_args, verbose = False, share_binary = False):
     '''
     this function initializes a worker (only runs once (at the beginning) per worker)
     it compiles a cpp_standalone in its own directory and stores global variables
@@ -160,16 +712,25 @@ def initialize_worker(standalone_dir, net, resultdir, process_results, sweep_par
     global means local to one worker here!
     there seems to be no other easy way to get variables from the initializer
     to the worker functions
+    if share_binary is True, the worker runs the network compiled in standalone_dir (no copy) and
+    every run writes its results to its own directory (see run_task)
     '''
     global init_failed
     init_failed = None
 
     try:
         global glob_standalone_dir
-        glob_standalone_dir = standalone_dir + '_' + str(os.getpid())
+        global glob_share_binary
+        glob_share_binary = share_binary
+        if share_binary:
+            glob_standalone_dir = None
+            get_device().build_options['directory'] = os.path.abspath(standalone_dir)
+            get_device().project_dir = os.path.abspath(standalone_dir)
+        else:
+            glob_standalone_dir = standalone_dir + '_' + str(os.getpid())
 
-        get_device().build_options['directory'] = os.path.abspath(glob_standalone_dir)
-        get_device().project_dir = os.path.abspath(glob_standalone_dir)
+            get_device().build_options['directory'] = os.path.abspath(glob_standalone_dir)
+            get_device().project_dir = os.path.abspath(glob_standalone_dir)
 
         # define globals that can be used by the worker, there seems to be no better way to pass variables to the worker
         global glob_net
@@ -188,8 +749,9 @@ def initialize_worker(standalone_dir, net, resultdir, process_results, sweep_par
         glob_sweep_param_dict = {sp.name: sp for sp in sweep_parameters}
         glob_verbose = verbose
 
-        # compile once and just copy the folder to different locations in order to avoid mixing up result files
-        shutil.copytree(standalone_dir, os.path.abspath(glob_standalone_dir))
+        if not share_binary:
+            # compile once and just copy the folder to different locations in order to avoid mixing up result files
+            shutil.copytree(standalone_dir, os.path.abspath(glob_standalone_dir))
 
         # this should avoid that they all start compiling at the same time,
         # which uses too much memory and cpu
@@ -214,11 +776,26 @@ def run_worker(loop_param_dict):
     '''
     runs the compiled standalone with the tuple given as loop params
     the names of the parameters have to be given in the initialization of the worker
+    returns the output of process_results or the error message if the run failed
+    '''
+    _, output, error = run_task((loop_param_dict, None))
+    if error is not None:
+        return error
+    return output
+
+
+def run_task(task):
+    '''
+    runs the compiled standalone for one task of ParameterSweep.evaluate
+
+    :param task: tuple (loop_param_dict, resultdir), if resultdir is None, the resultdir of the initialization is used
+    :return: tuple (loop_param_dict, output, error), error is None or the error message of a failed run
     '''
     global init_failed
     if init_failed is not None:
         raise RuntimeError(init_failed) from init_failed
 
+    loop_param_dict, resultdir = task
     try:
         global glob_net
         global glob_resultdir
@@ -226,30 +803,45 @@ def run_worker(loop_param_dict):
         global glob_process_results_args
         global glob_num_done
 
+        if resultdir is None:
+            resultdir = glob_resultdir
+
         if glob_verbose:
             print('parameters for this run:')
             for par in loop_param_dict.keys():
                 print(str(par), ' = ', loop_param_dict[par])
 
         for par in loop_param_dict:
-            for full_par_name in glob_sweep_param_dict[par].full_names:
-                glob_net.standalone_params[full_par_name] = loop_param_dict[par]
-
-        glob_net.run(verbose = False)
-        output = glob_process_results(glob_net, glob_resultdir, glob_sweep_param_dict, loop_param_dict, glob_process_results_args)
+            if par in glob_sweep_param_dict:
+                for full_par_name in glob_sweep_param_dict[par].full_names:
+                    glob_net.standalone_params[full_par_name] = loop_param_dict[par]
+            elif par in glob_net.standalone_params:
+                # e.g. the duration of the run, which is set by SuccessiveHalving
+                glob_net.standalone_params[par] = loop_param_dict[par]
+
+        if glob_share_binary:
+            # every run gets its own results directory, so the workers can share the compiled network
+            results_directory = os.path.join('results', 'run_{}_{}'.format(os.getpid(), glob_num_done))
+            try:
+                glob_net.run(verbose = False, results_directory = results_directory)
+                output = glob_process_results(glob_net, resultdir, glob_sweep_param_dict, loop_param_dict,
+                                              glob_process_results_args)
+            finally:
+                shutil.rmtree(os.path.join(get_device().project_dir, results_directory), ignore_errors=True)
+        else:
+            glob_net.run(verbose = False)
+            output = glob_process_results(glob_net, resultdir, glob_sweep_param_dict, loop_param_dict,
+                                          glob_process_results_args)
 
         glob_num_done += 1
-        #print(' ')
-        #print('####################################')
-        print(multiprocessing.current_process().name, ': ')
-        print('done ', glob_num_done)
-        #print('####################################')
-        #print(' ')
-        return output
+        if glob_verbose:
+            print(multiprocessing.current_process().name, ': ')
+            print('done ', glob_num_done)
+        return loop_param_dict, output, None
 
     except KeyboardInterrupt as ki:
         raise ki
     except Exception as e:
         print(str(e))
         traceback.print_tb(e.__traceback__)
-        return str(e)
+        return loop_param_dict, None, str(e)
@@ -17,7 +17,7 @@ Attributes:
 import csv
 import os
 import sys
-from brian2 import ms, Hz, defaultclock, second
+from brian2 import us, ms, Hz, defaultclock, second
 import numpy as np
 import shutil
 # import matplotlib.animation as animation
@@ -34,6 +34,8 @@ import subprocess
 # pg.setConfigOption('background', 'w') # makes  background white
 from pyqtgraph.colormap import ColorMap
 
+from teili.tools.event_container import EventContainer, is_event_container_path
+
 CM_JET = ColorMap([0.0, 0.33, 0.66, 1.0],
                   [(0, 0, 255, 255), (0, 255, 255, 255),
                    (255, 255, 0, 255), (255, 10, 10, 255)], mode=2)
@@ -608,6 +610,7 @@ class Plotter2d(object):
         """
         loads a dvs numpy (events file) from aedat2numpy and returns a
         SpikeMonitor2d object, you can also directly pass an events array
+        or an EventContainer (or the path of a stored one)
 
         usage:
             spikemonObject = SpikeMonitor2d.loadz(myfilename)
@@ -618,10 +621,16 @@ class Plotter2d(object):
             eventsfile (str):   filename from where to load the data of the plotter object
         """
         if type(eventsfile) == str:
-            events = np.load(eventsfile)
+            if is_event_container_path(eventsfile):
+                events = EventContainer.load(eventsfile)
+            else:
+                events = np.load(eventsfile)
         else:
             events = eventsfile
-        mon = DVSmonitor(*list(events))
+        if isinstance(events, EventContainer):
+            mon = DVSmonitor(events.x, events.y, events.ts, events.pol, unit=us)
+        else:
+            mon = DVSmonitor(*list(events))
         if dims is None:
             dims = (int(1 + np.max(mon.xi)), int(np.max(1 + mon.yi)))
         return cls(mon, dims)
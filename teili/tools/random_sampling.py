@@ -4,9 +4,9 @@
 
 All functions in here should be callable in a similar way as rand() or randn() that are part of brian2
 
-Please note: brian2 uses a specific random generator in the 'randomkit', so any seed you set in brian2 will not necessarily
-apply here, depending on which rng is used. (The truncated randn uses brian2's rand, so it's fine, gamma however uses another one)
-If you need a seed, it may be easy to implement though. (TODO!)
+Please note: the C++ implementations only draw from brian2's rand() and randn(), and the numpy implementations
+from numpy's global random state, so the samples depend on brian2's seed() in both cases. In C++ standalone mode with
+OpenMP, brian2 uses one generator per thread, so the functions are thread safe.
 
 Please also note that, currently, there is a bug in brian2 (issue #988) that does not allow you to use the several functions
 with the same dependencies for the same variable (but this probably happens only rarely).
@@ -17,7 +17,8 @@ I used brian2/input/binomial.py as a template
 
 import numpy as np
 import os
-from scipy.stats import truncnorm
+import zlib
+from scipy.special import ndtr, ndtri
 from brian2 import DEFAULT_FUNCTIONS
 
 from brian2 import check_units
@@ -29,19 +30,126 @@ from brian2 import Nameable, Function
 from brian2.utils.stringtools import replace
 
 
+def _truncnorm_cdf_bounds(lower, upper):
+    """Returns the standard normal CDF at the bounds of a truncated normal distribution.
+
+    The inverse CDF is most accurate in the lower tail, so intervals that lie mostly
+    above zero are mirrored (samples of [-upper, -lower] are negated).
+
+    Returns:
+        tuple: CDF at the lower and upper bound and whether the interval was mirrored.
+    """
+    if not lower < upper:
+        raise ValueError("lower ({}) needs to be smaller than upper ({})".format(lower, upper))
+    flip = bool(lower + upper > 0)
+    if flip:
+        lower, upper = -upper, -lower
+    return float(ndtr(lower)), float(ndtr(upper)), flip
+
+
+def sample_randn_trunc(lower, upper, size, random_state=None):
+    """Samples from a standard normal distribution truncated to [lower, upper] with the
+    inverse CDF, so every sample costs the same, no matter how narrow or far from
+    zero the interval is.
+
+    Args:
+        lower (float): Lower bound, can be -inf.
+        upper (float): Upper bound, can be inf.
+        size (int or tuple): Number or shape of samples.
+        random_state (numpy.random.RandomState, optional): Source of the uniform
+            samples, numpy's global random state (set by brian2's seed()) by default.
+
+    Returns:
+        numpy.ndarray: Samples.
+    """
+    cdf_lower, cdf_upper, flip = _truncnorm_cdf_bounds(lower, upper)
+    if random_state is None:
+        random_state = np.random
+    p = cdf_lower + random_state.uniform(size=size) * (cdf_upper - cdf_lower)
+    samples = np.clip(ndtri(np.maximum(p, np.finfo(float).tiny)), -upper if flip else lower,
+                      -lower if flip else upper)
+    return -samples if flip else samples
+
+
+def named_random_state(seed, name):
+    """Returns a random state for one of several independent streams of the same seed.
+
+    The stream only depends on seed and name, e.g. the mismatch of one parameter stays
+    the same if mismatch is added to further parameters. Element i of a sample is always
+    the i-th draw of the stream, so it does not depend on the number of elements either.
+
+    Args:
+        seed (int): Seed value, between 0 and 2**32 - 1.
+        name (str): Name of the stream, e.g. a parameter name.
+
+    Returns:
+        numpy.random.RandomState: Random state of the stream.
+    """
+    return np.random.RandomState(named_seed(seed, name))
+
+
+def named_seed(seed, name):
+    """Returns the seed of the stream of named_random_state.
+
+    Args:
+        seed (int): Seed value, between 0 and 2**32 - 1, or None.
+        name (str): Name of the stream.
+
+    Returns:
+        tuple: Seed of numpy.random.RandomState, None if seed is None.
+    """
+    if seed is None:
+        return None
+    return (seed, zlib.crc32(name.encode()))
+
+
 def _randn_trunc_generate_cpp_code(lower, upper, name):
     # C++ implementation
+    # Inverse CDF of one draw of brian2's rand(), the CDF at the bounds is computed here.
+    # The inverse normal CDF is Acklam's rational approximation with one Halley step,
+    # which is accurate to about machine precision.
+    cdf_lower, cdf_upper, flip = _truncnorm_cdf_bounds(lower, upper)
     cpp_code = '''
-    float %NAME%(const int _vectorisation_idx) {
-        float retVal = 0; 
-        do {retVal = _randn(_vectorisation_idx);
-        } while ((retVal > %UPPER%) || (retVal < %LOWER%));
-        return retVal;
+    double %NAME%(const int _vectorisation_idx) {
+        double p = %CDF_LOWER% + _rand(_vectorisation_idx) * (%CDF_UPPER% - %CDF_LOWER%);
+        if (p < 1e-300)
+            p = 1e-300;
+        double x, q, r;
+        if (p < 0.02425) {
+            q = sqrt(-2 * log(p));
+            x = (((((-7.784894002430293e-03 * q - 3.223964580411365e-01) * q - 2.400758277161838e+00) * q
+                   - 2.549732539343734e+00) * q + 4.374664141464968e+00) * q + 2.938163982698783e+00) /
+                ((((7.784695709041462e-03 * q + 3.224671290700398e-01) * q + 2.445134137142996e+00) * q
+                  + 3.754408661907416e+00) * q + 1);
+        } else if (p > 1 - 0.02425) {
+            q = sqrt(-2 * log(1 - p));
+            x = -(((((-7.784894002430293e-03 * q - 3.223964580411365e-01) * q - 2.400758277161838e+00) * q
+                    - 2.549732539343734e+00) * q + 4.374664141464968e+00) * q + 2.938163982698783e+00) /
+                ((((7.784695709041462e-03 * q + 3.224671290700398e-01) * q + 2.445134137142996e+00) * q
+                  + 3.754408661907416e+00) * q + 1);
+        } else {
+            q = p - 0.5;
+            r = q * q;
+            x = (((((-3.969683028665376e+01 * r + 2.209460984245205e+02) * r - 2.759285104469687e+02) * r
+                   + 1.383577518672690e+02) * r - 3.066479806614716e+01) * r + 2.506628277459239e+00) * q /
+                (((((-5.447609879822406e+01 * r + 1.615858368580409e+02) * r - 1.556989798598866e+02) * r
+                   + 6.680131188771972e+01) * r - 1.328068155288572e+01) * r + 1);
+        }
+        // Halley step
+        double e = 0.5 * erfc(-x / sqrt(2.0)) - p;
+        double u = e * sqrt(2 * M_PI) * exp(x * x / 2);
+        x = x - u / (1 + x * u / 2);
+        x = x < %LOWER% ? %LOWER% : (x > %UPPER% ? %UPPER% : x);
+        return %SIGN%x;
     }
     '''
-    cpp_code = replace(cpp_code, {'%NAME%': name, '%UPPER%': str(upper), '%LOWER%': str(lower)})
-    cpp_code = cpp_code.replace('inf','std::numeric_limits<float>::max()')
-    dependencies = {'_randn': DEFAULT_FUNCTIONS['randn']}
+    bound_lower, bound_upper = (-upper, -lower) if flip else (lower, upper)
+    cpp_code = replace(cpp_code, {'%NAME%': name,
+                                  '%CDF_LOWER%': repr(cdf_lower), '%CDF_UPPER%': repr(cdf_upper),
+                                  '%LOWER%': repr(float(bound_lower)), '%UPPER%': repr(float(bound_upper)),
+                                  '%SIGN%': '-' if flip else ''})
+    cpp_code = cpp_code.replace('inf', 'std::numeric_limits<double>::infinity()')
+    dependencies = {'_rand': DEFAULT_FUNCTIONS['rand']}
     return {'support_code': cpp_code}, dependencies
 
 
@@ -49,7 +157,8 @@ class Randn_trunc(Function, Nameable):
     """
     Sample from a truncated Gaussian
     We are using this in core/groups to add mismatch.
-    In python it wraps truncnorm.rvs(lower, upper, size=N)
+    In python it draws all N samples at once with sample_randn_trunc(lower, upper, size=N).
+    Both implementations use the inverse CDF, so the cost per sample does not depend on the bounds.
 
     refer to the example below
     """
@@ -58,15 +167,17 @@ class Randn_trunc(Function, Nameable):
     }
 
     @check_units(lower=1, upper=1)
-    def __init__(self, lower, upper, name='_randn_trunc*'):
+    def __init__(self, lower, upper, name='randn_trunc*'):
         Nameable.__init__(self, name)
+        # raises a ValueError for invalid bounds already here
+        _truncnorm_cdf_bounds(lower, upper)
 
         def sample_function(vectorisation_idx):
             try:
                 N = len(vectorisation_idx)
             except TypeError:
                 N = int(vectorisation_idx)
-            return truncnorm.rvs(lower, upper, size=N)
+            return sample_randn_trunc(lower, upper, size=N)
 
         try:
             Function.__init__(self, pyfunc=lambda: sample_function(1),
@@ -88,30 +199,62 @@ class Randn_trunc(Function, Nameable):
                                                     name=self.name)
 
 
+# Marsaglia and Tsang's method (ACM TOMS 26(3), 2000) to sample gamma(alpha, 1), for alpha < 1
+# a sample of gamma(alpha + 1) is scaled by U^(1/alpha).
+# It only draws from brian2's rand and randn, which keep one generator per thread and are
+# seeded by brian2's seed(), so samples are reproducible and the function can be used in
+# multi-threaded (OpenMP) code. The guard allows several functions to include it in the same
+# code object. Needs _rand and _randn as dependencies.
+RAND_GAMMA_CPP_CODE = '''
+#ifndef _TEILI_RAND_GAMMA
+#define _TEILI_RAND_GAMMA
+double _teili_rand_gamma(const double alpha, const int _vectorisation_idx) {
+    const double d = (alpha < 1 ? alpha + 1 : alpha) - 1.0 / 3.0;
+    const double c = 1.0 / sqrt(9.0 * d);
+    double x, v, u;
+    while (true) {
+        do {
+            x = _randn(_vectorisation_idx);
+            v = 1.0 + c * x;
+        } while (v <= 0);
+        v = v * v * v;
+        u = _rand(_vectorisation_idx);
+        if (u < 1.0 - 0.0331 * x * x * x * x)
+            break;
+        if (log(u) < 0.5 * x * x + d * (1.0 - v + log(v)))
+            break;
+    }
+    double retVal = d * v;
+    if (alpha < 1)
+        retVal *= pow(_rand(_vectorisation_idx), 1.0 / alpha);
+    return retVal;
+}
+#endif
+'''
+
+
 def _rand_gamma_generate_cpp_code(alpha, beta, name):
     # C++ implementation
-    cpp_code = '''
-    std::mt19937 rng(std::random_device{}());
-    // Not ideal, but probably good enough for us:
-    // https://codereview.stackexchange.com/questions/109260/seed-stdmt19937-from-stdrandom-device  
-    // Would be good to seed the rng with a random number from brian2, so the brian2 seed affects the rng here.
-    float %NAME%(const int _vectorisation_idx) {
-        std::gamma_distribution<double> distribution(%ALPHA%,1/%BETA%);
-        float retVal = distribution(rng);
-    	return retVal;
+    cpp_code = RAND_GAMMA_CPP_CODE + '''
+    double %NAME%(const int _vectorisation_idx) {
+        // negative beta gives negative samples, like the numpy implementation
+        return _teili_rand_gamma(%ALPHA%, _vectorisation_idx) / %BETA%;
     }
     '''
-    cpp_code = replace(cpp_code, {'%NAME%': name, '%BETA%': str(beta), '%ALPHA%': str(alpha)})
-    dependencies = {}
+    cpp_code = replace(cpp_code, {'%NAME%': name, '%BETA%': repr(float(beta)), '%ALPHA%': repr(float(alpha))})
+    dependencies = {'_rand': DEFAULT_FUNCTIONS['rand'],
+                    '_randn': DEFAULT_FUNCTIONS['randn']}
     return {'support_code': cpp_code}, dependencies
 
 
 class Rand_gamma(Function, Nameable):
     """
     Sample from a gamma distribution.
+    In python it wraps numpy.random.gamma (all N samples in one call), in C++ it uses brian2's
+    rand and randn, so in both cases the samples depend on brian2's seed().
+    A negative beta gives negative samples.
     Refer to the example below.
     """
-    prefs.codegen.cpp.headers += ['<random>']
 
     implementations = {
         'cpp': _rand_gamma_generate_cpp_code,
@@ -202,7 +345,7 @@ if __name__ == '__main__':
     # %% It also works in standalone mode:
     standaloneDir = os.path.expanduser('~/gamma_standalone')
     set_device('cpp_standalone', directory=standaloneDir, build_on_run=True)
-    seed(42)  # does not affect sampling from gamma distribution!
+    seed(42)  # also affects the sampling from the gamma distribution
 
 
     ng = NeuronGroup(n_samples, '''
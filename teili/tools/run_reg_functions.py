@@ -2,6 +2,17 @@
 """ A collection of run_regular functions including weight_initialization,
 weight_normalization, adaptive thresholds etc.
 
+Apart from weight_normalization, all functions also have a C++
+implementation, so they can be used in cpp_standalone mode. C++ functions
+are evaluated for one element at a time, so functions which need more than
+the current element, e.g. a row of a buffer or the mean of a variable, are
+called through a macro which passes pointers to the group's arrays. Such
+array arguments therefore have to be passed as the plain name of a
+variable of the group which runs the function (as add_run_reg does).
+Reductions over all elements are computed once per call of the
+run_regularly, i.e. by the first element evaluated at a new time t, and
+cached. Such functions therefore also take t as an argument.
+
 For more details see below.
 """
 # @Author: Moritz Milde
@@ -9,9 +20,87 @@ For more details see below.
 
 import numpy as np
 from brian2 import implementation, check_units,\
-    amp, pA, second, ms, volt, mV
+    amp, pA, second, ms, volt, mV, DEFAULT_FUNCTIONS
+from brian2.utils.stringtools import replace
+
+from teili.tools.random_sampling import RAND_GAMMA_CPP_CODE
+from teili.tools.codegen_targets import register_function
+from teili.tools.lfsr import LFSR_CPP_CODE, lfsr_advance
+
+RAND_DEPENDENCIES = {'_rand': DEFAULT_FUNCTIONS['rand'],
+                     '_randn': DEFAULT_FUNCTIONS['randn']}
+
+
+def _cpp_implementation(code, dependencies=None, substitutions=None):
+    """Decorator which adds a C++ implementation to a run_regular function.
 
+    %GROUP% in the code is replaced by the name of the group which runs
+    the function, e.g. to access its arrays with _ptr_array_%GROUP%_x.
 
+    Args:
+        code (dict): support_code and hashdefine_code of the function.
+        dependencies (dict, optional): Functions used by the code, e.g.
+            brian2's _rand.
+        substitutions (function, optional): Returns further replacements
+            of the code for a given group.
+
+    Returns:
+        function: Decorator which adds the implementation to a Function.
+    """
+    def group_code(owner):
+        group_substitutions = {}
+        if substitutions is not None:
+            group_substitutions.update(substitutions(owner))
+        group_substitutions['%GROUP%'] = owner.name
+        return {key: replace(value, group_substitutions)
+                for key, value in code.items()}
+
+    def add_implementation(function):
+        # brian2 calls the namespace of dynamic implementations, even if
+        # there is none
+        function.implementations.add_dynamic_implementation(
+            'cpp', group_code, namespace=lambda owner: {},
+            dependencies=dependencies, name=function.pyfunc.__name__)
+        return function
+
+    return add_implementation
+
+
+
+RE_INIT_PARAMS_CPP_CODE = {'support_code': RAND_GAMMA_CPP_CODE + '''
+    double _teili_re_init_params(double params, const double clip_min,
+                                 const double clip_max, const double const_value,
+                                 const double re_init_index, const double dist_param,
+                                 const double scale, const int dist,
+                                 const int params_type, const int _vectorisation_idx)
+    {
+        if (dist == 1) {
+            if (re_init_index == 1)
+                params = _teili_rand_gamma(dist_param, _vectorisation_idx) * scale;
+            if (params_type)
+                params = trunc(params);
+        } else if (dist == 0) {
+            if (re_init_index == 1)
+                params = dist_param + scale * _randn(_vectorisation_idx);
+            if (params_type)
+                params = trunc(params);
+        } else if (dist == 2) {
+            if (re_init_index == 1)
+                params = const_value;
+            else if (re_init_index == -1)
+                params = 0;
+        }
+        if (clip_min != clip_max)
+            params = params < clip_min ? clip_min : (params > clip_max ? clip_max : params);
+        return params;
+    }
+    ''',
+    'hashdefine_code': '''
+    #define re_init_params(params, clip_min, clip_max, const_value, re_init_indices, re_init_threshold, dist_param, scale, dist, params_type) _teili_re_init_params(params, clip_min, clip_max, const_value, re_init_indices, dist_param, scale, dist, params_type, _vectorisation_idx)
+    '''}
+
+
+@_cpp_implementation(RE_INIT_PARAMS_CPP_CODE, dependencies=RAND_DEPENDENCIES)
 @implementation('numpy', discard_units=True)
 @check_units(params=1,
              clip_min=1,
@@ -108,7 +197,8 @@ def re_init_params(params,
             if dist is 2.
         re_init_indices (vector, bool, optional): Boolean index array
             indicating which parameters need to be re-initilised. If None
-            parameters are updated based on average lower and upper 20 %.
+            parameters are updated based on average lower and upper 20 %
+            (not supported in C++).
             re_init_indices can be obtained using get_re_init_indices
             run_regularly.
         re_init_threshold (float, optional): Re-initialisation threshold. 
@@ -138,14 +228,14 @@ def re_init_params(params,
         params[re_init_indices==1] = np.random.gamma(
             shape=dist_param,
             scale=scale,
-            size=np.int(len(np.where(re_init_indices==1)[0])))
+            size=int(len(np.where(re_init_indices==1)[0])))
         if params_type:
             params = params.astype(int)
     elif dist == 0:
         params[re_init_indices==1] = np.random.normal(
             loc=dist_param,
             scale=scale,
-            size=np.int(len(np.where(re_init_indices==1)[0])))
+            size=int(len(np.where(re_init_indices==1)[0])))
         if params_type:
             params = params.astype(int)
     elif dist == 2:
@@ -158,16 +248,84 @@ def re_init_params(params,
     return params.flatten()
 
 
+# Shifts the row of the membrane buffer of one neuron (or writes to the
+# buffer_pointer if it is used as a ring buffer) and sums up the row weighted
+# with the kernel. The row length is the size of the buffer divided by N.
+# Whether the buffer is used as a ring buffer is decided for all neurons at
+# once, by checking the whole buffer for zeros before the first element of a
+# call of the run_regularly writes to it.
+ACTIVITY_PROXY_CPP_CODE = '''
+    #ifndef _TEILI_ACTIVITY_PROXY
+    #define _TEILI_ACTIVITY_PROXY
+    bool _teili_buffer_has_zero(const double* membrane_buffer, const int num_elements,
+                                const double t, const int call_site)
+    {
+        // Every call site (see __COUNTER__ in the macro) has its own cache
+        static std::vector<double> _t;
+        static std::vector<char> _has_zero;
+        bool has_zero;
+        #pragma omp critical(_teili_buffer_has_zero)
+        {
+            if (call_site >= (int)_t.size()) {
+                _t.resize(call_site + 1, NAN);
+                _has_zero.resize(call_site + 1);
+            }
+            if (t != _t[call_site]) {
+                _t[call_site] = t;
+                _has_zero[call_site] = false;
+                for (int j = 0; j < num_elements; j++)
+                    if (membrane_buffer[j] == 0) {
+                        _has_zero[call_site] = true;
+                        break;
+                    }
+            }
+            has_zero = _has_zero[call_site];
+        }
+        return has_zero;
+    }
+
+    double _teili_activity_proxy(const double value, const int buffer_pointer,
+                                 double* membrane_buffer, const double* kernel_adp,
+                                 const int buffer_size, const int row,
+                                 const bool use_ring_buffer, const bool ignore_nan)
+    {
+        double* buffer = membrane_buffer + row * buffer_size;
+        const double* kernel = kernel_adp + row * buffer_size;
+        if (use_ring_buffer) {
+            buffer[buffer_pointer] = value;
+        } else {
+            for (int k = 0; k < buffer_size - 1; k++)
+                buffer[k] = buffer[k + 1];
+            buffer[buffer_size - 1] = value;
+        }
+        double activity_proxy = 0;
+        for (int k = 0; k < buffer_size; k++) {
+            if (ignore_nan && std::isnan(buffer[k]))
+                continue;
+            activity_proxy += buffer[k] * kernel[k];
+        }
+        return activity_proxy;
+    }
+    #endif
+    '''
+
+
+@_cpp_implementation({'support_code': ACTIVITY_PROXY_CPP_CODE,
+                      'hashdefine_code': '''
+    #define get_activity_proxy_imem(Imem, buffer_pointer, membrane_buffer, kernel_adp, t) _teili_activity_proxy(Imem, (int)(buffer_pointer), _ptr_array_%GROUP%_##membrane_buffer, _ptr_array_%GROUP%_##kernel_adp, _num##membrane_buffer / _N, _vectorisation_idx, _teili_buffer_has_zero(_ptr_array_%GROUP%_##membrane_buffer, _num##membrane_buffer, t, __COUNTER__), false)
+    '''})
 @implementation('numpy', discard_units=True)
 @check_units(Imem=amp,
              buffer_pointer=1,
              membrane_buffer=1,
              kernel_adp=1,
+             t=second,
              result=amp)
 def get_activity_proxy_imem(Imem,
                             buffer_pointer,
                             membrane_buffer,
-                            kernel_adp):
+                            kernel_adp,
+                            t):
     """This function calculates an activity proxy using an integrated,
     exponentially weighted estimate of Imem of the N last time steps and
     stores it in membrane_buffer.
@@ -204,22 +362,28 @@ def get_activity_proxy_imem(Imem,
                                         octaParams['buffer_size_plast']))
         >>> # Now we can initialize the buffer_pointer and add the run regularly function
         >>> neuron_obj.run_regularly('''buffer_pointer = (buffer_pointer + 1) % buffer_size
-            activity_proxy = get_activity_proxy(Imem, buffer_pointer, membrane_buffer, decay)''', dt=1*ms)
+            activity_proxy = get_activity_proxy(Imem, buffer_pointer, membrane_buffer, kernel_adp, t)''', dt=1*ms)
 
     Args:
         Imem (float): The membrane current of the DPI neuron model.
         buffer_pointer (int): Pointer to keep track of the buffer
-        membrane_buffer (numpy.ndarray): Ring buffer for membrane potential
-        decay (int): Time constant of exp. weighted decay
+        membrane_buffer (numpy.ndarray): Ring buffer for membrane potential,
+            either (N, buffer_size) or flattened. If the buffer contains a
+            zero, Imem is written to the buffer_pointer of all rows,
+            otherwise all rows are shifted.
+        kernel_adp (numpy.ndarray): Exponential kernel of the same shape.
+        t (float, second): Time of the call. The C++ implementation checks
+            the buffer for zeros once per time step.
 
     Returns:
         neuron_obj.array: An array which holds the integral of the
             activity_proxy over the N time steps of the
     """
     buffer_pointer = int(buffer_pointer)
+    membrane_buffer = np.reshape(membrane_buffer, (len(Imem), -1))
+    kernel_adp = np.reshape(kernel_adp, (len(Imem), -1))
     if np.sum(membrane_buffer == 0) > 0:
         membrane_buffer[:, buffer_pointer] = Imem
-        # kernel_adp = np.zeros(np.shape(membrane_buffer)) * np.nan
     else:
         membrane_buffer[:, :-1] = membrane_buffer[:, 1:]
         membrane_buffer[:, -1] = Imem
@@ -236,6 +400,10 @@ def get_activity_proxy_imem(Imem,
     return activity_proxy
 
 
+@_cpp_implementation({'support_code': ACTIVITY_PROXY_CPP_CODE,
+                      'hashdefine_code': '''
+    #define get_activity_proxy_vm(Vm, buffer_pointer, membrane_buffer, kernel_adp) _teili_activity_proxy(Vm, (int)(buffer_pointer), _ptr_array_%GROUP%_##membrane_buffer, _ptr_array_%GROUP%_##kernel_adp, _num##membrane_buffer / _N, _vectorisation_idx, false, true)
+    '''})
 @implementation('numpy', discard_units=True)
 @check_units(Vm=volt,
              buffer_pointer=1,
@@ -256,14 +424,17 @@ def get_activity_proxy_vm(Vm,
      Args:
         Vm (float): The membrane potential of the LIF neuron model.
         buffer_pointer (int): Pointer to keep track of the buffer
-        membrane_buffer (numpy.ndarray): Ring buffer for membrane potential.
-        decay (int): Time constant of exp. weighted decay
+        membrane_buffer (numpy.ndarray): Ring buffer for membrane potential,
+            either (N, buffer_size) or flattened.
+        kernel_adp (numpy.ndarray): Exponential kernel of the same shape.
 
     Returns:
         neuron_obj.array: An array which holds the integral of the
             activity_proxy over the N time steps of the
     """
     buffer_pointer = int(buffer_pointer)
+    membrane_buffer = np.reshape(membrane_buffer, (len(Vm), -1))
+    kernel_adp = np.reshape(kernel_adp, (len(Vm), -1))
     if np.sum(membrane_buffer == np.nan) > 0:
         membrane_buffer[:, buffer_pointer] = Vm
         # kernel_adp = np.zeros(np.shape(membrane_buffer)) * np.nan
@@ -284,18 +455,65 @@ def get_activity_proxy_vm(Vm,
     return activity_proxy
 
 
+# The maximum over all neurons is computed once per call of the run_regularly
+# (i.e. at the first element evaluated at a new time t), the result of each
+# neuron is the maximum of its old_max and the maximum of the activity proxy.
+# A NaN activity proxy leaves old_max unchanged, like in numpy.
+MAX_VALUE_UPDATE_CPP_CODE = '''
+    #ifndef _TEILI_MAX_VALUE_UPDATE
+    #define _TEILI_MAX_VALUE_UPDATE
+    double _teili_max_value_update(const double* activity_proxy, const int num_elements,
+                                   const double old_max, const double unit,
+                                   const double t, const int call_site)
+    {
+        // The maximum is computed once per call of the run_regularly, every
+        // call site (see __COUNTER__ in the macro) has its own cache
+        static std::vector<double> _t;
+        static std::vector<double> _max;
+        double max_value;
+        #pragma omp critical(_teili_max_value_update)
+        {
+            if (call_site >= (int)_t.size()) {
+                _t.resize(call_site + 1, NAN);
+                _max.resize(call_site + 1);
+            }
+            if (t != _t[call_site]) {
+                _t[call_site] = t;
+                _max[call_site] = -INFINITY;
+                for (int j = 0; j < num_elements; j++) {
+                    if (std::isnan(activity_proxy[j])) {
+                        _max[call_site] = NAN;
+                        break;
+                    }
+                    if (activity_proxy[j] / unit > _max[call_site])
+                        _max[call_site] = activity_proxy[j] / unit;
+                }
+            }
+            max_value = _max[call_site];
+        }
+        return max_value > old_max ? max_value : old_max;
+    }
+    #endif
+    '''
+
 
+@_cpp_implementation({'support_code': MAX_VALUE_UPDATE_CPP_CODE,
+                      'hashdefine_code': '''
+    #define max_value_update_vm(activity_proxy, old_max, t) _teili_max_value_update(_ptr_array_%GROUP%_##activity_proxy, _num##activity_proxy, old_max, 1e-3, t, __COUNTER__)
+    '''})
 @implementation('numpy', discard_units=True)
-@check_units(activity_proxy=volt, old_max=1, result=1)
-def max_value_update_vm(activity_proxy, old_max):
+@check_units(activity_proxy=volt, old_max=1, t=second, result=1)
+def max_value_update_vm(activity_proxy, old_max, t):
     """ This run_regularly simply calculates the maximum value of the
     activity proxy to normalize it accordingly.
 
     Args:
         activity_proxy(numpy.ndarray): Array containing the exponentially
             weights membrane potential traces.
-        old_max(float): Maximum value of activity_proxy since the start
-            of the simulation.
+        old_max(numpy.ndarray): Maximum value of activity_proxy since the
+            start of the simulation, one (equal) value per neuron.
+        t (float, second): Time of the call. The C++ implementation
+            computes the maximum once per time step.
 
     Returns:
         old_max (float): Updated maximum value
@@ -306,17 +524,23 @@ def max_value_update_vm(activity_proxy, old_max):
     return old_max[0]
 
 
+@_cpp_implementation({'support_code': MAX_VALUE_UPDATE_CPP_CODE,
+                      'hashdefine_code': '''
+    #define max_value_update_imem(activity_proxy, old_max, t) _teili_max_value_update(_ptr_array_%GROUP%_##activity_proxy, _num##activity_proxy, old_max, 1e-12, t, __COUNTER__)
+    '''})
 @implementation('numpy', discard_units=True)
-@check_units(activity_proxy=amp, old_max=1, result=1)
-def max_value_update_imem(activity_proxy, old_max):
+@check_units(activity_proxy=amp, old_max=1, t=second, result=1)
+def max_value_update_imem(activity_proxy, old_max, t):
     """ This run_regularly simply calculates the maximum value of the
     activity proxy to normalize it accordingly.
 
     Args:
         activity_proxy(numpy.ndarray): Array containing the exponentially
             weights membrane potential traces.
-        old_max(float): Maximum value of activity_proxy since the start
-            of the simulation.
+        old_max(numpy.ndarray): Maximum value of activity_proxy since the
+            start of the simulation, one (equal) value per neuron.
+        t (float, second): Time of the call. The C++ implementation
+            computes the maximum once per time step.
 
     Returns:
         old_max (float): Updated maximum value
@@ -326,6 +550,12 @@ def max_value_update_imem(activity_proxy, old_max):
     return old_max[0]
 
 
+@implementation('cpp', '''
+    double normalize_activity_proxy_imem(const double activity_proxy, const double old_max)
+    {
+        return old_max == 0.0 ? 0.0 : (activity_proxy / 1e-12) / old_max;
+    }
+    ''', name='normalize_activity_proxy_imem')
 @implementation('numpy', discard_units=True)
 @check_units(activity_proxy=amp, old_max=1, result=1)
 def normalize_activity_proxy_imem(activity_proxy, old_max):
@@ -359,14 +589,19 @@ def normalize_activity_proxy_imem(activity_proxy, old_max):
     Returns:
         float: Normalized activity proxy
     """
-    if old_max == 0.0:
-        normalized_activity_proxy = np.zeros(np.shape(activity_proxy))
-    else:
-        normalized_activity_proxy = (activity_proxy / pA) / old_max
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized_activity_proxy = np.where(
+            old_max == 0.0, 0.0, (activity_proxy / pA) / old_max)
 
     return normalized_activity_proxy
 
 
+@implementation('cpp', '''
+    double normalize_activity_proxy_vm(const double activity_proxy, const double old_max)
+    {
+        return old_max == 0.0 ? 0.0 : (activity_proxy / 1e-3) / old_max;
+    }
+    ''', name='normalize_activity_proxy_vm')
 @implementation('numpy', discard_units=True)
 @check_units(activity_proxy=volt, old_max=1, result=1)
 def normalize_activity_proxy_vm(activity_proxy, old_max):
@@ -381,10 +616,9 @@ def normalize_activity_proxy_vm(activity_proxy, old_max):
     Returns:
         float: Normalized activity proxy
     """
-    if old_max == 0.0:
-        normalized_activity_proxy = np.zeros(np.shape(activity_proxy))
-    else:
-        normalized_activity_proxy = (activity_proxy / mV) / old_max
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized_activity_proxy = np.where(
+            old_max == 0.0, 0.0, (activity_proxy / mV) / old_max)
 
     return normalized_activity_proxy
 
@@ -427,6 +661,168 @@ def weight_normalization(weights,
     return data.flatten()
 
 
+# The rows of Ipred_plast (one per pre-synaptic neuron, synapses created by
+# connect(True)) which are re-initialised are found once per call of the
+# run_regularly, before any element is changed.
+RE_INIT_IPRED_CPP_CODE = {'support_code': '''
+    double _teili_re_init_ipred(const double* Ipred_plast, const int source_N,
+                                const int target_N, const double re_init_threshold,
+                                const double t, const int call_site,
+                                const int _vectorisation_idx)
+    {
+        static std::vector<double> _t;
+        static std::vector<std::vector<char> > _cached_rows;
+        bool re_init_row;
+        #pragma omp critical(_teili_re_init_ipred)
+        {
+            if (call_site >= (int)_t.size()) {
+                _t.resize(call_site + 1, NAN);
+                _cached_rows.resize(call_site + 1);
+            }
+            std::vector<char>& _rows = _cached_rows[call_site];
+            if (t != _t[call_site]) {
+                _t[call_site] = t;
+                _rows.assign(source_N, false);
+                for (int i = 0; i < source_N; i++) {
+                    double mean = 0;
+                    for (int j = 0; j < target_N; j++)
+                        mean += Ipred_plast[i * target_N + j];
+                    _rows[i] = mean / target_N > 1 - re_init_threshold;
+                }
+            }
+            re_init_row = _rows[_vectorisation_idx / target_N];
+        }
+        const double value = re_init_row ? 0 : Ipred_plast[_vectorisation_idx];
+        return value < 0 ? 0 : (value > 1 ? 1 : value);
+    }
+    ''',
+    'hashdefine_code': '''
+    #define re_init_ipred(Ipred_plast, source_N, target_N, re_init_threshold, t) _teili_re_init_ipred(_ptr_array_%GROUP%_##Ipred_plast, (int)(source_N), (int)(target_N), re_init_threshold, t, __COUNTER__, _vectorisation_idx)
+    '''}
+
+
+@_cpp_implementation(RE_INIT_IPRED_CPP_CODE)
+@implementation('numpy', discard_units=True)
+@check_units(Ipred_plast=1, source_N=1, target_N=1, re_init_threshold=1,
+             t=second, result=1)
+def re_init_ipred(Ipred_plast, source_N, target_N, re_init_threshold, t):
+    """Re-initialises the prediction weights of OCTA. All weights of a
+    pre-synaptic neuron are set to zero if their mean exceeds
+    1 - re_init_threshold, and all weights are clipped to [0, 1].
+
+    Args:
+        Ipred_plast (numpy.ndarray): Flattened weights of all-to-all
+            connected synapses.
+        source_N (int): Size of the pre-synaptic group.
+        target_N (int): Size of the post-synaptic group.
+        re_init_threshold (float): Threshold of the mean weight.
+        t (float, second): Time of the call. The C++ implementation
+            computes the means once per time step.
+
+    Returns:
+        ndarray: Flattened re-initialised weights.
+    """
+    data = np.reshape(Ipred_plast, (int(source_N), int(target_N)))
+
+    reinit_index = np.mean(data, 1) > (1 - re_init_threshold)
+
+    data[reinit_index, :] = 0
+    data = np.clip(data, 0, 1)
+    return data.flatten()
+
+
+GET_RE_INIT_INDICES_CPP_CODE = {'support_code': '''
+    double _teili_get_re_init_indices(const double* re_init_variable, const double* lastspike,
+                                      const int _N, const int reference,
+                                      const double re_init_threshold, const double t,
+                                      const int call_site, const int _vectorisation_idx)
+    {
+        // The indices of all elements are computed once per call of the
+        // run_regularly, every call site has its own cache
+        static std::vector<double> _t;
+        static std::vector<std::vector<double> > _cached_indices;
+        double re_init_index;
+        #pragma omp critical(_teili_get_re_init_indices)
+        {
+            if (call_site >= (int)_t.size()) {
+                _t.resize(call_site + 1, NAN);
+                _cached_indices.resize(call_site + 1);
+            }
+            std::vector<double>& _indices = _cached_indices[call_site];
+            if (t != _t[call_site]) {
+                _t[call_site] = t;
+                _indices.assign(_N, 0);
+                if (reference == 0) {
+                    double mean = 0;
+                    for (int j = 0; j < _N; j++)
+                        mean += re_init_variable[j];
+                    if (mean / _N < re_init_threshold)
+                        _indices.assign(_N, 1);
+                } else if (reference == 1) {
+                    int num_negative = 0;
+                    bool expired = false;
+                    for (int j = 0; j < _N; j++) {
+                        if (lastspike[j] < 0)
+                            num_negative++;
+                        if (t - fabs(lastspike[j]) > 1)
+                            expired = true;
+                    }
+                    for (int j = 0; j < _N; j++) {
+                        if (num_negative > 2)
+                            _indices[j] = lastspike[j] < 0;
+                        else if (expired)
+                            _indices[j] = t - lastspike[j] > 1;
+                    }
+                } else if (reference == 2 && t > 0) {
+                    std::vector<int> pruned, disconnected;
+                    for (int j = 0; j < _N; j++) {
+                        if (re_init_variable[j] < re_init_threshold)
+                            pruned.push_back(j);
+                        else if (std::isnan(re_init_variable[j]))
+                            disconnected.push_back(j);
+                    }
+                    const int num_spawned = pruned.size() < disconnected.size() ?
+                                            pruned.size() : disconnected.size();
+                    // random choice without replacement (partial Fisher-Yates shuffle)
+                    for (int k = 0; k < num_spawned; k++) {
+                        int j = k + (int)(_rand(_vectorisation_idx) * (disconnected.size() - k));
+                        int tmp = disconnected[k];
+                        disconnected[k] = disconnected[j];
+                        disconnected[j] = tmp;
+                        j = k + (int)(_rand(_vectorisation_idx) * (pruned.size() - k));
+                        tmp = pruned[k];
+                        pruned[k] = pruned[j];
+                        pruned[j] = tmp;
+                        _indices[disconnected[k]] = 1;
+                        _indices[pruned[k]] = -1;
+                    }
+                } else if (reference == 3) {
+                    for (int j = 0; j < _N; j++)
+                        _indices[j] = re_init_variable[j] < re_init_threshold;
+                }
+            }
+            re_init_index = _indices[_vectorisation_idx];
+        }
+        return re_init_index;
+    }
+    ''',
+    'hashdefine_code': '''
+    #define get_re_init_indices(re_init_variable, reference, re_init_threshold, lastspike, t) _teili_get_re_init_indices(_ptr_array_%GROUP%_##re_init_variable, %LASTSPIKE%, _N, reference, re_init_threshold, t, __COUNTER__, _vectorisation_idx)
+    '''}
+
+
+def _lastspike_pointer(owner):
+    # lastspike of Connections belongs to the post-synaptic neurons, it is
+    # only used by Neurons (reference 1)
+    if ('lastspike' in owner.variables and
+            owner.variables['lastspike'].owner.name == owner.name):
+        return {'%LASTSPIKE%': '_ptr_array_%GROUP%_##lastspike'}
+    return {'%LASTSPIKE%': 'NULL'}
+
+
+@_cpp_implementation(GET_RE_INIT_INDICES_CPP_CODE,
+                     dependencies={'_rand': DEFAULT_FUNCTIONS['rand']},
+                     substitutions=_lastspike_pointer)
 @implementation('numpy', discard_units=True)
 @check_units(re_init_variable=1,
              reference=1,
@@ -472,6 +868,7 @@ def get_re_init_indices(re_init_variable,
         re_init_indices[np.mean(re_init_variable, 0) < re_init_threshold] = 1
     # Using the time since last spike to determine which synapse to reinitilise
     elif reference == 1:
+        lastspike = np.atleast_2d(lastspike)
         source_N, target_N = len(lastspike[:,0]), len(lastspike[0,:])
         lastspike_tmp = np.reshape(lastspike, (source_N, target_N))
         if (lastspike < 0*second).any() and (np.sum(lastspike_tmp[0, :] < 0 * second) > 2):
@@ -503,6 +900,21 @@ def get_re_init_indices(re_init_variable,
     return re_init_indices
 
 
+@implementation('cpp', '''
+    double reset_re_init_variable(double params, const int reference,
+                                  const double re_init_index)
+    {
+        if (reference == 2) {
+            if (!std::isnan(params))
+                params = 0;
+            if (re_init_index == -1)
+                params = NAN;
+            else if (re_init_index == 1)
+                params = 0;
+        }
+        return params;
+    }
+    ''', name='reset_re_init_variable')
 @implementation('numpy', discard_units=True)
 @check_units(params=1,
              re_init_indices=1,
@@ -530,6 +942,15 @@ def reset_re_init_variable(params, reference, re_init_indices):
     return params
 
 
+@implementation('cpp', '''
+    double update_threshold(const double Vthr, const double Vm, const double EL,
+                            const double VT, const double sigma_membrane,
+                            const double not_refractory)
+    {
+        return Vthr - sigma_membrane * (Vm > EL + 1e-3) +
+               5 * sigma_membrane * (Vm < EL - 1e-3) * not_refractory;
+    }
+    ''', name='update_threshold')
 @implementation('numpy', discard_units=True)
 @check_units(Vthr=volt,
              Vm=volt,
@@ -568,6 +989,15 @@ def update_threshold(Vthr, Vm, EL, VT, sigma_membrane, not_refractory):
 
     return data * mV
 
+@implementation('cpp', LFSR_CPP_CODE + '''
+    double lfsr(const double decay_probability, const long num_elements,
+                const int lfsr_num_bits, const int mask)
+    {
+        const int state = (int)(decay_probability * (1 << lfsr_num_bits));
+        return (double)_teili_lfsr_advance(state, lfsr_num_bits, mask, num_elements) /
+               (1 << lfsr_num_bits);
+    }
+    ''', name='lfsr')
 @implementation('numpy', discard_units=True)
 @check_units(decay_probability=1, num_elements=1, lfsr_num_bits=1, mask=1, result=1)
 def lfsr(decay_probability, num_elements, lfsr_num_bits, mask):
@@ -577,8 +1007,10 @@ def lfsr(decay_probability, num_elements, lfsr_num_bits, mask):
     numbers from an uniform distribution. This is a Galois or many-to-one
     implementation.
 
-    This function receives a given number and performs num_elements iterations
-    of the LFSR. This is done when a given neuron needs another random number.
+    This function receives the registers of all elements and advances each
+    of them by num_elements iterations of the LFSR at once, see
+    teili.tools.lfsr.lfsr_advance. This is done when a given neuron needs
+    another random number.
     The LFSR does a circular shift (i.e. all the values are shifted left while
     the previous MSB becomes the new LSB) and ensures the variable is no bigger
     than the specified number of bits. Note that, for convenience,
@@ -588,6 +1020,9 @@ def lfsr(decay_probability, num_elements, lfsr_num_bits, mask):
     Otherwise, a XOR operation between the mask and the shifted value is
     necessary to send MSB to LSB and update relative taps.
 
+    As the elements hold consecutive states of the LFSR (see add_lfsr),
+    this continues the sequence of the group where it stopped.
+
     Parameters
     ----------
     decay_probability : float
@@ -614,21 +1049,15 @@ def lfsr(decay_probability, num_elements, lfsr_num_bits, mask):
     >>> bin(int(lfsr([number/2**n_bits], 1, [n_bits], 0b100101)*2**n_bits))
     '0b10001'
     """
-    try:
-        lfsr_num_bits = int(lfsr_num_bits[0])
-        seed = int(decay_probability[-1]*2**lfsr_num_bits)
-    except:
-        print('Please use numpy target')
-        quit()
-
-    updated_probabilities = [0 for _ in range(num_elements)]
-    mask = int(mask)
-
-    for i in range(num_elements):
-        seed = seed << 1
-        overflow = seed >> lfsr_num_bits
-        if overflow:
-            seed ^= mask
-        updated_probabilities[i] = seed
-
-    return np.array(updated_probabilities)/2**lfsr_num_bits
+    max_value = 2**np.asarray(lfsr_num_bits, dtype=int)
+    states = np.rint(np.asarray(decay_probability) * max_value)
+    return lfsr_advance(states, lfsr_num_bits, mask,
+                        int(num_elements)) / max_value
+
+
+for function in [re_init_params, get_activity_proxy_imem, get_activity_proxy_vm,
+                 max_value_update_vm, max_value_update_imem,
+                 normalize_activity_proxy_imem, normalize_activity_proxy_vm,
+                 weight_normalization, re_init_ipred, get_re_init_indices,
+                 reset_re_init_variable, update_threshold, lfsr]:
+    register_function(function)
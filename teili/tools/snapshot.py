@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Binary columnar file format of network snapshots.
+
+A snapshot file holds nested state, e.g. the dictionaries of brian2's
+_full_state, teili tags and standalone_params. All arrays are stored as
+raw columns, everything else (dictionaries, tuples, scalars, strings and
+units) in a JSON header which refers to the columns:
+
+    magic (8 bytes) | header length (uint64) | header | columns
+
+Every column starts at a multiple of 64 bytes. read_snapshot maps the
+file into memory and returns the arrays as read-only views of the map,
+so loading a snapshot is a single read of the file without copies.
+
+Example:
+    >>> from teili.tools.snapshot import write_snapshot, read_snapshot
+    >>> write_snapshot('net.snapshot', {'n_exc': {'Imem': values}})
+    >>> state = read_snapshot('net.snapshot')
+"""
+
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from brian2 import Quantity
+from brian2.units.fundamentalunits import get_or_create_dimension
+
+MAGIC = b'TEILISNP'
+_ALIGNMENT = 64
+
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _encode(value, columns):
+    """Converts nested state to JSON, arrays are appended to columns."""
+    if isinstance(value, Quantity):
+        columns.append(np.asarray(value))
+        return {'column': len(columns) - 1,
+                'dim': list(value.dim._dims)}
+    if isinstance(value, (np.ndarray, np.generic)):
+        if np.asarray(value).dtype.hasobject:
+            raise TypeError("Cannot store arrays of Python objects.")
+        columns.append(np.asarray(value))
+        if isinstance(value, np.generic):
+            return {'column': len(columns) - 1, 'scalar': True}
+        return {'column': len(columns) - 1}
+    if isinstance(value, dict):
+        return {'odict' if isinstance(value, OrderedDict) else 'dict':
+                [[_encode(key, columns), _encode(item, columns)]
+                 for key, item in value.items()]}
+    if isinstance(value, (tuple, list)):
+        return {type(value).__name__: [_encode(item, columns)
+                                       for item in value]}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {'value': value}
+    raise TypeError(f"Cannot store {type(value).__name__} in a snapshot.")
+
+
+def _decode(value, columns):
+    if 'value' in value:
+        return value['value']
+    if 'column' in value:
+        column = columns[value['column']]
+        if 'dim' in value:
+            return Quantity(column, dim=get_or_create_dimension(value['dim']))
+        if value.get('scalar', False):
+            return column[()]
+        return column
+    if 'dict' in value or 'odict' in value:
+        items = [(_decode(key, columns), _decode(item, columns))
+                 for key, item in value.get('dict', value.get('odict'))]
+        return OrderedDict(items) if 'odict' in value else dict(items)
+    if 'tuple' in value:
+        return tuple(_decode(item, columns) for item in value['tuple'])
+    return [_decode(item, columns) for item in value['list']]
+
+
+def write_snapshot(path, state):
+    """Writes nested state to a snapshot file. The file is written to a
+    temporary file which is then renamed, so an interrupted write never
+    replaces a previous snapshot by a partial one.
+
+    Args:
+        path (str): Filename of the snapshot.
+        state (dict): State of dictionaries, lists, tuples, arrays,
+            Quantities, numbers, strings and None.
+
+    Raises:
+        TypeError: If the state contains any other objects.
+    """
+    columns = []
+    tree = _encode(state, columns)
+    column_headers = []
+    offset = 0
+    for column in columns:
+        column = np.asarray(column, order='C')
+        column_headers.append({'dtype': column.dtype.str,
+                               'shape': list(column.shape),
+                               'offset': offset})
+        offset = _align(offset + column.nbytes)
+    header = json.dumps({'columns': column_headers,
+                         'state': tree}).encode()
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(path)),
+                            '.tmp_' + uuid.uuid4().hex)
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(np.array(len(header), dtype='<u8').tobytes())
+            f.write(header)
+            for column, column_header in zip(columns, column_headers):
+                f.seek(data_start + column_header['offset'])
+                f.write(np.asarray(column, order='C').tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_snapshot(path):
+    """Reads the state of a snapshot file.
+
+    Args:
+        path (str): Filename of the snapshot.
+
+    Returns:
+        dict: State as written by write_snapshot. Arrays are read-only
+            views of the memory mapped file.
+
+    Raises:
+        ValueError: If the file is not a snapshot.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(data) < len(MAGIC) + 8 or bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a teili snapshot.")
+    header_start = len(MAGIC) + 8
+    header_length = int(data[len(MAGIC):header_start].view('<u8')[0])
+    header = json.loads(bytes(data[header_start:header_start + header_length]))
+    data_start = _align(header_start + header_length)
+    columns = []
+    for column in header['columns']:
+        dtype = np.dtype(column['dtype'])
+        start = data_start + column['offset']
+        count = int(np.prod(column['shape']))
+        # asarray drops the memmap subclass without copying
+        columns.append(np.asarray(data[start:start + count * dtype.itemsize])
+                       .view(dtype).reshape(column['shape']))
+    return _decode(header['state'], columns)
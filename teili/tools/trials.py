@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Functions to run several independent trials in one simulation.
+
+A building block created with num_trials > 1 contains num_trials copies
+of each of its groups, stacked into one larger group, and each copy is
+only connected to the copies of the same trial (see
+teili.tools.connectivity.BlockDiagonal). Neuron k of trial t therefore
+has the index t * group_size + k. route_trials computes these indices for
+the input of the trials, split_trials and split_states separate the
+recordings of the monitors by trial afterwards.
+
+Example:
+    >>> wta = WTA(name='wta', num_neurons=16, num_trials=10)
+    >>> wta.spike_gen.set_spikes(route_trials(indices, trials, 16), times)
+    >>> net.run(100 * ms)
+    >>> spikes = split_trials(spikemon.i, 16, 10, spikemon.t)
+"""
+
+import numpy as np
+
+
+def route_trials(indices, trials, group_size):
+    """Maps the indices of neurons of single trials to the stacked group.
+
+    Args:
+        indices (ndarray): Indices of the neurons within their trial.
+        trials (int, ndarray): Trial of every index.
+        group_size (int): Size of the group of one trial.
+
+    Returns:
+        ndarray: Indices of the neurons in the stacked group.
+    """
+    return np.asarray(trials, dtype=int) * group_size + \
+        np.asarray(indices, dtype=int)
+
+
+def split_trials(indices, group_size, num_trials, *values):
+    """Splits events of a stacked group, e.g. the spikes of a SpikeMonitor,
+    by trial.
+
+    Args:
+        indices (ndarray): Indices of the neurons in the stacked group,
+            e.g. SpikeMonitor.i.
+        group_size (int): Size of the group of one trial.
+        num_trials (int): Number of trials.
+        *values (ndarray): Further values of the events, e.g.
+            SpikeMonitor.t.
+
+    Returns:
+        list: Tuple of the indices within the trial and the values of
+            every trial, in the order of the events.
+    """
+    indices = np.asarray(indices, dtype=int)
+    trials = indices // group_size
+    order = np.argsort(trials, kind='stable')
+    bounds = np.searchsorted(trials[order], np.arange(num_trials + 1))
+    split = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        events = order[start:stop]
+        split.append((indices[events] % group_size,) +
+                     tuple(value[events] for value in values))
+    return split
+
+
+def split_states(values, num_trials):
+    """Splits recorded state variables of a stacked group by trial.
+
+    Args:
+        values (ndarray): Values of the neurons of the stacked group
+            along the first axis, e.g. StateMonitor.Imem of a monitor
+            with record=True.
+        num_trials (int): Number of trials.
+
+    Returns:
+        ndarray: Values with the trial as first and the neuron within the
+            trial as second axis.
+    """
+    return values.reshape((num_trials, -1) + values.shape[1:])
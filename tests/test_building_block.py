@@ -1,9 +1,13 @@
 '''This script tests the functionality of the B'''
+import os
+import shutil
+import tempfile
 import unittest
 import numpy as np
 from teili.building_blocks.building_block import BuildingBlock
 from teili.building_blocks.wta import WTA
 from teili.core import tags as tags_parameters
+from teili.core.network import TeiliNetwork
 from brian2 import prefs, ms
 
 prefs.codegen.target = "numpy"
@@ -50,6 +54,49 @@ class TestBB(unittest.TestCase):
         test1DWTA._set_tags(tags, target_group)
         self.assertEqual(tags, test1DWTA.get_tags(target_group))
 
+    def test_snapshot(self):
+        '''Tests that a network continues identically from a snapshot.'''
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        path = os.path.join(snapshot_dir, 'wta.snapshot')
+
+        def build_network():
+            test1DWTA = WTA(name='testSnapshotWTA', dimensions=1,
+                            num_neurons=16, num_inh_neurons=4,
+                            block_params={'we_inp_exc': 3000,
+                                          'ii_connection_probability': 0.5})
+            test1DWTA.spike_gen.set_spikes(np.arange(64) % 16,
+                                           (np.arange(64) * 0.5 + 5) * ms)
+            test_net = TeiliNetwork()
+            test_net.add(test1DWTA)
+            return test_net, test1DWTA
+
+        test_net, test1DWTA = build_network()
+        test_net.run(10 * ms, verbose=False)
+        test_net.save_snapshot(path)
+        test_net.run(10 * ms, verbose=False)
+        target_group = test1DWTA._groups['n_exc']
+        spikemon = test1DWTA.monitors['spikemon_exc']
+        target_group._tags['changed'] = True
+
+        loaded_net, loaded_WTA = build_network()
+        loaded_WTA._groups['s_inh_inh'].connect(True)
+        loaded_net.load_snapshot(path)
+        self.assertNotIn('changed', loaded_WTA._groups['n_exc']._tags)
+        self.assertEqual(len(loaded_WTA._groups['s_inh_inh']),
+                         len(test1DWTA._groups['s_inh_inh']))
+        loaded_net.run(10 * ms, verbose=False)
+        np.testing.assert_array_equal(loaded_WTA.monitors['spikemon_exc'].i,
+                                      spikemon.i)
+        np.testing.assert_allclose(loaded_WTA._groups['n_exc'].Imem,
+                                   target_group.Imem)
+
+        # Snapshots only load into networks of the same groups
+        other_net = TeiliNetwork()
+        other_net.add(WTA(name='otherSnapshotWTA', dimensions=1,
+                          num_neurons=16, num_inh_neurons=4))
+        self.assertRaises(ValueError, other_net.load_snapshot, path)
+
 
 if __name__ == '__main__':
     unittest.main()
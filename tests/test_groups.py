@@ -7,8 +7,11 @@ This file contains unittest for groups.py
 import unittest
 import numpy as np
 from brian2 import seed
-from teili.core.groups import Neurons
+from scipy import sparse
+from teili.core.groups import Neurons, Connections
 from teili.models.neuron_models import DPI
+from teili.models.synapse_models import DPISyn
+from teili.tools.connectivity import Banded
 
 """
 NOTE: 
@@ -91,6 +94,44 @@ class TestGroups(unittest.TestCase):
 
         self.assertTrue(all(np_current_state[1] == np.random.get_state()[1]))
 
+    def test_mismatch_seed_stream(self):
+        """
+        This method tests that with a seed every parameter gets its own random
+        stream, i.e. its mismatch does not depend on the other parameters or
+        the size of the population.
+        """
+        np_current_state = np.random.get_state()
+        testNeurons = Neurons(10, equation_builder=DPI(num_inputs=2))
+        testNeurons.add_mismatch({'Itau': 0.1, 'Ith': 0.2}, seed=5)
+        otherNeurons = Neurons(12, equation_builder=DPI(num_inputs=2))
+        otherNeurons.add_mismatch({'Ith': 0.2}, seed=5)
+
+        np.testing.assert_array_equal(np.asarray(testNeurons.Ith),
+                                      np.asarray(otherNeurons.Ith)[:10])
+        self.assertEqual(np.random.get_state()[2], np_current_state[2])
+
+    def test_connect_generator(self):
+        """
+        This method tests that connectivity generators and sparse matrices
+        create the same synapses as the equivalent conditions.
+        """
+        testNeurons = Neurons(10, equation_builder=DPI(num_inputs=4))
+        testSyn = Connections(testNeurons, testNeurons,
+                              equation_builder=DPISyn())
+        testSyn.connect(Banded(cutoff=1))
+        conditionSyn = Connections(testNeurons, testNeurons,
+                                   equation_builder=DPISyn())
+        conditionSyn.connect('abs(i-j)<=1')
+        np.testing.assert_array_equal(testSyn.i, conditionSyn.i)
+        np.testing.assert_array_equal(testSyn.j, conditionSyn.j)
+
+        matrixSyn = Connections(testNeurons, testNeurons,
+                                equation_builder=DPISyn())
+        matrixSyn.connect(sparse.csr_matrix((10, 10)))
+        self.assertEqual(len(matrixSyn), 0)
+        self.assertRaises(ValueError, matrixSyn.connect, Banded(cutoff=1),
+                          p=0.5)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=1)
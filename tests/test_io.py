@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This file contains unittest for io.py
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from brian2 import NeuronGroup, SpikeMonitor, StateMonitor, Network, ms, \
+    nA, prefs, defaultclock
+from teili.tools.io import MonitorRecorder, ResultsStore, \
+    load_recorded_monitor
+
+
+class SimulationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        prefs.codegen.target = 'numpy'
+        defaultclock.dt = 0.1 * ms
+        self.group = NeuronGroup(5, 'dv/dt = (1.1 - v)/(10*ms) : 1',
+                                 threshold='v>1', reset='v=0',
+                                 method='exact')
+        self.group.v = 'i/5.'
+        fd, self.filename = tempfile.mkstemp(suffix='.h5')
+        os.close(fd)
+        os.remove(self.filename)
+        self.addCleanup(lambda: os.path.isfile(self.filename) and
+                        os.remove(self.filename))
+
+
+class TestMonitorRecorder(SimulationTestCase):
+
+    def test_flush_during_run(self):
+        spikemon = SpikeMonitor(self.group)
+        statemon = StateMonitor(self.group, 'v', record=True)
+        recorder = MonitorRecorder(self.filename, flush_interval=20 * ms)
+        recorder.add(self.group, variables=['v'])
+        net = Network(self.group, spikemon, statemon, recorder)
+        net.run(100 * ms)
+        net.run(10 * ms)
+        # Monitors of the recorder are emptied after each run
+        spikemon_name = 'spikemon_' + self.group.name
+        self.assertEqual(recorder.monitors[spikemon_name].num_spikes, 0)
+        recorder.close()
+
+        recorded = load_recorded_monitor(self.filename, spikemon_name)
+        np.testing.assert_array_equal(recorded.t, spikemon.t)
+        np.testing.assert_array_equal(recorded.i, spikemon.i)
+        recorded = load_recorded_monitor(self.filename,
+                                         'statemon_' + self.group.name)
+        np.testing.assert_array_equal(recorded.t, statemon.t)
+        np.testing.assert_allclose(recorded.v, statemon.v)
+
+
+class TestResultsStore(SimulationTestCase):
+
+    def test_store(self):
+        spikemon = SpikeMonitor(self.group, name='test_spikemon')
+        statemon = StateMonitor(self.group, 'v', record=[0, 3],
+                                name='test_statemon')
+        net = Network(self.group, spikemon, statemon)
+        net.run(100 * ms)
+
+        with ResultsStore(self.filename, mode='w') as store:
+            store.save_monitor(spikemon)
+            store.save_monitor(statemon)
+            store.save_weights('w', np.arange(6) * nA)
+            store.save_params({'Itau': 2 * nA, 'num_neurons': 5,
+                               'sub': {'name': 'test', 'x': None}})
+
+        store = ResultsStore(self.filename, mode='r')
+        self.assertEqual(sorted(store.keys()),
+                         ['test_spikemon', 'test_statemon'])
+        self.assertEqual(len(store['test_spikemon']), spikemon.num_spikes)
+        np.testing.assert_array_equal(store['test_spikemon'].i, spikemon.i)
+        window = store['test_spikemon'].window(20 * ms, 50 * ms)
+        in_window = (spikemon.t >= 20 * ms) & (spikemon.t < 50 * ms)
+        np.testing.assert_array_equal(window.t, spikemon.t[in_window])
+        np.testing.assert_array_equal(window.i, spikemon.i[in_window])
+        window = store['test_statemon'].window(10 * ms, 11 * ms)
+        np.testing.assert_allclose(window.v, statemon.v[:, 100:110])
+        np.testing.assert_array_equal(store.load_weights('w', nrows=2),
+                                      np.arange(6).reshape(2, 3) * nA)
+        params = store.params
+        self.assertEqual(params['Itau'], 2 * nA)
+        self.assertEqual(params['num_neurons'], 5)
+        self.assertEqual(params['sub']['name'], 'test')
+        self.assertEqual(params['sub']['x'], 'None')
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
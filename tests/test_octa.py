@@ -9,14 +9,20 @@ import unittest
 import numpy as np
 from teili.models.parameters.octa_params import wta_params, octa_params
 
+from teili import TeiliNetwork
 from teili.building_blocks.octa import Octa
-from brian2 import prefs
-
-prefs.codegen.target = "numpy"
+from brian2 import prefs, ms
 
 
 class TestOcta(unittest.TestCase):
 
+    def setUp(self):
+        from teili.tools.connectivity import connectivity_cache
+        # The seeded connectivity is not cached on disk
+        self.addCleanup(setattr, connectivity_cache, 'cache_dir',
+                        connectivity_cache.cache_dir)
+        connectivity_cache.cache_dir = None
+
     def test_attributes(self):
         test_octa = Octa(name='test_octa')
 
@@ -28,6 +34,21 @@ class TestOcta(unittest.TestCase):
         self.assertEqual(len(test_octa.groups), 26)
         self.assertEqual(len(test_octa.sub_blocks), 2)
 
+    def test_run(self):
+        # Only the run_regularly objects of numpy-only functions fall back
+        # to numpy, the codegen target of the process is left alone
+        target = prefs.codegen.target
+        test_octa = Octa(name='test_octa')
+        self.assertEqual(prefs.codegen.target, target)
+        net = TeiliNetwork()
+        net.add(test_octa, test_octa.sub_blocks['prediction'],
+                test_octa.sub_blocks['compression'])
+        net.run(60 * ms)
+        w_plast = test_octa.sub_blocks['compression'].groups['s_inp_exc'].w_plast
+        self.assertTrue(np.all((w_plast >= 0) & (w_plast <= 1)))
+        Ipred_plast = test_octa._groups['s_pred_proj'].Ipred_plast
+        self.assertTrue(np.all((Ipred_plast >= 0) & (Ipred_plast <= 1)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This file contains unittest for parallelization.py
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from multiprocessing import Pool
+import numpy as np
+from brian2 import ms
+from teili.tools.parallelization import SweepCheckpoint, SweepParameter, \
+    ParameterSweep, RandomSearch, SuccessiveHalving, BayesianSearch, \
+    latin_hypercube
+
+
+class TestSweepCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'sweep_results.jsonl')
+
+    def test_resume(self):
+        combinations = [{'Itau': Itau, 'repetition': 0}
+                        for Itau in np.round(np.linspace(0.1, 0.3, 3), 9)]
+        checkpoint = SweepCheckpoint(self.filename, ['Itau', 'repetition'])
+        checkpoint.add(combinations[2], {'rate': np.float64(2.5)})
+        checkpoint.add(combinations[0], np.arange(2))
+
+        checkpoint = SweepCheckpoint(self.filename, ['Itau', 'repetition'])
+        self.assertEqual(len(checkpoint), 2)
+        self.assertEqual([combi in checkpoint for combi in combinations],
+                         [True, False, True])
+        result = checkpoint.to_dataframe(combinations)
+        np.testing.assert_array_equal(result['Itau'],
+                                      [combinations[0]['Itau'],
+                                       combinations[2]['Itau']])
+        self.assertEqual(result['result'][0], [0, 1])
+        self.assertEqual(result['rate'][1], 2.5)
+
+
+class LocalSweep(ParameterSweep):
+    """Evaluates process_results in this process instead of on workers
+    running a compiled network.
+    """
+
+    def evaluate(self, parameter_combinations, standalone_dir, resultdir,
+                 num_workers=1, sweep_parameters=None, share_binary=None):
+        for loop_param_dict in parameter_combinations:
+            yield loop_param_dict, self.process_results(
+                None, resultdir, self.sweep_parameters, loop_param_dict,
+                self.process_results_args), None
+
+
+def distance(net, resultdir, sweep_parameters, loop_param_dict, args):
+    # noise that vanishes for long runs
+    noise = 0.1 / loop_param_dict.get('duration', np.inf)
+    return {'distance': (loop_param_dict['x'] - 0.3) ** 2 +
+            (loop_param_dict['y'] + 0.5) ** 2 + noise}
+
+
+class TestParameterSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.sweep = LocalSweep(
+            None, [SweepParameter([], np.linspace(-1, 1, 3), 'x'),
+                   SweepParameter([], np.linspace(-1, 1, 3), 'y')],
+            distance, resultdir=self.directory)
+
+    def test_latin_hypercube(self):
+        samples = latin_hypercube(10, 3, rng=np.random.RandomState(1))
+        for dim in range(3):
+            np.testing.assert_array_equal(
+                np.sort(np.floor(samples[:, dim] * 10)), np.arange(10))
+
+    def test_random_search(self):
+        search = RandomSearch(self.sweep, objective='distance', seed=1,
+                              search_name='random')
+        best = search.run(None, num_points=50)
+        self.assertEqual(len(search.result), 50)
+        self.assertLess(best['distance'], 0.05)
+        # Finished points are read from the checkpoint
+        search = RandomSearch(self.sweep, objective='distance', seed=1,
+                              search_name='random')
+        search.sweep.process_results = None
+        self.assertEqual(search.run(None, num_points=50), best)
+
+    def test_successive_halving(self):
+        search = SuccessiveHalving(self.sweep, objective='distance', seed=1)
+        best = search.run(None, num_points=27, min_duration=10 * ms,
+                          max_duration=90 * ms, eta=3)
+        self.assertEqual(len(search.result), 27 + 9 + 3)
+        np.testing.assert_allclose(search.result['duration'][-3:], 0.09)
+        # The noise is the same for all points of a round, so the best
+        # point of the first round has to survive
+        first_round = search.result[:27]
+        best_first = first_round.iloc[np.argmin(first_round['distance'])]
+        self.assertEqual((best['x'], best['y']),
+                         (best_first['x'], best_first['y']))
+
+    def test_interrupt(self):
+        self.sweep._pool = Pool(1)
+        starttime = time.time()
+        with self.assertRaises(KeyboardInterrupt):
+            with self.sweep.pool_session():
+                self.sweep._pool.map_async(time.sleep, [10] * 4)
+                raise KeyboardInterrupt
+        # The queued runs are not waited for
+        self.assertLess(time.time() - starttime, 5)
+        self.assertIsNone(self.sweep._pool)
+
+    def test_bayesian_search(self):
+        search = BayesianSearch(self.sweep, objective='distance', seed=1)
+        best = search.run(None, num_initial=8, num_iterations=8,
+                          batch_size=2)
+        self.assertEqual(len(search.result), 24)
+        self.assertLess(best['distance'], 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
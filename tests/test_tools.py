@@ -11,7 +11,10 @@ import unittest
 import numpy as np
 import os
 import copy
+import shutil
+import tempfile
 from teili.tools import indexing, converter, misc, synaptic_kernel, sorting
+from teili.tools import cpptools, random_sampling
 
 
 class TestToolsMatrix(unittest.TestCase):
@@ -216,11 +219,125 @@ class TestTools(unittest.TestCase):
         # Create a small/simple aedat file to test all functions which rely on
         # edat2numpy
 
+    def test_delete_doublets(self):
+        spiketimes = np.array([3.2, 1., 3.7, 1., 2.])
+        indices = np.array([0, 1, 0, 2, 1])
+        spiketimes, indices = converter.delete_doublets(spiketimes, indices)
+        np.testing.assert_array_equal(spiketimes, [3, 1, 1, 2])
+        np.testing.assert_array_equal(indices, [0, 1, 2, 1])
+
+    def _write_aedat2(self, addr, ts):
+        fd, fname = tempfile.mkstemp(suffix='.aedat')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'#!AER-DAT2.0\r\n# test recording\r\n')
+            raw = np.zeros(len(addr), dtype=converter.AEDAT2_DTYPES['V2'])
+            raw['addr'] = addr
+            raw['ts'] = ts
+            f.write(raw.tobytes())
+        self.addCleanup(os.remove, fname)
+        return fname
+
+    def test_aedat2numpy_v2(self):
+        # x = 3, y = 5, pol = 1 for DVS128
+        addr = [(3 << 1) | (5 << 8) | 1, (7 << 1) | (2 << 8)]
+        ts = [1000, 2500]
+        fname = self._write_aedat2(addr, ts)
+        events = converter.aedat2numpy(fname, camera='DVS128', unit='ms')
+        np.testing.assert_array_equal(events[0], [124, 120])
+        np.testing.assert_array_equal(events[1], [5, 2])
+        np.testing.assert_array_equal(events[2], [1, 2.5])
+        np.testing.assert_array_equal(events[3], [1, 0])
+        self.assertRaises(ValueError, converter.aedat2numpy, fname,
+                          camera='DVS346')
+
+    def test_aedat2numpy_chunks(self):
+        # Every third event is an APS event, which is discarded
+        addr = [(i % 3 == 2) << 31 | (i % 240) << 12 | (i % 180) << 22
+                for i in range(100)]
+        ts = np.arange(100) * 10
+        fname = self._write_aedat2(addr, ts)
+        events = converter.aedat2numpy(fname, camera='DAVIS240', unit='us')
+        chunks = list(converter.aedat2numpy_chunks(
+            fname, chunk_size=30, camera='DAVIS240', unit='us'))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(np.size(events, 1), 67)
+        np.testing.assert_array_equal(np.concatenate(chunks, axis=1), events)
+
+    def test_read_window(self):
+        addr = [(i % 128) << 1 | (i % 128) << 8 | i % 2 for i in range(500)]
+        ts = np.arange(500) * 37
+        fname = self._write_aedat2(addr, ts)
+        events = converter.aedat2numpy(fname, camera='DVS128', unit='ms')
+        window = converter.read_window(fname, 2.5, 10, unit='ms',
+                                       camera='DVS128', bucket_size=1000)
+        in_window = np.logical_and(events[2] >= 2.5, events[2] < 10)
+        np.testing.assert_array_equal(window, events[:, in_window])
+        self.assertTrue(os.path.isfile(converter.event_index_path(fname)))
+        self.addCleanup(os.remove, converter.event_index_path(fname))
+        # The cached index is reused
+        window = converter.read_window(fname, 15, 100, unit='ms',
+                                       camera='DVS128', bucket_size=1000)
+        np.testing.assert_array_equal(window, events[:, events[2] >= 15])
+        with self.assertRaises(ValueError):
+            converter.read_window(fname, 0, 10, version='V3')
+        with self.assertRaises(ValueError):
+            converter.read_window(fname, 0, 10, unit='min')
+
+    def test_event_container(self):
+        addr = [(i % 128) << 1 | (i % 128) << 8 | i % 2 for i in range(50)]
+        fname = self._write_aedat2(addr, np.arange(50) * 100)
+        dense = converter.aedat2numpy(fname, camera='DVS128', unit='ms')
+        events = converter.aedat2container(fname, camera='DVS128',
+                                           chunk_size=20)
+        self.assertEqual(events.x.dtype, np.uint16)
+        self.assertEqual(events.pol.dtype, np.uint8)
+        self.assertEqual(events.ts.dtype, np.int64)
+        np.testing.assert_array_equal(events.to_array(unit='ms'), dense)
+        self.assertEqual(len(events.window(1, 2, unit='ms')), 10)
+
+        tmp_dir = tempfile.mkdtemp()
+        for path in [os.path.join(tmp_dir, 'events'),
+                     os.path.join(tmp_dir, 'events.h5')]:
+            events.save(path)
+            loaded = converter.EventContainer.load(path)
+            self.assertIsInstance(loaded.ts, np.memmap)
+            np.testing.assert_array_equal(loaded.to_array(), dense)
+            for on_off, expected in zip(
+                    converter.dvs2ind(event_directory=path),
+                    converter.dvs2ind(dense * [[1], [1], [1000], [1]])):
+                np.testing.assert_array_equal(on_off, expected)
+        shutil.rmtree(tmp_dir)
+
     def test_dvs2ind(self):
         self.assertRaises(AssertionError, converter.dvs2ind,
                           event_directory=1337)
         self.assertRaises(AssertionError, converter.dvs2ind,
                           event_directory='/These/Are/Not/Events.txt')
+        # x, y, ts (us), pol; pixel 1 fires twice within 1 ms
+        events = np.array([[1, 2, 1, 1, 2],
+                           [0, 0, 0, 0, 0],
+                           [1000, 1000, 1500, 5000, 5000],
+                           [1, 1, 1, 1, 0]])
+        ind_on, ts_on, ind_off, ts_off = converter.dvs2ind(
+            events, resolution=10)
+        np.testing.assert_array_equal(ind_on, [1, 2, 1])
+        np.testing.assert_array_equal(ts_on, [0, 0, 4])
+        np.testing.assert_array_equal(ind_off, [2])
+        self.assertEqual(ind_on.dtype, np.int32)
+        self.assertEqual(ts_on.dtype, np.float64)
+        ind_on, ts_on, _, _ = converter.dvs2ind(
+            events, resolution=10, delta_t=0)
+        np.testing.assert_array_equal(ind_on, [1, 2, 1, 1])
+        # pixel 3 fires every ms, every other event is within 1 ms of the
+        # last kept one
+        events = np.array([[3] * 10, [0] * 10, np.arange(10) * 1000,
+                           [1] * 10])
+        ind_on, ts_on = converter.dvs2ind(events, resolution=10)
+        np.testing.assert_array_equal(ts_on, [0, 2, 4, 6, 8])
+        np.testing.assert_array_equal(
+            converter.unique_events_mask([0, 1, 0, 0, 0, 1],
+                                         [0., 0., 1., 1.5, 3., 0.5], 1.),
+            [True, True, False, True, True, False])
         # os.command('touch /tmp/Events.npy')
         # self.assertRaises(AssertionError, tools.dvs2ind,
         #                   Events=np.zeros((4, 100)),
@@ -228,5 +345,416 @@ class TestTools(unittest.TestCase):
         # os.command('rm /tmp/Events.npy')
 
 
+    def test_params_file(self):
+        fd, filename = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        params = {'duration': 0.123456789012, 'ng_I': np.array([1., 2.5]),
+                  'num_inputs': 3}
+        cpptools.write_params_file(params, filename)
+        read_params = cpptools.read_params_file(filename)
+        self.assertEqual(list(read_params), list(params))
+        self.assertEqual(read_params['duration'][0], params['duration'])
+        np.testing.assert_array_equal(read_params['ng_I'], params['ng_I'])
+        self.assertEqual(read_params['num_inputs'].dtype, np.int64)
+        with open(filename, 'wb') as params_file:
+            params_file.write(b'notparams')
+        self.assertRaises(ValueError, cpptools.read_params_file, filename)
+        os.remove(filename)
+
+        tmp_dir = tempfile.mkdtemp()
+        with cpptools.params2file_run_args(params, tmp_dir) as run_args:
+            self.assertEqual(run_args[0], cpptools.PARAMS_FILE_ARG)
+            self.assertEqual(list(cpptools.read_params_file(run_args[1])),
+                             list(params))
+        # The parameter file is removed after the run
+        self.assertEqual(os.listdir(tmp_dir), [])
+        os.rmdir(tmp_dir)
+
+
+    def test_build_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        standalone_dir = os.path.join(tmp_dir, 'standalone')
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        os.makedirs(os.path.join(standalone_dir, 'static_arrays'))
+        with open(os.path.join(standalone_dir, 'main.cpp'), 'w') as source:
+            source.write('int main() {}')
+        with open(os.path.join(standalone_dir, 'main'), 'w') as binary:
+            binary.write('compiled')
+        build_hash = cpptools.source_hash(standalone_dir)
+        # Runtime arrays are not part of the hash
+        with open(os.path.join(standalone_dir, 'static_arrays', 'init'),
+                  'w') as array:
+            array.write('1')
+        self.assertEqual(cpptools.source_hash(standalone_dir), build_hash)
+        self.assertNotEqual(cpptools.source_hash(standalone_dir, ['g++']),
+                            build_hash)
+
+        self.assertFalse(cpptools.load_cached_build(standalone_dir,
+                                                    build_hash, cache_dir))
+        cpptools.store_cached_build(standalone_dir, build_hash, cache_dir)
+        os.remove(os.path.join(standalone_dir, 'main'))
+        self.assertTrue(cpptools.load_cached_build(standalone_dir,
+                                                   build_hash, cache_dir))
+        with open(os.path.join(standalone_dir, 'main')) as binary:
+            self.assertEqual(binary.read(), 'compiled')
+
+        with open(os.path.join(standalone_dir, 'main.cpp'), 'w') as source:
+            source.write('int main() {return 1;}')
+        self.assertNotEqual(cpptools.source_hash(standalone_dir), build_hash)
+        shutil.rmtree(tmp_dir)
+
+
+    def test_source_file_hashes(self):
+        tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(tmp_dir, 'code_objects'))
+        for filename in ['main.cpp', 'main.o', 'code_objects/ng.cpp']:
+            with open(os.path.join(tmp_dir, filename), 'w') as source:
+                source.write(filename)
+        makefile = os.path.join(tmp_dir, 'makefile')
+        with open(makefile, 'w') as source:
+            source.write('SRCS = main.cpp\nOPTIMISATIONS = -O3\n')
+        hashes = cpptools.source_file_hashes(tmp_dir)
+        self.assertEqual(list(hashes),
+                         ['code_objects/ng.cpp', 'main.cpp', 'makefile'])
+        flags_hash = cpptools._makefile_flags_hash(makefile)
+        with open(makefile, 'w') as source:
+            source.write('SRCS = main.cpp ng.cpp\nOPTIMISATIONS = -O3\n')
+        self.assertEqual(cpptools._makefile_flags_hash(makefile), flags_hash)
+        with open(makefile, 'w') as source:
+            source.write('SRCS = main.cpp\nOPTIMISATIONS = -O0\n')
+        self.assertNotEqual(cpptools._makefile_flags_hash(makefile),
+                            flags_hash)
+        shutil.rmtree(tmp_dir)
+
+
+    def test_set_num_threads(self):
+        from brian2 import prefs
+        num_threads = prefs.devices.cpp_standalone.openmp_threads
+        cpptools.set_num_threads(4)
+        self.assertEqual(prefs.devices.cpp_standalone.openmp_threads, 4)
+        self.assertRaises(ValueError, cpptools.set_num_threads, -1)
+        prefs.devices.cpp_standalone.openmp_threads = num_threads
+
+
+    def test_rand_gamma(self):
+        from brian2 import NeuronGroup, Network, prefs, seed, ms
+        prefs.codegen.target = 'numpy'
+        values = []
+        for _ in range(2):
+            seed(11)
+            group = NeuronGroup(20000, 'x : 1')
+            group.namespace['rand_gamma'] = random_sampling.Rand_gamma(2, -4)
+            group.x = 'rand_gamma()'
+            Network(group).run(0 * ms)
+            values.append(np.array(group.x))
+        np.testing.assert_array_equal(values[0], values[1])
+        self.assertAlmostEqual(np.mean(values[0]), -0.5, places=2)
+        self.assertAlmostEqual(np.var(values[0]), 2 / 16., places=2)
+
+    def test_randn_trunc(self):
+        from scipy.stats import truncnorm
+        random_state = np.random.RandomState(3)
+        for lower, upper in [(-5, np.inf), (8, 9), (-np.inf, -10), (-1, 2)]:
+            values = random_sampling.sample_randn_trunc(
+                lower, upper, 100000, random_state=random_state)
+            self.assertTrue(np.all((values >= lower) & (values <= upper)))
+            self.assertAlmostEqual(np.mean(values),
+                                   truncnorm.mean(lower, upper), places=2)
+        with self.assertRaises(ValueError):
+            random_sampling.Randn_trunc(1, 1)
+
+    def test_run_reg_functions(self):
+        from teili.tools import run_reg_functions
+        lfsr = run_reg_functions.lfsr.implementations['numpy'].get_code(None)
+        get_activity_proxy_vm = run_reg_functions.get_activity_proxy_vm.\
+            implementations['numpy'].get_code(None)
+        get_re_init_indices = run_reg_functions.get_re_init_indices.\
+            implementations['numpy'].get_code(None)
+
+        # Consecutive states are advanced by num_elements steps, like the
+        # element-wise C++ implementation does
+        num_bits, mask, state, states = 5, 0b100101, 3, []
+        for _ in range(8):
+            state <<= 1
+            if state >> num_bits:
+                state ^= mask
+            states.append(state)
+        decay_probability = np.array(states) / 2**num_bits
+        advanced = np.array(states[1:] + [0])
+        state = states[-1]
+        for _ in range(8):
+            state <<= 1
+            if state >> num_bits:
+                state ^= mask
+            advanced[:-1], advanced[-1] = advanced[1:], state
+        np.testing.assert_array_equal(
+            lfsr(decay_probability, 8, np.array([num_bits]), mask),
+            advanced / 2**num_bits)
+
+        # Flattened buffers of all neurons are updated in place
+        membrane_buffer = np.full(3 * 4, np.nan)
+        kernel_adp = np.tile(np.exp(np.arange(4) - 3.), 3)
+        for i in range(5):
+            activity_proxy = get_activity_proxy_vm(np.arange(3.) + i, 0,
+                                                   membrane_buffer, kernel_adp)
+        np.testing.assert_array_equal(membrane_buffer[:4], [1, 2, 3, 4])
+        np.testing.assert_allclose(activity_proxy,
+                                   np.dot(np.arange(1, 5.) + np.arange(3)[:, None],
+                                          np.exp(np.arange(4) - 3.)))
+
+        # A zero anywhere in the buffer turns all rows into ring buffers
+        get_activity_proxy_imem = run_reg_functions.get_activity_proxy_imem.\
+            implementations['numpy'].get_code(None)
+        membrane_buffer = np.ones(3 * 4)
+        membrane_buffer[5] = 0
+        get_activity_proxy_imem(np.array([7., 8., 9.]), 2, membrane_buffer,
+                                np.ones(3 * 4), 0)
+        np.testing.assert_array_equal(membrane_buffer.reshape(3, 4)[:, 2],
+                                      [7, 8, 9])
+        np.testing.assert_array_equal(membrane_buffer.reshape(3, 4)[:, 3], 1)
+        membrane_buffer[5] = 2
+        get_activity_proxy_imem(np.array([7., 8., 9.]), 2, membrane_buffer,
+                                np.ones(3 * 4), 0)
+        np.testing.assert_array_equal(membrane_buffer.reshape(3, 4)[:, 3],
+                                      [7, 8, 9])
+
+        # Spike times of a neuron group
+        lastspike = np.array([0.5, 2.5, 3.])
+        np.testing.assert_array_equal(
+            get_re_init_indices(np.zeros(3), 1, 0, lastspike, 3.2), [1, 0, 0])
+
+    def test_lfsr(self):
+        from teili.tools import lfsr
+        for num_bits, mask in lfsr.LFSR_MASKS.items():
+            state, states = 5, []
+            for _ in range(3 * 2**num_bits):
+                state <<= 1
+                if state >> num_bits:
+                    state ^= mask
+                states.append(state)
+            np.testing.assert_array_equal(
+                lfsr.lfsr_sequence(5, len(states), num_bits), states)
+            # Maximal length, every non-zero state is visited
+            self.assertEqual(len(set(states)), 2**num_bits - 1)
+            for num_steps in [1, 7, 2**num_bits + 3]:
+                np.testing.assert_array_equal(
+                    lfsr.lfsr_advance(states[:2**num_bits], num_bits,
+                                      num_steps=num_steps),
+                    states[num_steps:num_steps + 2**num_bits])
+        # Registers of different length are advanced with their own mask
+        np.testing.assert_array_equal(
+            lfsr.lfsr_advance([1, 1], [3, 9], num_steps=4),
+            [lfsr.lfsr_sequence(1, 4, 3)[-1], lfsr.lfsr_sequence(1, 4, 9)[-1]])
+
+    def test_lfsr_tables(self):
+        from brian2 import ms
+        from teili.tools import lfsr
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        tables = lfsr.LFSRTables(cache_dir)
+        sequence = tables.sequence(5)
+        self.assertEqual(sequence.dtype, np.uint16)
+        np.testing.assert_array_equal(
+            sequence, np.concatenate([[1], lfsr.lfsr_sequence(1, 30, 5)]))
+        self.assertEqual(os.listdir(cache_dir), ['lfsr_5_25.npy'])
+
+        # Later instances load the stored sequence
+        np.save(os.path.join(cache_dir, 'lfsr_5_25.npy'), sequence[::-1])
+        np.testing.assert_array_equal(
+            lfsr.LFSRTables(cache_dir).sequence(5), sequence[::-1])
+
+        init, max_value = tables.indices([6, 3, 6, 9])
+        np.testing.assert_array_equal(init, [7, 0, 7, 70])
+        np.testing.assert_array_equal(max_value, [63, 7, 63, 511])
+        timed_array = tables.timed_array([3, 6, 9], 1 * ms)
+        self.assertEqual(len(timed_array.values), 7 + 63 + 511)
+        self.assertIs(tables.timed_array([9, 6, 3, 3], 1 * ms), timed_array)
+
+    def test_codegen_targets(self):
+        from brian2 import prefs, Function
+        from brian2.codegen.runtime.numpy_rt import NumpyCodeObject
+        from teili.tools import codegen_targets
+        from teili.tools.run_reg_functions import lfsr, weight_normalization
+        self.assertEqual(codegen_targets.supported_targets(lfsr),
+                         ('numpy', 'cpp_standalone'))
+        self.assertEqual(codegen_targets.supported_targets(weight_normalization),
+                         ('numpy',))
+
+        self.addCleanup(setattr, prefs.codegen, 'target',
+                        prefs.codegen.target)
+        prefs.codegen.target = 'numpy'
+        self.assertIsNone(codegen_targets.codeobj_class_for(lfsr))
+        # Only the objects calling numpy-only functions fall back to numpy
+        prefs.codegen.target = 'cython'
+        self.assertIs(codegen_targets.codeobj_class_for(lfsr), NumpyCodeObject)
+
+        def cpp_only(x):
+            return x
+        cpp_only = Function(cpp_only, arg_units=[1], return_unit=1)
+        cpp_only.implementations.add_implementation(
+            'cpp', 'double cpp_only(double x) { return x; }')
+        self.addCleanup(codegen_targets.FUNCTION_TARGETS.pop, 'cpp_only',
+                        None)
+        self.assertEqual(codegen_targets.register_function(cpp_only),
+                         ('cpp_standalone',))
+        self.assertRaises(NotImplementedError,
+                          codegen_targets.codeobj_class_for, lfsr, cpp_only)
+        codegen_targets.register_function(cpp_only, ['cython'])
+        self.assertIsNone(codegen_targets.codeobj_class_for(cpp_only))
+
+    def test_connectivity(self):
+        from scipy import sparse
+        from teili.tools import connectivity
+        from teili.tools.distance import dist1d2dint
+        pairs = np.array([[i, j] for i in range(12) for j in range(12)])
+
+        i, j = connectivity.Banded(cutoff=2).indices(12, 12)
+        expected = pairs[np.abs(pairs[:, 0] - pairs[:, 1]) <= 2]
+        np.testing.assert_array_equal(np.stack([i, j], axis=1), expected)
+
+        i, j = connectivity.GridRadius(1.5, 3, 4).indices(12, 12)
+        expected = pairs[dist1d2dint(pairs[:, 0], pairs[:, 1], 3, 4) <= 1.5]
+        np.testing.assert_array_equal(np.stack([i, j], axis=1), expected)
+        self.assertRaises(ValueError,
+                          connectivity.GridRadius(1, 3).indices, 12, 12)
+
+        random_state = np.random.RandomState(3)
+        i, j = connectivity.FixedInDegree(3, random_state).indices(10, 50)
+        np.testing.assert_array_equal(np.bincount(j), np.full(50, 3))
+        self.assertEqual(len(set(zip(i, j))), 150)
+        np.testing.assert_array_equal(np.lexsort((j, i)), np.arange(150))
+
+        i, j = connectivity.Bernoulli(0.1, random_state).indices(200, 300)
+        self.assertAlmostEqual(len(i) / 60000, 0.1, delta=0.01)
+        np.testing.assert_array_equal(np.lexsort((j, i)), np.arange(len(i)))
+        self.assertEqual(len(connectivity.Bernoulli(1).indices(3, 4)[0]), 12)
+
+        matrix = sparse.random(5, 7, density=0.3, format='csr',
+                               random_state=random_state)
+        i, j = connectivity.connectivity_indices(matrix, 5, 7)
+        np.testing.assert_array_equal(
+            np.stack([i, j], axis=1), np.argwhere(matrix.toarray()))
+        self.assertRaises(ValueError, connectivity.connectivity_indices,
+                          matrix, 7, 5)
+
+    def test_connectivity_cache(self):
+        from teili.tools import connectivity
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache = connectivity.ConnectivityCache(cache_dir)
+        generator = connectivity.Bernoulli(0.2, seed=7)
+        i, j = cache.indices(generator, 30, 40)
+        # The seed makes the synapses reproducible
+        np.testing.assert_array_equal(
+            np.stack(generator.indices(30, 40)), np.stack([i, j]))
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        # Later calls load the stored synapses
+        key = generator.cache_key(30, 40)
+        cache.store(key, i=i[:5], j=j[:5], weight=np.ones(5))
+        np.testing.assert_array_equal(cache.indices(generator, 30, 40)[0],
+                                      i[:5])
+        np.testing.assert_array_equal(cache.load(key)['weight'], np.ones(5))
+        self.assertIsNone(cache.load(('Bernoulli', 0.2, 8, 30, 40)))
+
+        # Unseeded generators are not cached
+        self.assertIsNone(connectivity.Bernoulli(0.2).cache_key(30, 40))
+        self.assertIsNone(connectivity.Banded(1).cache_key(30, 40))
+        self.assertRaises(ValueError, connectivity.FixedInDegree(
+            2, np.random.RandomState(1), seed=1).indices, 5, 5)
+
+    def test_snapshot_format(self):
+        from collections import OrderedDict
+        from brian2 import ms, pA
+        from teili.tools import snapshot
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        path = os.path.join(snapshot_dir, 'state.snapshot')
+        state = {'group': {'v': (np.arange(5.), 5), 'i': (np.int32([3]), 1),
+                           'queue': None, 'size': np.int64(7)},
+                 'params': OrderedDict([('duration', 10 * ms),
+                                        ('Ith', np.ones(3) * pA)]),
+                 'tags': {'mode': 'spiking', 'num_inputs': 2,
+                          'flags': [True, 0.5]}}
+        snapshot.write_snapshot(path, state)
+        loaded = snapshot.read_snapshot(path)
+        np.testing.assert_array_equal(loaded['group']['v'][0], np.arange(5.))
+        self.assertEqual(loaded['group']['i'][0].dtype, np.int32)
+        self.assertIsInstance(loaded['group']['i'], tuple)
+        self.assertIsNone(loaded['group']['queue'])
+        self.assertEqual(loaded['group']['size'], np.int64(7))
+        self.assertIsInstance(loaded['params'], OrderedDict)
+        self.assertEqual(loaded['params']['duration'], 10 * ms)
+        np.testing.assert_array_equal(loaded['params']['Ith'], np.ones(3) * pA)
+        self.assertEqual(loaded['tags'], state['tags'])
+        # Arrays are views of the file
+        self.assertFalse(loaded['group']['v'][0].flags.writeable)
+
+        with open(path, 'wb') as f:
+            f.write(b'not a snapshot')
+        self.assertRaises(ValueError, snapshot.read_snapshot, path)
+        self.assertRaises(TypeError, snapshot.write_snapshot, path,
+                          {'object': object()})
+
+    def test_trials(self):
+        from teili.tools import connectivity, trials
+        i, j = connectivity.BlockDiagonal(connectivity.Banded(1), 3).indices(
+            12, 12)
+        block_i, block_j = connectivity.Banded(1).indices(4, 4)
+        np.testing.assert_array_equal(i, np.concatenate(
+            [block_i, block_i + 4, block_i + 8]))
+        np.testing.assert_array_equal(j, np.concatenate(
+            [block_j, block_j + 4, block_j + 8]))
+        self.assertRaises(ValueError, connectivity.BlockDiagonal(
+            connectivity.Banded(1), 5).indices, 12, 12)
+
+        indices = trials.route_trials([3, 0, 1], [2, 0, 2], 4)
+        np.testing.assert_array_equal(indices, [11, 0, 9])
+        split = trials.split_trials(indices, 4, 3, np.array([5., 6., 7.]))
+        np.testing.assert_array_equal(split[0][0], [0])
+        self.assertEqual(len(split[1][0]), 0)
+        np.testing.assert_array_equal(split[2][0], [3, 1])
+        np.testing.assert_array_equal(split[2][1], [5., 7.])
+        states = trials.split_states(np.arange(24).reshape(12, 2), 3)
+        np.testing.assert_array_equal(states[1], np.arange(8, 16).reshape(4, 2))
+
+    def test_kernel_weights(self):
+        from types import SimpleNamespace
+        from teili.tools import kernel_weights
+        random_state = np.random.RandomState(5)
+        connections = SimpleNamespace(
+            source=range(35), target=range(35),
+            i=random_state.randint(35, size=200),
+            j=random_state.randint(35, size=200))
+        for kernel, args in [('kernel_mexican_1d', (2.5,)),
+                             ('kernel_gauss_2d', (1.5, 5, 7))]:
+            function = getattr(synaptic_kernel, kernel)
+            expected = [function.pyfunc(i, j, *args)
+                        for i, j in zip(connections.i, connections.j)]
+            np.testing.assert_allclose(
+                kernel_weights.kernel_weights(connections, function, *args),
+                expected)
+
+        # Gabor kernel between an input layer and a smaller window
+        args = (1, -1, 0.7, 2.0, 3.0, 4.0, 20, 16, 8, 6, 5)
+        connections = SimpleNamespace(
+            source=range(320), target=range(48),
+            i=random_state.randint(320, size=500),
+            j=random_state.randint(48, size=500))
+        expected = [synaptic_kernel.kernel_gabor_2d.pyfunc(i, j, *args)
+                    for i, j in zip(connections.i, connections.j)]
+        np.testing.assert_allclose(kernel_weights.kernel_weights(
+            connections, 'kernel_gabor_2d', *args), expected)
+
+        # Tables are shared between groups of the same shape
+        table = kernel_weights.kernel_table('kernel_gauss_2d', 35, 35,
+                                            1.5, 5, 7)
+        self.assertIs(kernel_weights.kernel_table('kernel_gauss_2d', 35, 35,
+                                                  1.5, 5, 7), table)
+        self.assertFalse(kernel_weights.has_batched_kernel('kernel_custom'))
+        self.assertRaises(ValueError, kernel_weights.kernel_weights,
+                          connections, 'kernel_custom', 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,6 +6,7 @@
 import unittest
 import numpy as np
 from teili.building_blocks.wta import WTA
+from teili.core.network import TeiliNetwork
 from brian2 import prefs, ms
 
 prefs.codegen.target = "numpy"
@@ -36,6 +37,62 @@ class TestWTA(unittest.TestCase):
         self.assertEqual((np.asarray(test2DWTA.spike_gen._spike_time / ms)).tolist(),
                          neuron_ts.tolist())
 
+    def test_trials(self):
+        from teili.tools.connectivity import connectivity_cache
+        # The seeded connectivity is not cached on disk
+        self.addCleanup(setattr, connectivity_cache, 'cache_dir',
+                        connectivity_cache.cache_dir)
+        connectivity_cache.cache_dir = None
+        block_params = {'we_inp_exc': 3000, 'we_exc_exc': 300,
+                        'ii_connection_probability': 0.5}
+        indices = np.concatenate([np.tile(np.arange(8), 4),
+                                  np.tile(np.arange(8)[::-1], 4)])
+        times = np.tile(np.arange(32) * 0.8, 2) * ms
+        trials = np.repeat([0, 1], 32)
+        batchWTA = WTA(name='testBatchWTA', dimensions=1, num_neurons=8,
+                       num_inh_neurons=2, block_params=block_params,
+                       seed=3, num_trials=3)
+        self.assertEqual(batchWTA._groups['n_exc'].N, 24)
+        self.assertEqual(batchWTA.spike_gen.N, 24)
+        # Every trial is connected identically and only within itself
+        s_inh_inh = batchWTA._groups['s_inh_inh']
+        self.assertTrue(np.all(s_inh_inh.i // 2 == s_inh_inh.j // 2))
+        np.testing.assert_array_equal(np.bincount(s_inh_inh.i // 2),
+                                      np.full(3, len(s_inh_inh) // 3))
+
+        batchWTA.set_trial_spikes(indices, times, trials)
+        batch_net = TeiliNetwork()
+        batch_net.add(batchWTA)
+        batch_net.run(30 * ms, verbose=False)
+        trial_spikes = batchWTA.trial_spikes()
+        self.assertEqual(len(trial_spikes[2][0]), 0)
+
+        # The same seed connects blocks of different names differently
+        otherWTA = WTA(name='testOtherWTA', dimensions=1, num_neurons=8,
+                       num_inh_neurons=2, block_params=block_params, seed=3)
+        other_inh_inh = otherWTA._groups['s_inh_inh']
+        trial_inh_inh = s_inh_inh.i < 2
+        self.assertNotEqual(
+            list(zip(other_inh_inh.i, other_inh_inh.j)),
+            list(zip(s_inh_inh.i[trial_inh_inh], s_inh_inh.j[trial_inh_inh])))
+
+        # The trials are the same as separate simulations of a block of
+        # the same name
+        for trial in range(2):
+            singleWTA = WTA(name='testBatchWTA', dimensions=1,
+                            num_neurons=8, num_inh_neurons=2,
+                            block_params=block_params, seed=3)
+            singleWTA.spike_gen.set_spikes(indices[trials == trial],
+                                           times[trials == trial])
+            single_net = TeiliNetwork()
+            single_net.add(singleWTA)
+            single_net.run(30 * ms, verbose=False)
+            self.assertGreater(len(singleWTA.spikemon_exc.i), 0)
+            np.testing.assert_array_equal(trial_spikes[trial][0],
+                                          singleWTA.spikemon_exc.i)
+            np.testing.assert_allclose(trial_spikes[trial][1],
+                                       singleWTA.spikemon_exc.t)
+
 
 if __name__ == '__main__':
     unittest.main()
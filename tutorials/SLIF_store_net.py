@@ -177,12 +177,12 @@ Net.add([x.input_groups for x in column.col_groups.values()])
 print([list(x.input_groups.values())[0][1] for x in column.col_groups.values()])
 
 #Net.add(spikemon_input, spkmon_l4, spkmon_l5)
-Net.store(filename='pablo_network')
+Net.save_snapshot('pablo_network.snapshot')
 
 # store in a first simulation
-#Net.store(filename='network')
+#Net.save_snapshot('network.snapshot')
 # restore in a second simulation
-Net.restore(filename='pablo_network')
+Net.load_snapshot('pablo_network.snapshot')
 
 for k in Net.neurongroups.keys(): 
     print(Net.neurongroups[k].synapses_dict)
@@ -11,7 +11,7 @@ from scipy.interpolate import interp1d
 import numpy as np
 import pandas as pd
 from teili.core.groups import Neurons
-from teili.tools.converter import aedat2numpy, dvs2ind
+from teili.tools.converter import aedat2container, dvs2ind
 from random import randint
 from pathlib import Path
 import pickle
@@ -302,10 +302,10 @@ def bar_from_recording(filename):
             'dvSave-7V_normal_fullrec.aedat4'
     """
     print('converting events...')
-    ev_npy = aedat2numpy(filename, version='V4')
+    events = aedat2container(filename, version='V4')
 
     print('getting time and indices...')
-    i_on, t_on, i_off, t_off = dvs2ind(ev_npy, resolution=(346, 260))
+    i_on, t_on, i_off, t_off = dvs2ind(events, resolution=(346, 260))
 
     print('saving on disk...')
     np.savez(filename+'_events', on_indices=i_on, on_times=t_on, off_indices=i_off, off_times=t_off)